@@ -1,8 +1,8 @@
 from web import create_app
 import os
 
+# WSGI entry point (gunicorn -c gunicorn.conf.py app.app:app); one app per process
 app = create_app()
 
 if __name__ == '__main__':
-    #app.run(host='0.0.0.0', port=int(os.getenv('PORT', '5000')), debug=True)
-    app = create_app()
+    app.run(host='0.0.0.0', port=int(os.getenv('PORT', '5000')), debug=os.getenv('DEBUG', 'false').lower() == 'true')
@@ -1,30 +1,150 @@
 import argparse, json, sys
 from engine.scorer import HybridScorer
-from engine.explain import highlight_similar_regions
+from engine.explain import highlight_documents
+from engine.corpus import load_corpus, scan_corpus, write_scan_csv
+from engine.tfidf import TfidfModel
+from engine.embeddings import chunk_text
+from engine.fp_index import fp_index_from_config
+from engine.document import prepare_document
+from engine.vector_index import find_similar, index_documents, index_from_config
+from engine.metrics import NO_TIMINGS, Timings, profiled
+from engine.backends import BACKENDS, default_onnx_dir, export_onnx, parity_report
 from config import Config
 
 
-def compare_files(path1: str, path2: str, out_json: str = None):
+def compare_files(path1: str, path2: str, out_json: str = None, timings: bool = False, profile: bool = False,
+                  score_only: bool = False):
     with open(path1, 'r', encoding='utf-8', errors='ignore') as f:
         code1 = f.read()
     with open(path2, 'r', encoding='utf-8', errors='ignore') as f:
         code2 = f.read()
-    scorer = HybridScorer(Config.MODEL_NAME, device=Config.DEVICE, topk_matches=Config.TOPK_CHUNK_MATCHES)
-    report = scorer.score(code1, code2)
-    spans = highlight_similar_regions(code1, code2)
+    scorer = HybridScorer.from_config(Config)
+    t = Timings() if timings else NO_TIMINGS
+    with profiled(profile, Config.PROFILE_INTERVAL_MS / 1000.0) as prof:
+        doc1, doc2 = scorer.prepare(code1, path1, t), scorer.prepare(code2, path2, t)
+        report = scorer.score_documents(doc1, doc2, timings=t)
+        if not score_only:
+            with t.stage("explain", tokens=len(doc1.tokens) + len(doc2.tokens)):
+                spans = highlight_documents(doc1, doc2, min_match=Config.SPAN_MIN_TOKENS,
+                                            max_seconds=Config.SPAN_MAX_SECONDS)
     result = {
         "threshold": Config.SIM_THRESHOLD,
         "ensemble_score": report['ensemble_score'],
         "components": report['components'],
-        "chunk_matches": report['chunks']['topk_matches'],
-        "spans": spans['spans']
+        "stages": report['stages'],
+        "early_exit": report['early_exit'],
     }
+    if not score_only:
+        result.update(chunk_matches=report['chunks']['topk_matches'], heatmap=report['chunks']['heatmap'],
+                      spans=spans['spans'])
+    if timings:
+        result["timings"] = t.as_dict()
+    if prof is not None:
+        result["profile"] = prof.report()
     if out_json:
         with open(out_json, 'w') as f:
             json.dump(result, f, indent=2)
     else:
         print(json.dumps(result, indent=2))
 
+def scan_directory(directory: str, out_json: str = None, out_csv: str = None,
+                   min_overlap: float = None, top: int = None):
+    docs = load_corpus(directory, Config.ALLOWED_EXTENSIONS, max_bytes=Config.MAX_CONTENT_LENGTH)
+    scorer = HybridScorer.from_config(Config)
+    result = scan_corpus(docs, scorer,
+                         min_overlap=Config.SCAN_MIN_OVERLAP if min_overlap is None else min_overlap,
+                         threshold=Config.SIM_THRESHOLD, max_df=Config.SCAN_MAX_DF, top=top)
+    if out_csv:
+        write_scan_csv(result, out_csv)
+    if out_json:
+        with open(out_json, 'w') as f:
+            json.dump(result, f, indent=2)
+    if not out_json and not out_csv:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{result['files']} files, {result['pairs_scored']} pairs scored, "
+              f"{result['pairs_pruned']} pruned", file=sys.stderr)
+        for c in result['clusters']:
+            print(f"cluster {c['cluster_id']}: {c['size']} files, max score {c['max_score']:.2f}: "
+                  f"{', '.join(c['files'])}", file=sys.stderr)
+    if scorer.embedder.cache is not None:
+        st = scorer.embedder.cache.stats()
+        print(f"embedding cache: {st['hits']} hits, {st['misses']} misses "
+              f"({st['hit_rate']:.0%} hit rate)", file=sys.stderr)
+
+def fit_tfidf(directory: str, out_path: str):
+    docs = load_corpus(directory, Config.ALLOWED_EXTENSIONS, max_bytes=Config.MAX_CONTENT_LENGTH)
+    model = TfidfModel.fit([d.norm for d in docs])
+    model.save(out_path)
+    print(f"fitted TF-IDF on {len(docs)} files ({len(model.vectorizer.vocabulary_)} terms) -> {out_path}",
+          file=sys.stderr)
+def index_directory(directory: str, remove=None):
+    scorer = HybridScorer.from_config(Config)
+    index = index_from_config(Config, scorer.embedder)
+    for name in remove or []:
+        if not index.remove(name):
+            print(f"not in index: {name}", file=sys.stderr)
+    if directory:
+        docs = load_corpus(directory, Config.ALLOWED_EXTENSIONS, max_bytes=Config.MAX_CONTENT_LENGTH)
+        index_documents(index, docs, scorer.embedder, chunking=scorer.chunking,
+                        chunk_tokens=scorer.chunk_tokens)
+    st = index.stats()
+    print(f"index {Config.VECTOR_INDEX_PATH}: {st['files']} files, {st['vectors']} vectors, "
+          f"{st['lists']} IVF lists", file=sys.stderr)
+
+def similar_files(path: str, k: int = 10, rerank: int = None, out_json: str = None):
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        code = f.read()
+    scorer = HybridScorer.from_config(Config)
+    index = index_from_config(Config, scorer.embedder)
+    result = find_similar(index, scorer.prepare(code, path), scorer.embedder, k=k, scorer=scorer,
+                          rerank=Config.INDEX_RERANK if rerank is None else rerank, exclude_self=False,
+                          chunking=scorer.chunking, chunk_tokens=scorer.chunk_tokens)
+    if out_json:
+        with open(out_json, 'w') as f:
+            json.dump(result, f, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+
+def fp_add(directory: str, namespace: str, base: bool = False, prefix: str = ""):
+    docs = load_corpus(directory, Config.ALLOWED_EXTENSIONS, max_bytes=Config.MAX_CONTENT_LENGTH)
+    for d in docs:
+        d.name = prefix + d.name
+    index = fp_index_from_config(Config, namespace)
+    if base:
+        index.add_base(docs)
+    else:
+        index.add_many(docs)
+    st = index.stats()
+    print(f"{namespace}: {st['documents']} documents, {st['segments']} segments, "
+          f"{st['base_files']} base files", file=sys.stderr)
+
+def fp_query(path: str, namespace: str, top: int = 10, out_json: str = None):
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        doc = prepare_document(f.read(), name=path)
+    result = fp_index_from_config(Config, namespace).query(doc.fingerprints, top=top)
+    if out_json:
+        with open(out_json, 'w') as f:
+            json.dump(result, f, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+
+def backend_parity(directory: str, backends, max_texts: int = 256, out_json: str = None):
+    docs = load_corpus(directory, Config.ALLOWED_EXTENSIONS, max_bytes=Config.MAX_CONTENT_LENGTH)
+    texts = [c for d in docs for c in chunk_text(d.norm)][:max_texts]
+    report = parity_report(Config.MODEL_NAME, texts, backends=backends, device=Config.DEVICE,
+                           onnx_dir=Config.ONNX_MODEL_DIR)
+    if out_json:
+        with open(out_json, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+def export_onnx_model(out_dir: str = None, quantize: bool = False):
+    out_dir = out_dir or Config.ONNX_MODEL_DIR or default_onnx_dir(Config.MODEL_NAME)
+    path = export_onnx(Config.MODEL_NAME, out_dir, quantize=quantize)
+    print(f"exported {Config.MODEL_NAME} -> {path}", file=sys.stderr)
+
 def main():
     p = argparse.ArgumentParser(prog="scpis", description="Source Code Plagiarism Inspection System CLI")
     sub = p.add_subparsers(dest="cmd", required=True)
@@ -32,9 +152,79 @@ def main():
     c.add_argument("file1")
     c.add_argument("file2")
     c.add_argument("--json", dest="out_json", default=None, help="Write JSON report to file")
+    c.add_argument("--timings", action="store_true", help="Add per-stage wall times and input sizes")
+    c.add_argument("--profile", action="store_true", help="Add a sampling profile (collapsed stacks)")
+    c.add_argument("--score-only", action="store_true", help="Scores only: skip matches, heatmap and span alignment")
+    s = sub.add_parser("scan", help="Compare every pair of code files in a directory")
+    s.add_argument("directory")
+    s.add_argument("--json", dest="out_json", default=None, help="Write JSON report to file")
+    s.add_argument("--csv", dest="out_csv", default=None, help="Write ranked pairs as CSV")
+    s.add_argument("--min-overlap", type=float, default=None,
+                   help="Fingerprint overlap a pair needs before it is scored (default: SCAN_MIN_OVERLAP)")
+    s.add_argument("--top", type=int, default=None, help="Keep only the N highest-scoring pairs")
+    t = sub.add_parser("fit-tfidf", help="Fit the TF-IDF model on a reference corpus (TFIDF_MODE=corpus)")
+    t.add_argument("directory")
+    t.add_argument("--out", default=Config.TFIDF_MODEL_PATH, help="Where to save the fitted model")
+    i = sub.add_parser("index", help="Add a directory of past submissions to the archive index (VECTOR_INDEX_PATH)")
+    i.add_argument("directory", nargs="?", default=None, help="Files to add; an already indexed name is replaced")
+    i.add_argument("--remove", nargs="+", default=None, metavar="NAME", help="Drop these names from the index")
+    q = sub.add_parser("similar", help="Find the archived files most similar to a file")
+    q.add_argument("file")
+    q.add_argument("--k", type=int, default=10, help="Number of files and chunks to return")
+    q.add_argument("--rerank", type=int, default=None,
+                   help="Re-score this many nearest files with the full ensemble (default: INDEX_RERANK)")
+    q.add_argument("--json", dest="out_json", default=None, help="Write JSON report to file")
+    fa = sub.add_parser("fp-add", help="Add a directory to the fingerprint index of an assignment (FP_INDEX_DIR)")
+    fa.add_argument("directory")
+    fa.add_argument("--namespace", default="default", help="Assignment the files belong to")
+    fa.add_argument("--base", action="store_true", help="Register the files as starter code to exclude from matches")
+    fa.add_argument("--prefix", default="", help="Prefix for the stored names, e.g. '2024_fall/'")
+    fr = sub.add_parser("fp-remove", help="Remove documents from the fingerprint index")
+    fr.add_argument("names", nargs="+")
+    fr.add_argument("--namespace", default="default")
+    fq = sub.add_parser("fp-query", help="Indexed documents sharing the most fingerprints with a file")
+    fq.add_argument("file")
+    fq.add_argument("--namespace", default="default")
+    fq.add_argument("--top", type=int, default=10)
+    fq.add_argument("--json", dest="out_json", default=None, help="Write JSON report to file")
+    fc = sub.add_parser("fp-compact", help="Merge the segments of a fingerprint index namespace")
+    fc.add_argument("--namespace", default="default")
+    b = sub.add_parser("parity", help="Compare embedding backends against torch fp32 (cosine drift, latency)")
+    b.add_argument("directory", help="Source files whose chunks are embedded")
+    b.add_argument("--backends", default=",".join(BACKENDS), help="Comma-separated backends to check")
+    b.add_argument("--max-texts", type=int, default=256, help="Embed at most this many chunks")
+    b.add_argument("--json", dest="out_json", default=None, help="Write JSON report to file")
+    o = sub.add_parser("export-onnx", help="Export the embedding model for EMBED_BACKEND=onnx/onnx-int8")
+    o.add_argument("--out", default=None, help="Output directory (default ONNX_MODEL_DIR)")
+    o.add_argument("--int8", action="store_true", help="Also write the int8-quantized graph")
     args = p.parse_args()
     if args.cmd == "compare":
-        compare_files(args.file1, args.file2, args.out_json)
+        compare_files(args.file1, args.file2, args.out_json, timings=args.timings, profile=args.profile,
+                      score_only=args.score_only)
+    elif args.cmd == "scan":
+        scan_directory(args.directory, args.out_json, args.out_csv, args.min_overlap, args.top)
+    elif args.cmd == "fit-tfidf":
+        fit_tfidf(args.directory, args.out)
+    elif args.cmd == "index":
+        index_directory(args.directory, args.remove)
+    elif args.cmd == "similar":
+        similar_files(args.file, args.k, args.rerank, args.out_json)
+    elif args.cmd == "fp-add":
+        fp_add(args.directory, args.namespace, args.base, args.prefix)
+    elif args.cmd == "fp-remove":
+        index = fp_index_from_config(Config, args.namespace)
+        for name in args.names:
+            if not index.remove(name):
+                print(f"not in index: {name}", file=sys.stderr)
+    elif args.cmd == "fp-query":
+        fp_query(args.file, args.namespace, args.top, args.out_json)
+    elif args.cmd == "fp-compact":
+        merged = fp_index_from_config(Config, args.namespace).compact()
+        print(f"merged {merged} segments", file=sys.stderr)
+    elif args.cmd == "parity":
+        backend_parity(args.directory, [n for n in args.backends.split(",") if n], args.max_texts, args.out_json)
+    elif args.cmd == "export-onnx":
+        export_onnx_model(args.out, args.int8)
 
 if __name__ == '__main__':
     main()
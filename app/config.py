@@ -7,4 +7,74 @@ class Config:
     DEVICE = os.getenv("DEVICE", "cpu")
     SIM_THRESHOLD = float(os.getenv("SIM_THRESHOLD", "0.80"))
     TOPK_CHUNK_MATCHES = int(os.getenv("TOPK_CHUNK_MATCHES", "5"))
+    # content-addressed on-disk embedding cache shared by all workers; set EMBED_CACHE_PATH="" to disable
+    EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "scpis", "embeddings.sqlite3"))
+    EMBED_CACHE_MAX_MB = int(os.getenv("EMBED_CACHE_MAX_MB", "512"))
+    # finished comparisons (scores, matches, spans) keyed by both sources and the engine settings; "" disables
+    RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "scpis", "results.sqlite3"))
+    RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "256"))
+    RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", str(7 * 86400)))  # seconds; 0 keeps results until evicted
+    # "mmap": append-only memory-mapped store in EMBED_STORE_DIR instead, one copy in RAM for all workers
+    EMBED_CACHE_BACKEND = os.getenv("EMBED_CACHE_BACKEND", "sqlite")
+    EMBED_STORE_DIR = os.getenv("EMBED_STORE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "scpis", "embeddings.store"))
+    EMBED_STORE_DTYPE = os.getenv("EMBED_STORE_DTYPE", "float16")  # or float32
+    # embedding backend: torch (fp32), torch-int8, onnx or onnx-int8; the model loads on first use
+    EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+    ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "") or None  # exported graphs; default ~/.cache/scpis/onnx/<model>
+    # load the model and run one inference in the background when the app starts (GET /readyz turns 200 after it)
+    EMBED_WARMUP = os.getenv("EMBED_WARMUP", "false").lower() == "true"
+    # torch threads per process, 0 = torch default (gunicorn.conf.py sets cores / workers)
+    TORCH_THREADS = int(os.getenv("TORCH_THREADS", "0"))
+    TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "0"))
+    # web server: coalesce concurrent embedding requests into one batch
+    EMBED_MICROBATCH = os.getenv("EMBED_MICROBATCH", "true").lower() == "true"
+    EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", "64"))  # texts per forward pass
+    EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))  # how long to wait for more callers
+    # TF-IDF: "pair" refits per comparison (legacy), "corpus" loads a model fitted with
+    # `cli fit-tfidf`, "hashing" is stateless
+    TFIDF_MODE = os.getenv("TFIDF_MODE", "pair")
+    TFIDF_MODEL_PATH = os.getenv("TFIDF_MODEL_PATH", "tfidf.joblib")
+    # staged scoring: fingerprints, then TF-IDF, then the model; exit early outside these bounds
+    SCORER_CASCADE = os.getenv("SCORER_CASCADE", "false").lower() == "true"
+    CASCADE_FP_LOW = float(os.environ["CASCADE_FP_LOW"]) if os.getenv("CASCADE_FP_LOW") else None
+    CASCADE_FP_HIGH = float(os.getenv("CASCADE_FP_HIGH", "0.85"))
+    CASCADE_TFIDF_LOW = float(os.getenv("CASCADE_TFIDF_LOW", "0.15"))
+    CASCADE_TFIDF_HIGH = float(os.getenv("CASCADE_TFIDF_HIGH", "0.95"))
+    SIM_BLOCK_MB = int(os.getenv("SIM_BLOCK_MB", "64"))  # largest chunk-similarity tile held in memory
+    CHUNKING = os.getenv("CHUNKING", "structure")  # structure (functions/classes) or window (fixed windows)
+    CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "128"))  # max lexer tokens per chunk
+    CHUNK_MATCH_MUTUAL = os.getenv("CHUNK_MATCH_MUTUAL", "false").lower() == "true"  # only mutual best chunk pairs
+    HEATMAP_SIZE = int(os.getenv("HEATMAP_SIZE", "32"))  # chunk heatmap cells per side; 0 disables it
+    SPAN_MIN_TOKENS = int(os.getenv("SPAN_MIN_TOKENS", "10"))  # shortest highlighted match, in tokens
+    SPAN_MAX_SECONDS = float(os.getenv("SPAN_MAX_SECONDS", "2.0"))  # time budget for span alignment
+    # /api/compare response size: "score" (no explanation work), "summary" (scores, top matches, first span
+    # offsets; the rest from /api/comparisons/<id>/...) or "full"; clients choose with ?detail=
+    COMPARE_DETAIL = os.getenv("COMPARE_DETAIL", "full")
+    SUMMARY_SPANS = int(os.getenv("SUMMARY_SPANS", "20"))  # span offsets in a summary response
+    PAGE_MAX = int(os.getenv("PAGE_MAX", "200"))  # largest page of spans or source lines from a follow-up endpoint
+    SCAN_MIN_OVERLAP = float(os.getenv("SCAN_MIN_OVERLAP", "0.10"))  # fingerprint Jaccard needed to score a pair
+    SCAN_MAX_DF = float(os.getenv("SCAN_MAX_DF", "0.5"))  # ignore fingerprints shared by more than this fraction of files
+    # POST /api/batch: a whole class as one zip/tar upload; each member is still capped at MAX_CONTENT_LENGTH
+    BATCH_MAX_ARCHIVE_MB = int(os.getenv("BATCH_MAX_ARCHIVE_MB", "256"))
+    BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "2000"))  # source files kept per upload; bounds memory
+    BATCH_TOP = int(os.getenv("BATCH_TOP", "50"))  # highest-scoring pairs in the closing summary
+    # archive of past submissions for "find similar" queries (cli index / similar, POST /api/similar)
+    VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", os.path.join(os.path.expanduser("~"), ".cache", "scpis", "vectors.sqlite3"))
+    INDEX_NPROBE = int(os.getenv("INDEX_NPROBE", "8"))  # IVF lists scanned per query once the index is trained
+    INDEX_RERANK = int(os.getenv("INDEX_RERANK", "5"))  # nearest files re-scored with the full ensemble
+    # fingerprint index of past submissions, one namespace per assignment (cli fp-add / fp-query, POST /api/fp-matches)
+    FP_INDEX_DIR = os.getenv("FP_INDEX_DIR", os.path.join(os.path.expanduser("~"), ".cache", "scpis", "fpindex"))
+    FP_INDEX_MAX_SEGMENTS = int(os.getenv("FP_INDEX_MAX_SEGMENTS", "8"))  # compact in the background beyond this
+    FP_INDEX_OPEN_MAX = int(os.getenv("FP_INDEX_OPEN_MAX", "32"))  # namespaces a web worker keeps open
+    # asynchronous comparison jobs: local worker threads, status shared through SQLite
+    JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(os.path.expanduser("~"), ".cache", "scpis", "jobs.sqlite3"))
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "64"))  # queued jobs per process before 429
+    JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))  # seconds a finished job is kept
+    JOB_LEASE = float(os.getenv("JOB_LEASE", "60"))  # seconds an unfinished job survives its process
+    # observability: per-stage timings feed the Prometheus histograms on GET /metrics;
+    # ?timings=1 adds them to a compare response, ?profile=1 a sampling profile (if allowed)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "false").lower() == "true"
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
     DEBUG = os.getenv("DEBUG", "false").lower() == "true"
@@ -0,0 +1,86 @@
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from .fingerprint import kgram_hashes
+
+# kept verbatim when aligning; every other identifier becomes ID so renames still match
+KEYWORDS = frozenset("""
+abstract and as assert async await auto bool boolean break byte case catch char class const continue
+def default defer del delete do double elif else elsif end enum except explicit export extends extern
+false final finally float fn for foreach from func function go goto if impl implements import in
+inline instanceof int interface internal is lambda let long loop match mod module mut namespace native
+new nil none None not null object of operator or override package pass private protected pub public
+raise register return self short signed sizeof static struct super switch synchronized template then
+this throw throws trait true True False try type typedef typeof union unless unsigned until use using
+val var virtual void volatile when where while with yield
+""".split())
+
+def abstract_tokens(texts: List[str]) -> List[str]:
+    return [t if t in KEYWORDS or not (t[0].isalpha() or t[0] == "_") or t in ("STR", "NUM") else "ID"
+            for t in texts]
+
+def greedy_tiles(a: List[str], b: List[str], min_match: int = 10, max_occurrences: int = 64,
+                 max_rounds: int = 4, max_seconds: Optional[float] = None) -> Tuple[List[Tuple[int, int, int]], bool]:
+    """Greedy String Tiling anchored on min_match-gram hashes.
+
+    Every unmarked k-gram of a is looked up in a hash index of b and extended
+    into a maximal match; each diagonal is extended only once per round. The
+    longest non-overlapping matches become tiles, and further rounds pick up
+    what was blocked by earlier tiles. Grams that occur more than
+    max_occurrences times in b (boilerplate) are not used as anchors, and
+    max_seconds caps the total time. Returns ((a_pos, b_pos, length), ...) sorted
+    by a_pos and whether the time budget cut the search short.
+    """
+    k = min_match
+    na, nb = len(a), len(b)
+    if na < k or nb < k or k <= 0:
+        return [], False
+    deadline = time.perf_counter() + max_seconds if max_seconds else None
+    ha = kgram_hashes(a, k).tolist()
+    hb = kgram_hashes(b, k).tolist()
+    marked_a = bytearray(na)
+    marked_b = bytearray(nb)
+    tiles = []
+    truncated = False
+    for _ in range(max_rounds):
+        index: Dict[int, List[int]] = defaultdict(list)
+        for j, h in enumerate(hb):
+            if not marked_b[j]:
+                index[h].append(j)
+        matches = []
+        reach: Dict[int, int] = {}
+        for i, h in enumerate(ha):
+            if deadline is not None and not i & 1023 and time.perf_counter() > deadline:
+                truncated = True
+                break
+            if marked_a[i]:
+                continue
+            posts = index.get(h)
+            if not posts or len(posts) > max_occurrences:
+                continue
+            for j in posts:
+                d = j - i
+                if reach.get(d, -1) > i:
+                    continue  # already inside a match found on this diagonal
+                n = 0
+                while (i + n < na and j + n < nb and a[i + n] == b[j + n]
+                       and not marked_a[i + n] and not marked_b[j + n]):
+                    n += 1
+                reach[d] = i + n
+                if n >= k:
+                    matches.append((n, i, j))
+        if not matches:
+            break
+        matches.sort(key=lambda m: (-m[0], m[1], m[2]))
+        accepted = 0
+        for n, i, j in matches:
+            if 1 in marked_a[i:i + n] or 1 in marked_b[j:j + n]:
+                continue
+            marked_a[i:i + n] = b"\x01" * n
+            marked_b[j:j + n] = b"\x01" * n
+            tiles.append((i, j, n))
+            accepted += 1
+        if truncated or accepted == len(matches):
+            break
+    tiles.sort()
+    return tiles, truncated
@@ -0,0 +1,127 @@
+import os
+import tarfile
+import tempfile
+import zipfile
+from typing import BinaryIO, Iterable, Iterator, NamedTuple, Optional
+
+_ZIP_MAGIC = (b"PK\x03\x04", b"PK\x05\x06")
+_COPY_CHUNK = 1 << 16
+_SPOOL_BYTES = 1 << 20  # zip uploads beyond this go to a temp file
+
+class Member(NamedTuple):
+    name: str
+    code: Optional[str]  # None when skipped
+    skipped: Optional[str] = None  # "too_large" or "max_files"
+
+class ArchiveTooLarge(ValueError):
+    pass
+
+class _Peeked:
+    """Read-only stream with its first bytes already read (for format sniffing)."""
+
+    def __init__(self, head: bytes, stream: BinaryIO):
+        self.head, self.stream = head, stream
+
+    def read(self, n: int = -1) -> bytes:
+        if not self.head:
+            return self.stream.read(n)
+        if n is None or n < 0:
+            out, self.head = self.head + self.stream.read(), b""
+            return out
+        out, self.head = self.head[:n], self.head[n:]
+        if len(out) < n:
+            out += self.stream.read(n - len(out))
+        return out
+
+def _read_limited(f: BinaryIO, max_bytes: int) -> Optional[bytes]:
+    # one byte more than allowed tells an oversized member apart, whatever its header claims
+    data = f.read(max_bytes + 1)
+    return None if len(data) > max_bytes else data
+
+def _wanted(name: str, exts) -> bool:
+    parts = name.replace("\\", "/").split("/")
+    if any(p.startswith(".") or p == "__MACOSX" for p in parts if p):
+        return False
+    return os.path.splitext(name)[1].lower() in exts
+
+def _spool(stream: BinaryIO, max_archive_bytes: Optional[int]):
+    spooled = tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES)
+    total = 0
+    while True:
+        block = stream.read(_COPY_CHUNK)
+        if not block:
+            break
+        total += len(block)
+        if max_archive_bytes is not None and total > max_archive_bytes:
+            spooled.close()
+            raise ArchiveTooLarge(f"archive exceeds {max_archive_bytes} bytes")
+        spooled.write(block)
+    spooled.seek(0)
+    return spooled
+
+def _zip_members(spooled, zf: zipfile.ZipFile, exts, max_bytes: int) -> Iterator[Member]:
+    with spooled, zf:
+        for info in zf.infolist():
+            if info.is_dir() or not _wanted(info.filename, exts):
+                continue
+            if info.file_size > max_bytes:
+                yield Member(info.filename, None, "too_large")
+                continue
+            with zf.open(info) as member:
+                data = _read_limited(member, max_bytes)
+            yield (Member(info.filename, data.decode("utf-8", errors="ignore")) if data is not None
+                   else Member(info.filename, None, "too_large"))
+
+def _tar_members(tf: tarfile.TarFile, exts, max_bytes: int) -> Iterator[Member]:
+    with tf:
+        # stream mode: members are visited in archive order, each read before the next header
+        for info in tf:
+            if not info.isfile() or not _wanted(info.name, exts):
+                continue
+            if info.size > max_bytes:
+                yield Member(info.name, None, "too_large")
+                continue
+            f = tf.extractfile(info)
+            data = _read_limited(f, max_bytes) if f is not None else None
+            yield (Member(info.name, data.decode("utf-8", errors="ignore")) if data is not None
+                   else Member(info.name, None, "too_large"))
+
+def open_archive(stream: BinaryIO, extensions: Iterable[str], max_bytes: int,
+                 max_files: Optional[int] = None, max_archive_bytes: Optional[int] = None) -> Iterator[Member]:
+    """Members of a zip or (optionally gzip/bz2/xz compressed) tar archive, one at a time.
+
+    Tarballs are decompressed straight off `stream`, which need not be
+    seekable, so a member is yielded as soon as its bytes arrived. Zip keeps
+    its directory at the end, so a zip upload is first spooled (to disk beyond
+    1 MB) and then read member by member. Only files with one of `extensions`
+    are considered; members over `max_bytes` and those past `max_files` are
+    yielded as skipped without being kept. The format is detected, and invalid
+    input raises ValueError, before this returns.
+    """
+    exts = {e.lower() for e in extensions}
+    head = stream.read(4)
+    if head[:4] in _ZIP_MAGIC:
+        spooled = _spool(_Peeked(head, stream), max_archive_bytes)
+        try:
+            zf = zipfile.ZipFile(spooled)
+        except zipfile.BadZipFile as e:
+            spooled.close()
+            raise ValueError(f"not a valid zip archive: {e}") from None
+        members = _zip_members(spooled, zf, exts, max_bytes)
+    else:
+        try:
+            tf = tarfile.open(fileobj=_Peeked(head, stream), mode="r|*")
+        except (tarfile.TarError, EOFError, OSError) as e:
+            raise ValueError(f"not a zip or tar archive: {e}") from None
+        members = _tar_members(tf, exts, max_bytes)
+    return _cap(members, max_files)
+
+def _cap(members: Iterator[Member], max_files: Optional[int]) -> Iterator[Member]:
+    kept = 0
+    for m in members:
+        if m.code is not None and max_files is not None:
+            if kept >= max_files:
+                m = Member(m.name, None, "max_files")
+            else:
+                kept += 1
+        yield m
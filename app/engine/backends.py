@@ -0,0 +1,234 @@
+import json
+import os
+import time
+import warnings
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+_ONNX_FILE = "model.onnx"
+_ONNX_INT8_FILE = "model.int8.onnx"
+_ONNX_META = "scpis_onnx.json"
+_ONNX_POOLING = ("mean", "cls", "max")
+
+def _length_batches(texts: Sequence[str], batch_size: int):
+    # longest first, so each batch pads to a similar length
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    for s in range(0, len(order), batch_size):
+        yield order[s:s + batch_size]
+
+class TorchBackend:
+    """SentenceTransformer forward pass, optionally with its Linear layers
+    dynamically quantized to int8 (CPU only)."""
+
+    def __init__(self, model_name: str, device: str = "cpu", quantize: bool = False):
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_name, device=device)
+        if quantize:
+            if device != "cpu":
+                raise ValueError("int8 quantization runs on CPU only")
+            import torch
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")  # torch.ao deprecation notice
+                model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, convert_to_numpy=True, show_progress_bar=False).astype(np.float32)
+
+def _onnx_paths(model_dir: str, quantize: bool):
+    return os.path.join(model_dir, _ONNX_INT8_FILE if quantize else _ONNX_FILE), os.path.join(model_dir, _ONNX_META)
+
+def default_onnx_dir(model_name: str) -> str:
+    safe = model_name.strip("/").replace("/", "__").replace(":", "_")
+    return os.path.join(os.path.expanduser("~"), ".cache", "scpis", "onnx", safe)
+
+def _onnx_pooling(model_name: str, st) -> str:
+    # the graph holds only the transformer; OnnxBackend redoes the pooling and
+    # normalization, so any other module (e.g. a Dense projection) would be lost
+    from sentence_transformers.models import Normalize, Pooling, Transformer
+    mods = list(st)
+    if (len(mods) < 2 or not isinstance(mods[0], Transformer) or not isinstance(mods[1], Pooling)
+            or not all(isinstance(m, Normalize) for m in mods[2:]) or len(mods) > 3):
+        raise ValueError(f"the ONNX backend supports Transformer, Pooling and Normalize modules only; "
+                         f"{model_name!r} has {[type(m).__name__ for m in mods]}")
+    mode = mods[1].get_config_dict()["pooling_mode"]
+    if mode not in _ONNX_POOLING:
+        raise ValueError(f"pooling mode {mode!r} is not supported by the ONNX backend")
+    return mode
+
+def export_onnx(model_name: str, model_dir: str, quantize: bool = False) -> str:
+    """Export the transformer of a SentenceTransformer to ONNX in model_dir,
+    together with its tokenizer and pooling settings. With quantize, an int8
+    copy (dynamic weight quantization) is written next to it. Returns the path
+    of the requested graph. Raises ValueError for models with modules the
+    backend cannot reproduce."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize
+    os.makedirs(model_dir, exist_ok=True)
+    fp32_path, meta_path = _onnx_paths(model_dir, False)
+    if not os.path.exists(fp32_path):
+        st = SentenceTransformer(model_name, device="cpu")
+        meta = {"model_name": model_name, "pooling_mode": _onnx_pooling(model_name, st),
+                "normalize": any(isinstance(m, Normalize) for m in st),
+                "max_seq_length": st.max_seq_length}
+
+        class _Encoder(torch.nn.Module):
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, input_ids, attention_mask):
+                return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+        sample = st.tokenizer(["def f ( x ) : return x"], return_tensors="pt")
+        axes = {0: "batch", 1: "sequence"}
+        tmp = f"{fp32_path}.{os.getpid()}.tmp"
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            torch.onnx.export(_Encoder(st[0].auto_model.eval()), (sample["input_ids"], sample["attention_mask"]),
+                              tmp, input_names=["input_ids", "attention_mask"],
+                              output_names=["last_hidden_state"],
+                              dynamic_axes={"input_ids": axes, "attention_mask": axes, "last_hidden_state": axes},
+                              opset_version=17, dynamo=False)
+        st.tokenizer.save_pretrained(model_dir)
+        with open(meta_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, fp32_path)  # other workers only ever see a complete graph
+    if not quantize:
+        return fp32_path
+    int8_path, _ = _onnx_paths(model_dir, True)
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        tmp = f"{int8_path}.{os.getpid()}.tmp"
+        quantize_dynamic(fp32_path, tmp, weight_type=QuantType.QInt8)
+        os.replace(tmp, int8_path)
+    return int8_path
+
+class OnnxBackend:
+    """ONNX Runtime inference on an exported graph (fp32 or int8).
+
+    The graph, tokenizer and pooling settings are read from model_dir; they are
+    exported there from the SentenceTransformer the first time. Once exported,
+    loading does not touch the torch weights at all.
+    """
+
+    def __init__(self, model_name: str, model_dir: Optional[str] = None, device: str = "cpu",
+                 quantize: bool = False, batch_size: int = 32):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        model_dir = model_dir or default_onnx_dir(model_name)
+        path = export_onnx(model_name, model_dir, quantize=quantize)
+        with open(_onnx_paths(model_dir, quantize)[1]) as f:
+            meta = json.load(f)
+        if meta["pooling_mode"] not in _ONNX_POOLING:
+            raise ValueError(f"pooling mode {meta['pooling_mode']!r} is not supported by the ONNX backend")
+        providers = ["CPUExecutionProvider"]
+        if device.startswith("cuda") and "CUDAExecutionProvider" in ort.get_available_providers():
+            providers.insert(0, "CUDAExecutionProvider")
+        self.session = ort.InferenceSession(path, providers=providers)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.pooling_mode = meta["pooling_mode"]
+        self.normalize = meta["normalize"]
+        self.max_seq_length = meta["max_seq_length"]
+        self.batch_size = batch_size
+
+    def _pool(self, hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        if self.pooling_mode == "cls":
+            return hidden[:, 0]
+        m = mask[:, :, None].astype(hidden.dtype)
+        if self.pooling_mode == "max":
+            return np.where(m > 0, hidden, -1e9).max(axis=1)
+        return (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        out = None
+        for idx in _length_batches(texts, self.batch_size):
+            enc = self.tokenizer([texts[i] for i in idx], padding=True, truncation=True,
+                                 max_length=self.max_seq_length, return_tensors="np")
+            ids = enc["input_ids"].astype(np.int64)
+            mask = enc["attention_mask"].astype(np.int64)
+            hidden = self.session.run(None, {"input_ids": ids, "attention_mask": mask})[0]
+            vecs = self._pool(hidden, mask)
+            if out is None:
+                out = np.empty((len(texts), vecs.shape[1]), dtype=np.float32)
+            out[idx] = vecs
+        if out is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self.normalize:
+            out /= np.clip(np.linalg.norm(out, axis=1, keepdims=True), 1e-12, None)
+        return out
+
+# backends loaded ahead of time, handed out by load_backend (see preload_backend)
+_PRELOADED: Dict[tuple, Any] = {}
+
+def preload_backend(name: str, model_name: str, device: str = "cpu", onnx_dir: Optional[str] = None):
+    """Load a backend once for this process and every process forked from it.
+
+    Meant for a pre-fork server master: load_backend() in the workers returns
+    this instance, whose weights the workers share copy-on-write. Torch only;
+    an ONNX Runtime session owns threads that do not survive fork(), so ONNX
+    backends are still loaded per worker (returns None for them).
+    """
+    if name not in ("torch", "torch-int8"):
+        return None
+    key = (name, model_name, device, onnx_dir)
+    if key not in _PRELOADED:
+        _PRELOADED[key] = load_backend(name, model_name, device=device, onnx_dir=onnx_dir)
+    return _PRELOADED[key]
+
+def is_preloaded(name: str, model_name: str, device: str = "cpu", onnx_dir: Optional[str] = None) -> bool:
+    return (name, model_name, device, onnx_dir) in _PRELOADED
+
+def set_torch_threads(intra: int = 0, interop: int = 0):
+    """Pin torch's thread pools; 0 keeps torch's default. The inter-op pool can
+    only be sized before its first use, later calls leave it alone."""
+    import torch
+    if intra > 0:
+        torch.set_num_threads(intra)
+    if interop > 0:
+        try:
+            torch.set_num_interop_threads(interop)
+        except RuntimeError:
+            pass
+
+def load_backend(name: str, model_name: str, device: str = "cpu", onnx_dir: Optional[str] = None):
+    preloaded = _PRELOADED.get((name, model_name, device, onnx_dir))
+    if preloaded is not None:
+        return preloaded
+    if name == "torch":
+        return TorchBackend(model_name, device=device)
+    if name == "torch-int8":
+        return TorchBackend(model_name, device=device, quantize=True)
+    if name in ("onnx", "onnx-int8"):
+        return OnnxBackend(model_name, model_dir=onnx_dir, device=device, quantize=name == "onnx-int8")
+    raise ValueError(f"unknown embedding backend {name!r}, expected one of {BACKENDS}")
+
+def parity_report(model_name: str, texts: List[str], backends: Sequence[str] = BACKENDS,
+                  device: str = "cpu", onnx_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Embed texts with every backend and compare each against torch fp32:
+    per-text cosine between the two embeddings, plus load and encode time."""
+    def run(name):
+        t0 = time.perf_counter()
+        backend = load_backend(name, model_name, device=device, onnx_dir=onnx_dir)
+        t1 = time.perf_counter()
+        vecs = backend.encode(texts)
+        return vecs, t1 - t0, time.perf_counter() - t1
+
+    ref, ref_load, ref_encode = run("torch")
+    ref_n = ref / np.clip(np.linalg.norm(ref, axis=1, keepdims=True), 1e-12, None)
+    report = {"model_name": model_name, "reference": "torch", "texts": len(texts), "backends": {}}
+    for name in backends:
+        vecs, load_s, encode_s = (ref, ref_load, ref_encode) if name == "torch" else run(name)
+        vecs_n = vecs / np.clip(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12, None)
+        cos = (ref_n * vecs_n).sum(axis=1)
+        report["backends"][name] = {
+            "load_seconds": load_s,
+            "encode_seconds": encode_s,
+            "mean_cosine": float(cos.mean()) if len(cos) else 1.0,
+            "min_cosine": float(cos.min()) if len(cos) else 1.0,
+            "max_abs_diff": float(np.abs(vecs - ref).max()) if len(cos) else 0.0,
+        }
+    return report
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List
+
+class _Request:
+    __slots__ = ("texts", "event", "result", "error")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class BatchingEmbedder:
+    """Coalesces encode() calls from concurrent threads into one padded batch.
+
+    A single background thread takes the oldest waiting request, keeps collecting
+    requests for up to max_wait_ms or until max_batch texts are gathered, runs
+    the wrapped embedder once on the de-duplicated texts and hands every caller
+    its own rows. Drop-in replacement for Embedder wherever encode() is used.
+    """
+
+    BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, float("inf"))
+
+    def __init__(self, embedder, max_batch: int = 64, max_wait_ms: float = 5.0):
+        self.embedder = embedder
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        self.batch_sizes = {b: 0 for b in self.BATCH_BUCKETS}
+        self._thread = threading.Thread(target=self._loop, name="scpis-embed-batcher", daemon=True)
+        self._thread.start()
+
+    def __getattr__(self, name):
+        # model_name, device, cache, model ... come from the wrapped embedder
+        if name == "embedder":
+            raise AttributeError(name)
+        return getattr(self.embedder, name)
+
+    def encode(self, texts: List[str]):
+        req = _Request(list(texts))
+        with self._cond:
+            self._pending.append(req)
+            self.requests += 1
+            self._cond.notify()
+        req.event.wait()
+        if req.error is not None:
+            raise req.error
+        return req.result
+
+    def _collect(self) -> List[_Request]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            batch = [self._pending.popleft()]
+            size = len(batch[0].texts)
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                if not self._pending:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        break
+                    self._cond.wait(left)
+                    continue
+                if size + len(self._pending[0].texts) > self.max_batch:
+                    break
+                req = self._pending.popleft()
+                batch.append(req)
+                size += len(req.texts)
+            return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            uniq = list(dict.fromkeys(t for req in batch for t in req.texts))
+            try:
+                embs = self.embedder.encode(uniq)
+            except Exception as e:
+                for req in batch:
+                    req.error = e
+                    req.event.set()
+                continue
+            row = {t: i for i, t in enumerate(uniq)}
+            for req in batch:
+                req.result = embs[[row[t] for t in req.texts]] if uniq else embs
+                req.event.set()
+            with self._cond:
+                self.batches += 1
+                self.texts += len(uniq)
+                bucket = next(b for b in self.BATCH_BUCKETS if len(uniq) <= b)
+                self.batch_sizes[bucket] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "texts": self.texts,
+                "queue_depth": len(self._pending),
+                "mean_batch_size": self.texts / self.batches if self.batches else 0.0,
+                "batch_size_buckets": {f"le_{b:g}": n for b, n in self.batch_sizes.items()},
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
@@ -0,0 +1,161 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+import numpy as np
+
+_TOUCH_FLUSH_KEYS = 1000
+_TOUCH_FLUSH_SECONDS = 30.0
+
+def content_key(text: str, model_name: str) -> str:
+    h = hashlib.sha256()
+    h.update(model_name.encode('utf-8'))
+    h.update(b'\0')
+    h.update(text.encode('utf-8', errors='surrogatepass'))
+    return h.hexdigest()
+
+class EmbeddingCache:
+    """On-disk embedding cache keyed by sha256(model name + normalized text).
+
+    Backed by SQLite in WAL mode so several gunicorn workers can share one file;
+    each thread gets its own connection. When the stored vectors exceed
+    max_bytes the least recently used entries are evicted; hits record their
+    access time in memory and write it in batches, so lookups stay read-only.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        # last_access of recent hits, written with the next put_many or after _TOUCH_FLUSH_KEYS / _SECONDS
+        self._touched: Dict[str, float] = {}
+        self._touch_flushed = time.time()
+        with self._conn() as c:
+            c.execute("CREATE TABLE IF NOT EXISTS embeddings ("
+                      "key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vec BLOB NOT NULL, "
+                      "nbytes INTEGER NOT NULL, last_access REAL NOT NULL)")
+            c.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings(last_access)")
+            # running total of the stored bytes, kept by triggers so eviction never has to SUM the table
+            c.execute("CREATE TABLE IF NOT EXISTS embeddings_size (id INTEGER PRIMARY KEY CHECK (id = 0), "
+                      "nbytes INTEGER NOT NULL)")
+            c.execute("CREATE TRIGGER IF NOT EXISTS embeddings_size_ins AFTER INSERT ON embeddings BEGIN "
+                      "UPDATE embeddings_size SET nbytes = nbytes + new.nbytes; END")
+            c.execute("CREATE TRIGGER IF NOT EXISTS embeddings_size_del AFTER DELETE ON embeddings BEGIN "
+                      "UPDATE embeddings_size SET nbytes = nbytes - old.nbytes; END")
+            c.execute("CREATE TRIGGER IF NOT EXISTS embeddings_size_upd AFTER UPDATE OF nbytes ON embeddings BEGIN "
+                      "UPDATE embeddings_size SET nbytes = nbytes + new.nbytes - old.nbytes; END")
+            c.execute("INSERT OR IGNORE INTO embeddings_size SELECT 0, COALESCE(SUM(nbytes), 0) FROM embeddings")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        if not keys:
+            return {}
+        out = {}
+        conn = self._conn()
+        uniq = list(dict.fromkeys(keys))
+        for i in range(0, len(uniq), 500):
+            part = uniq[i:i+500]
+            q = "SELECT key, dim, vec FROM embeddings WHERE key IN (%s)" % ",".join("?" * len(part))
+            for key, dim, vec in conn.execute(q, part):
+                out[key] = np.frombuffer(vec, dtype=np.float32).reshape(dim)
+        now = time.time()
+        with self._lock:
+            self.hits += sum(1 for k in keys if k in out)
+            self.misses += sum(1 for k in keys if k not in out)
+            self._touched.update(dict.fromkeys(out, now))
+            flush = len(self._touched) >= _TOUCH_FLUSH_KEYS or now - self._touch_flushed >= _TOUCH_FLUSH_SECONDS
+        if flush:
+            with conn:
+                self._flush_touches(conn)
+        return out
+
+    def _flush_touches(self, conn: sqlite3.Connection):
+        # write the buffered last_access times (in the caller's transaction)
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            self._touch_flushed = time.time()
+        if touched:
+            conn.executemany("UPDATE embeddings SET last_access=? WHERE key=?",
+                             [(t, k) for k, t in touched.items()])
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vec in items.items():
+            buf = np.ascontiguousarray(vec, dtype=np.float32).tobytes()
+            rows.append((key, int(vec.shape[-1]), buf, len(buf), now))
+        conn = self._conn()
+        with conn:
+            self._flush_touches(conn)
+            # an upsert rather than INSERT OR REPLACE: the replaced row's bytes reach the size trigger
+            conn.executemany("INSERT INTO embeddings(key, dim, vec, nbytes, last_access) VALUES (?, ?, ?, ?, ?) "
+                             "ON CONFLICT(key) DO UPDATE SET dim=excluded.dim, vec=excluded.vec, "
+                             "nbytes=excluded.nbytes, last_access=excluded.last_access", rows)
+        self._evict()
+
+    def _evict(self):
+        conn = self._conn()
+        total = conn.execute("SELECT nbytes FROM embeddings_size").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # free down to 90% of the cap so we do not evict on every insert
+        to_free = total - int(self.max_bytes * 0.9)
+        victims = []
+        for key, nbytes in conn.execute("SELECT key, nbytes FROM embeddings ORDER BY last_access"):
+            victims.append((key,))
+            to_free -= nbytes
+            if to_free <= 0:
+                break
+        with conn:
+            conn.executemany("DELETE FROM embeddings WHERE key=?", victims)
+        with self._lock:
+            self.evictions += len(victims)
+
+    def clear(self):
+        conn = self._conn()
+        with self._lock:
+            self._touched = {}
+        with conn:
+            conn.execute("DELETE FROM embeddings")
+
+    def stats(self) -> Dict[str, float]:
+        conn = self._conn()
+        entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        size = conn.execute("SELECT nbytes FROM embeddings_size").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+def cache_from_config(config):
+    # EMBED_CACHE_PATH="" turns embedding caching off whichever backend is configured
+    if not config.EMBED_CACHE_PATH:
+        return None
+    if config.EMBED_CACHE_BACKEND == "mmap":
+        from .store import EmbeddingStore
+        return EmbeddingStore(config.EMBED_STORE_DIR, dtype=config.EMBED_STORE_DTYPE,
+                              max_bytes=config.EMBED_CACHE_MAX_MB * 1024 * 1024)
+    return EmbeddingCache(config.EMBED_CACHE_PATH, max_bytes=config.EMBED_CACHE_MAX_MB * 1024 * 1024)
@@ -0,0 +1,218 @@
+import ast
+import hashlib
+import io
+from bisect import bisect_left
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from .document import Document
+from .preprocess import Tokens
+
+CHUNKING_MODES = ("structure", "window")
+
+class Chunk(NamedTuple):
+    text: str   # normalized text that is embedded
+    start: int  # character offsets into the original source
+    end: int
+    kind: str   # function, class, block or window
+    key: str    # content hash of text: unchanged chunks keep their key (and cached embedding)
+
+class _Unit(NamedTuple):
+    start: int  # token index range [start, end)
+    end: int
+    kind: str
+    children: Tuple["_Unit", ...]
+
+# a brace group whose header has one of these is a type, not a function
+_TYPE_WORDS = frozenset("class struct interface impl trait enum object namespace module".split())
+# a line starting with one of these continues the unit above it (indent heuristic)
+_CONTINUATIONS = frozenset("end } ) ] else elif elsif except finally rescue ensure when catch".split())
+# units nested deeper than this get no members (windows split them if too large), which bounds the recursion
+_MAX_DEPTH = 32
+
+def _key(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8', errors='surrogatepass')).hexdigest()
+
+def _python_units(code: str, tokens: Tokens) -> Optional[List[_Unit]]:
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+    lines = io.StringIO(code, newline='').readlines()  # the line breaks ast counts, no others
+    line_start = [0]
+    for ln in lines:
+        line_start.append(line_start[-1] + len(ln))
+
+    def offset(lineno: int, col: int) -> int:
+        # ast columns count UTF-8 bytes
+        line = lines[lineno - 1] if lineno - 1 < len(lines) else ""
+        return line_start[lineno - 1] + len(line.encode('utf-8')[:col].decode('utf-8', errors='ignore'))
+
+    def units(body) -> List[_Unit]:
+        out = []
+        for node in body:
+            first = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+            s = bisect_left(tokens.starts, offset(first, 0))
+            e = bisect_left(tokens.starts, offset(node.end_lineno, node.end_col_offset))
+            if e <= s:
+                continue
+            if isinstance(node, ast.ClassDef):
+                out.append(_Unit(s, e, "class", tuple(units(node.body))))
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                out.append(_Unit(s, e, "function", ()))
+            else:
+                out.append(_Unit(s, e, "block", ()))
+        return out
+
+    return units(tree.body)
+
+def _brace_units(texts: List[str], lo: int, hi: int, level: int = 0) -> List[_Unit]:
+    # top-level units of [lo, hi): a brace group closing back to depth 0, or a statement ending in ';'
+    out = []
+    depth, start, opened = 0, lo, None
+    i = lo
+    while i < hi:
+        t = texts[i]
+        if t == "{":
+            if depth == 0 and opened is None:
+                opened = i
+            depth += 1
+        elif t == "}" and depth:
+            depth -= 1
+            if depth == 0:
+                end = i + 1
+                if end < hi and texts[end] == ";":
+                    end += 1
+                header = texts[start:opened]
+                kind = "class" if _TYPE_WORDS.intersection(header) else "function" if "(" in header else "block"
+                children = tuple(_brace_units(texts, opened + 1, i, level + 1)) if level < _MAX_DEPTH else ()
+                out.append(_Unit(start, end, kind, children))
+                start, opened, i = end, None, end
+                continue
+        elif t == ";" and depth == 0:
+            out.append(_Unit(start, i + 1, "block", ()))
+            start = i + 1
+        i += 1
+    if start < hi:
+        out.append(_Unit(start, hi, "block", ()))
+    return out
+
+def _indent_units(code: str, tokens: Tokens, lo: int, hi: int, level: int = 0) -> List[_Unit]:
+    # units start at the least indented lines, once the line before was more indented or blank
+    if lo >= hi:
+        return []
+    first = []  # (token index, indent, blank line before) for tokens that start a line
+    prev_end = tokens.ends[lo - 1] if lo else 0
+    for i in range(lo, hi):
+        s = tokens.starts[i]
+        gap = code[prev_end:s]
+        if i == lo or "\n" in gap:
+            line_start = code.rfind("\n", 0, s) + 1
+            first.append((i, s - line_start, gap.count("\n") > 1))
+        prev_end = tokens.ends[i]
+    base = min(ind for _, ind, _ in first)
+    out = []
+    start, prev_indent = lo, base
+    for i, ind, blank in first[1:]:
+        if ind <= base and tokens.texts[i] not in _CONTINUATIONS and (prev_indent > base or blank):
+            out.append(_indent_unit(code, tokens, start, i, level))
+            start = i
+        prev_indent = ind
+    out.append(_indent_unit(code, tokens, start, hi, level))
+    return out
+
+def _indent_unit(code: str, tokens: Tokens, s: int, e: int, level: int) -> _Unit:
+    # children: the next indentation level, skipping the unit's own first line
+    nl = next((i for i in range(s + 1, e) if "\n" in code[tokens.ends[i - 1]:tokens.starts[i]]), e)
+    children = tuple(_indent_units(code, tokens, nl, e, level + 1)) if nl < e and level < _MAX_DEPTH else ()
+    return _Unit(s, e, "block" if len(children) <= 1 else "class", children if len(children) > 1 else ())
+
+def _windows(code: str, tokens: Tokens, s: int, e: int, size: int, kind: str = "window") -> List[_Unit]:
+    # fixed windows; a cut moves back to the last line start in the second half of the window
+    out = []
+    while e - s > size:
+        cut = s + size
+        for j in range(cut, s + size // 2, -1):
+            if "\n" in code[tokens.ends[j - 1]:tokens.starts[j]]:
+                cut = j
+                break
+        out.append(_Unit(s, cut, kind, ()))
+        s = cut
+    out.append(_Unit(s, e, kind, ()))
+    return out
+
+def _pack(code: str, tokens: Tokens, units: List[_Unit], max_tokens: int, min_tokens: int) -> List[_Unit]:
+    pieces = []
+    for u in units:
+        if u.end - u.start <= max_tokens:
+            pieces.append(u)
+        elif u.children:
+            parts, cur = [], u.start
+            for c in u.children:
+                if c.start > cur:
+                    parts.append(_Unit(cur, c.start, "block", ()))
+                parts.append(c)
+                cur = c.end
+            if cur < u.end:
+                parts.append(_Unit(cur, u.end, "block", ()))
+            pieces.extend(_pack(code, tokens, parts, max_tokens, min_tokens))
+        else:
+            pieces.extend(_windows(code, tokens, u.start, u.end, max_tokens, "window"))
+    # merge small neighbours; the decision only looks at the two pieces involved,
+    # so an edit never moves boundaries far away from it
+    merged: List[_Unit] = []
+    for p in pieces:
+        if merged:
+            q = merged[-1]
+            n_q, n_p = q.end - q.start, p.end - p.start
+            if n_q + n_p <= max_tokens and (n_q < min_tokens or n_p < min_tokens):
+                kind = p.kind if n_q < min_tokens else q.kind
+                merged[-1] = _Unit(q.start, p.end, kind, ())
+                continue
+        merged.append(p)
+    return merged
+
+def _structure_units(doc: Document) -> List[_Unit]:
+    texts, n = doc.tokens.texts, len(doc.tokens)
+    if doc.language == "python":
+        units = _python_units(doc.code, doc.tokens)
+        if units is not None:
+            return units
+    if doc.language != "ruby" and "{" in texts:
+        return _brace_units(texts, 0, n)
+    return _indent_units(doc.code, doc.tokens, 0, n)
+
+def chunk_document(doc: Document, max_tokens: int = 128, min_tokens: int = 16,
+                   mode: str = "structure") -> List[Chunk]:
+    """Split a document into chunks with source offsets.
+
+    structure -- functions, classes and methods (Python ast; brace depth or
+                 indentation for other languages), large units split into
+                 their members, small neighbours merged, at most max_tokens
+                 lexer tokens each. A local edit only changes nearby chunks.
+    window    -- fixed windows of max_tokens tokens (boundaries ignore syntax).
+
+    Cached on the document.
+    """
+    if mode not in CHUNKING_MODES:
+        raise ValueError(f"unknown chunking mode {mode!r}, expected one of {CHUNKING_MODES}")
+    cache_key = ("chunks", mode, max_tokens, min_tokens)
+    cached = doc.features.get(cache_key)
+    if cached is not None:
+        return cached
+    toks = doc.tokens
+    if not len(toks):
+        chunks = [Chunk(doc.norm, 0, len(doc.code), "block", _key(doc.norm))]
+    else:
+        if mode == "structure":
+            units = _pack(doc.code, toks, _structure_units(doc), max_tokens, min_tokens)
+        else:
+            units = _windows(doc.code, toks, 0, len(toks), max_tokens)
+        chunks = []
+        for u in units:
+            start, end = toks.starts[u.start], toks.ends[u.end - 1]
+            text = toks.text(u.start, u.end)
+            chunks.append(Chunk(text, start, end, u.kind, _key(text)))
+    doc.features[cache_key] = chunks
+    return chunks
+
+def chunk_spans(chunks: List[Chunk]) -> List[Dict[str, object]]:
+    return [{"start": c.start, "end": c.end, "kind": c.kind, "key": c.key} for c in chunks]
@@ -0,0 +1,78 @@
+import heapq
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List
+
+class UnionFind:
+    """Disjoint sets over hashable keys, union by size with path halving."""
+
+    def __init__(self):
+        self.parent: Dict[Any, Any] = {}
+        self.size: Dict[Any, int] = {}
+
+    def find(self, x):
+        if x not in self.parent:
+            self.parent[x] = x
+            self.size[x] = 1
+            return x
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return ra
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+        return ra
+
+def cluster_pairs(pairs: Iterable[Dict[str, Any]], threshold: float, min_size: int = 2,
+                  top_edges: int = 5, top_matches: int = 3) -> List[Dict[str, Any]]:
+    """Collusion groups: connected components of the graph of flagged pairs.
+
+    `pairs` are scan results (file_a, file_b, ensemble_score, chunk_matches);
+    only those scoring at least `threshold` become edges, so the graph stays as
+    sparse as the flagged set and the whole pass is O(E log top_edges) for E
+    flagged edges. Each cluster lists its files, edge statistics, its strongest
+    edges and the best chunk matches among them, largest clusters first.
+    """
+    uf = UnionFind()
+    edges = []
+    for p in pairs:
+        if p['ensemble_score'] >= threshold:
+            uf.union(p['file_a'], p['file_b'])
+            edges.append(p)
+    members: Dict[Any, List[str]] = defaultdict(list)
+    for f in uf.parent:
+        members[uf.find(f)].append(f)
+    by_root: Dict[Any, List[Dict[str, Any]]] = defaultdict(list)
+    for e in edges:
+        by_root[uf.find(e['file_a'])].append(e)
+
+    clusters = []
+    for root, files in members.items():
+        if len(files) < min_size:
+            continue
+        group = by_root[root]
+        scores = [e['ensemble_score'] for e in group]
+        strongest = heapq.nlargest(top_edges, group, key=lambda e: e['ensemble_score'])
+        matches = [{"file_a": e['file_a'], "file_b": e['file_b'], **m}
+                   for e in strongest for m in e.get('chunk_matches') or []]
+        possible = len(files) * (len(files) - 1) // 2
+        clusters.append({
+            "size": len(files),
+            "files": sorted(files),
+            "edges": len(group),
+            "density": len(group) / possible,
+            "max_score": max(scores),
+            "mean_score": sum(scores) / len(scores),
+            "strongest_edges": [{"file_a": e['file_a'], "file_b": e['file_b'],
+                                 "ensemble_score": e['ensemble_score']} for e in strongest],
+            "chunk_matches": heapq.nlargest(top_matches, matches, key=lambda m: m['score']),
+        })
+    clusters.sort(key=lambda c: (-c['size'], -c['max_score'], c['files'][0]))
+    return [{"cluster_id": i, **c} for i, c in enumerate(clusters)]
@@ -0,0 +1,189 @@
+import csv
+import heapq
+import os
+from collections import defaultdict
+from itertools import combinations
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from .clusters import cluster_pairs
+from .document import Document, prepare_document
+
+def iter_source_files(directory: str, extensions: Iterable[str]) -> List[str]:
+    exts = {e.lower() for e in extensions}
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for fn in sorted(files):
+            if os.path.splitext(fn)[1].lower() in exts:
+                paths.append(os.path.join(root, fn))
+    return paths
+
+def load_corpus(directory: str, extensions: Iterable[str], max_bytes: Optional[int] = None) -> List[Document]:
+    docs = []
+    for path in iter_source_files(directory, extensions):
+        if max_bytes is not None and os.path.getsize(path) > max_bytes:
+            continue
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            code = f.read()
+        docs.append(prepare_document(code, name=os.path.relpath(path, directory)))
+    return docs
+
+def hash_overlap(shared: int, n_a: int, n_b: int) -> float:
+    # same Jaccard as fingerprint_overlap, from a shared-hash count
+    union = n_a + n_b - shared
+    return shared / union if union else 0.0
+
+# max_df only applies from this many files on: in a small class, a hash shared by many files is
+# more likely a copied solution than boilerplate; and even then no hash held by this few is skipped
+_MAX_DF_MIN_FILES = 20
+_MIN_POSTINGS = 8
+
+def _max_postings(n_docs: int, max_df: float) -> int:
+    if n_docs < _MAX_DF_MIN_FILES:
+        return n_docs
+    return max(_MIN_POSTINGS, int(max_df * n_docs))
+
+def candidate_pairs(docs: List[Document], min_overlap: float = 0.1,
+                    max_df: float = 0.5) -> List[Tuple[int, int, float]]:
+    """Pairs (i, j, overlap) whose fingerprint overlap reaches min_overlap.
+
+    Uses an inverted hash -> documents index, so only pairs sharing at least one
+    fingerprint are ever counted. Hashes found in more than max_df of the files
+    (shared boilerplate) are skipped to keep the posting lists short, once
+    there are enough files for that fraction to mean boilerplate.
+    """
+    hash_sets = [d.fingerprint_hashes() for d in docs]
+    postings: Dict[int, List[int]] = defaultdict(list)
+    for i, hs in enumerate(hash_sets):
+        for h in hs.tolist():
+            postings[h].append(i)
+    max_postings = _max_postings(len(docs), max_df)
+    shared: Dict[Tuple[int, int], int] = defaultdict(int)
+    for ids in postings.values():
+        if len(ids) < 2 or len(ids) > max_postings:
+            continue
+        for pair in combinations(ids, 2):
+            shared[pair] += 1
+    out = []
+    for (i, j), n in shared.items():
+        ov = hash_overlap(n, hash_sets[i].size, hash_sets[j].size)
+        if ov >= min_overlap:
+            out.append((i, j, ov))
+    out.sort(key=lambda x: x[2], reverse=True)
+    return out
+
+def _pair_record(a: Document, b: Document, overlap: float, report: Dict[str, Any], threshold: float) -> Dict[str, Any]:
+    return {
+        "file_a": a.name,
+        "file_b": b.name,
+        "candidate_overlap": overlap,
+        "ensemble_score": report['ensemble_score'],
+        "components": report['components'],
+        "early_exit": report['early_exit'],
+        "suspicious": report['ensemble_score'] >= threshold,
+        "chunk_matches": report['chunks']['topk_matches'],
+    }
+
+def scan_corpus(docs: List[Document], scorer, min_overlap: float = 0.1,
+                threshold: float = 0.8, max_df: float = 0.5, top: Optional[int] = None) -> Dict[str, Any]:
+    n = len(docs)
+    total = n * (n - 1) // 2
+    cands = candidate_pairs(docs, min_overlap=min_overlap, max_df=max_df)
+    # TF-IDF for all candidates in one sparse product
+    tfidf = scorer.tfidf.pairwise_cosine(docs, [(i, j) for i, j, _ in cands])
+    results = []
+    for (i, j, ov), tcos in zip(cands, tfidf):
+        report = scorer.score_documents(docs[i], docs[j], tfidf_cos=float(tcos))
+        results.append(_pair_record(docs[i], docs[j], ov, report, threshold))
+    results.sort(key=lambda r: r['ensemble_score'], reverse=True)
+    clusters = cluster_pairs(results, threshold)
+    if top is not None:
+        results = results[:top]
+    return {
+        "files": n,
+        "threshold": threshold,
+        "min_overlap": min_overlap,
+        "pairs_total": total,
+        "pairs_scored": len(cands),
+        "pairs_pruned": total - len(cands),
+        "pairs": results,
+        "clusters": clusters,
+    }
+
+def scan_stream(members: Iterable, scorer, min_overlap: float = 0.1, threshold: float = 0.8,
+                max_df: float = 0.5, top: int = 20) -> Iterator[Dict[str, Any]]:
+    """Incremental scan_corpus over files arriving one at a time.
+
+    `members` yields objects with `name`, `code` and `skipped` (see
+    archive.open_archive). Each new file is prepared, looked up in the inverted
+    fingerprint index of the files before it, and scored against those whose
+    overlap reaches min_overlap; then it is added to the index. Events, in order:
+    {"type": "file"} per accepted file, {"type": "skipped"} per rejected one,
+    {"type": "pair"} per suspicious pair as soon as it is scored, and one final
+    {"type": "summary"} with the `top` highest-scoring pairs and the clusters of
+    suspicious pairs (only those are kept until the end). The boilerplate
+    cut-off (max_df) uses the document frequencies seen so far.
+    """
+    docs: List[Document] = []
+    sizes: List[int] = []
+    postings: Dict[int, List[int]] = defaultdict(list)
+    best: List[Tuple[float, int, Dict[str, Any]]] = []  # min-heap of the top pairs
+    flagged: List[Dict[str, Any]] = []
+    scored = skipped = 0
+    for m in members:
+        if m.code is None:
+            skipped += 1
+            yield {"type": "skipped", "file": m.name, "reason": m.skipped}
+            continue
+        doc = scorer.prepare(m.code, m.name)
+        k = len(docs)
+        hashes = doc.fingerprint_hashes()
+        max_postings = _max_postings(k + 1, max_df)
+        shared: Dict[int, int] = defaultdict(int)
+        for h in hashes.tolist():
+            ids = postings[h]
+            if len(ids) < max_postings:
+                for i in ids:
+                    shared[i] += 1
+            ids.append(k)
+        docs.append(doc)
+        sizes.append(hashes.size)
+        yield {"type": "file", "file": doc.name, "index": k}
+        cands = [(i, hash_overlap(n, sizes[i], hashes.size)) for i, n in shared.items()]
+        cands = sorted((c for c in cands if c[1] >= min_overlap), key=lambda c: c[1], reverse=True)
+        for i, ov in cands:
+            record = _pair_record(docs[i], doc, ov, scorer.score_documents(docs[i], doc), threshold)
+            scored += 1
+            if record["suspicious"]:
+                flagged.append(record)
+                yield {"type": "pair", **record}
+            item = (record["ensemble_score"], scored, record)
+            if len(best) < top:
+                heapq.heappush(best, item)
+            elif top > 0:
+                heapq.heappushpop(best, item)
+    n = len(docs)
+    total = n * (n - 1) // 2
+    yield {
+        "type": "summary",
+        "files": n,
+        "skipped": skipped,
+        "threshold": threshold,
+        "min_overlap": min_overlap,
+        "pairs_total": total,
+        "pairs_scored": scored,
+        "pairs_pruned": total - scored,
+        "pairs": [r for _, _, r in sorted(best, key=lambda x: (-x[0], x[1]))],
+        "clusters": cluster_pairs(flagged, threshold),
+    }
+
+CSV_FIELDS = ["file_a", "file_b", "ensemble_score", "embedding_cos", "tfidf_cos", "fp_overlap",
+              "candidate_overlap", "suspicious"]
+
+def write_scan_csv(result: Dict[str, Any], path: str):
+    with open(path, 'w', newline='') as f:
+        w = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        w.writeheader()
+        for r in result['pairs']:
+            row = {k: r[k] for k in ("file_a", "file_b", "ensemble_score", "candidate_overlap", "suspicious")}
+            row.update(r['components'])
+            w.writerow(row)
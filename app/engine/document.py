@@ -0,0 +1,36 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+import numpy as np
+from .preprocess import Tokens, language_for, lex
+from .fingerprint import Fingerprints, winnowing_fingerprints
+from .metrics import NO_TIMINGS, Timings
+
+@dataclass
+class Document:
+    # everything the engine derives from one source file, computed once
+    name: str
+    code: str
+    language: str
+    tokens: Tokens = field(repr=False)
+    norm: str
+    # positions are indices into tokens, so tokens.starts maps a fingerprint back to the source
+    fingerprints: Fingerprints
+    # derived per-document artifacts (e.g. the TF-IDF row), filled lazily by the scorer
+    features: Dict[str, Any] = field(default_factory=dict, repr=False)
+
+    def fingerprint_hashes(self) -> np.ndarray:
+        return self.fingerprints.unique_hashes()
+
+def prepare_document(code: str, name: str = "", k: int = 5, window: int = 4,
+                     language: Optional[str] = None, timings: Timings = NO_TIMINGS) -> Document:
+    # one lexer pass; the normalized text (TF-IDF, embeddings), the fingerprints
+    # and later the chunks and spans all come from its token stream
+    language = language or language_for(name)
+    with timings.stage("lex", bytes=len(code)):
+        toks = lex(code, language)
+        norm = toks.text()
+    timings.sizes("lex", tokens=len(toks))
+    with timings.stage("winnow"):
+        fps = winnowing_fingerprints(toks.texts, k=k, window=window)
+    timings.sizes("winnow", fingerprints=len(fps))
+    return Document(name=name, code=code, language=language, tokens=toks, norm=norm, fingerprints=fps)
@@ -1,20 +1,142 @@
-from typing import List, Dict, Any
+import threading
+import time
+from typing import List, Dict, Any, Optional, Union
 import numpy as np
 import torch
-from sentence_transformers import SentenceTransformer, util
+from .backends import BACKENDS, load_backend
+from .cache import EmbeddingCache, content_key
+from .store import EmbeddingStore
+from .similarity import BlockedSimilarity, chunk_matches
 
 class Embedder:
-    def __init__(self, model_name: str, device: str = "cpu"):
-        self.model = SentenceTransformer(model_name, device=device)
+    """Sentence embeddings through a pluggable backend (see backends.BACKENDS).
+
+    Nothing is loaded at construction; the model is loaded on the first
+    encode() (or warmup()), once, even with concurrent callers.
+    """
+
+    def __init__(self, model_name: str, device: str = "cpu",
+                 cache: Optional[Union[EmbeddingCache, EmbeddingStore]] = None,
+                 backend: str = "torch", onnx_dir: Optional[str] = None):
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown embedding backend {backend!r}, expected one of {BACKENDS}")
+        self.model_name = model_name
+        self.device = device
+        self.cache = cache
+        self.backend = backend
+        self.onnx_dir = onnx_dir
+        # quantized/exported backends drift slightly, so they get their own cache entries
+        self.cache_namespace = model_name if backend == "torch" else f"{model_name}@{backend}"
+        self.load_seconds: Optional[float] = None
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    t0 = time.perf_counter()
+                    model = load_backend(self.backend, self.model_name, device=self.device,
+                                         onnx_dir=self.onnx_dir)
+                    self.load_seconds = time.perf_counter() - t0
+                    self._model = model
+        return self._model
+
+    def warmup(self):
+        # load the model and run one tiny batch, bypassing the cache
+        self.model.encode(["def warmup ( ) : return NUM"])
+
+    def _to_tensor(self, rows: np.ndarray):
+        return torch.from_numpy(rows).to(self.device)
+
     def encode(self, texts: List[str]):
-        return self.model.encode(texts, convert_to_tensor=True, show_progress_bar=False)
+        if self.cache is None:
+            if not texts:
+                return self._to_tensor(np.zeros((0, 0), dtype=np.float32))
+            return self._to_tensor(self.model.encode(list(texts)))
+        found, keys = self._fill_cache(texts)
+        rows = np.stack([found[k] for k in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+        return self._to_tensor(rows.astype(np.float32, copy=False))
+
+    def encode_rows(self, texts: List[str]) -> np.ndarray:
+        """Embeddings as a numpy array. With a memory-mapped store as cache these
+        are the stored rows themselves (a zero-copy view when they were stored
+        together, e.g. the chunks of one file), in the store's dtype."""
+        if self.cache is None or not hasattr(self.cache, "rows") or not texts:
+            return self.encode(texts).cpu().numpy()
+        _, keys = self._fill_cache(texts)
+        return self.cache.rows(keys)
+
+    def _fill_cache(self, texts: List[str]):
+        # look every text up by content hash; only the misses go through the model
+        keys = [content_key(t, self.cache_namespace) for t in texts]
+        found = self.cache.get_many(keys)
+        missing = {}
+        for k, t in zip(keys, texts):
+            if k not in found and k not in missing:
+                missing[k] = t
+        if missing:
+            vecs = self.model.encode(list(missing.values()))
+            fresh = {k: np.asarray(v, dtype=np.float32) for k, v in zip(missing, vecs)}
+            self.cache.put_many(fresh)
+            found.update(fresh)
+        return found, keys
+
+def encode_batch(embedder: Embedder, texts: List[str]):
+    """Encode texts in one forward pass: duplicates are embedded once and the
+    batch is length-sorted (longest first) to keep padding low. Rows come back
+    in input order."""
+    uniq = list(dict.fromkeys(texts))
+    order = sorted(range(len(uniq)), key=lambda i: len(uniq[i]), reverse=True)
+    embs = embedder.encode([uniq[i] for i in order])
+    pos = {uniq[i]: r for r, i in enumerate(order)}
+    idx = torch.tensor([pos[t] for t in texts], dtype=torch.long, device=embs.device)
+    return embs.index_select(0, idx)
+
+def encode_groups(embedder: Embedder, groups: List[List[str]]) -> List[np.ndarray]:
+    """Embeddings of several groups of texts (e.g. the files and the chunks of
+    a comparison), all texts in one model pass, as one numpy array per group.
+
+    With a memory-mapped store as cache a group's rows are read from the store
+    (a zero-copy view when they were stored together, in the store's dtype)
+    instead of being stacked into a fresh float32 copy; otherwise this is
+    encode_batch, split per group.
+    """
+    texts = [t for g in groups for t in g]
+    bounds = np.cumsum([0] + [len(g) for g in groups]).tolist()
+    if not hasattr(embedder.cache, "rows"):
+        embs = encode_batch(embedder, texts).cpu().numpy()
+        return [embs[a:b] for a, b in zip(bounds, bounds[1:])]
+    # misses go through the model once and are appended in group order, so that
+    # a group stored in this call (e.g. one file's chunks) is read back as a view
+    embedder._fill_cache(list(dict.fromkeys(texts)))
+    keys = [content_key(t, embedder.cache_namespace) for t in texts]
+    return [embedder.cache.rows(keys[a:b]) for a, b in zip(bounds, bounds[1:])]
+
+def cos_sim(a, b):
+    # same as sentence_transformers.util.cos_sim, without importing the package;
+    # two numpy inputs (e.g. float16 views from the embedding store) stay in numpy
+    if isinstance(a, np.ndarray) and isinstance(b, np.ndarray):
+        a = np.atleast_2d(a).astype(np.float32)
+        b = np.atleast_2d(b).astype(np.float32)
+        a /= np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+        b /= np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+        return a @ b.T
+    a = torch.from_numpy(np.array(a, dtype=np.float32)) if isinstance(a, np.ndarray) else a.float()
+    b = torch.from_numpy(np.array(b, dtype=np.float32)) if isinstance(b, np.ndarray) else b.float()
+    if a.dim() == 1:
+        a = a.unsqueeze(0)
+    if b.dim() == 1:
+        b = b.unsqueeze(0)
+    return torch.nn.functional.normalize(a, dim=1) @ torch.nn.functional.normalize(b, dim=1).T
 
 def cosine(u, v) -> float:
-    if isinstance(u, np.ndarray):
-        u = torch.tensor(u)
-    if isinstance(v, np.ndarray):
-        v = torch.tensor(v)
-    return float(util.cos_sim(u, v).item())
+    return float(cos_sim(u, v)[0, 0])
 
 def chunk_text(text: str, max_tokens: int = 128, stride: int = 96) -> List[str]:
     # token-agnostic sliding window on whitespace tokens
@@ -34,15 +156,12 @@ def chunk_text(text: str, max_tokens: int = 128, stride: int = 96) -> List[str]:
     return chunks
 
 def topk_chunk_matches(chunks1: List[str], chunks2: List[str], embedder: Embedder, topk: int = 5):
-    e1 = embedder.encode(chunks1)
-    e2 = embedder.encode(chunks2)
-    sims = util.cos_sim(e1, e2)  # [n1, n2]
-    results = []
-    for i in range(sims.size(0)):
-        # best match j for each i
-        j = int(torch.argmax(sims[i]).item())
-        score = float(sims[i][j].item())
-        results.append({"chunk1_idx": i, "chunk2_idx": j, "score": score})
-    # take global top-k
-    results = sorted(results, key=lambda x: x["score"], reverse=True)[:topk]
-    return results
+    e1 = embedder.encode_rows(chunks1)
+    e2 = embedder.encode_rows(chunks2)
+    return topk_embedding_matches(e1, e2, topk=topk)
+
+def topk_embedding_matches(e1, e2, topk: int = 5, mutual: bool = False,
+                           max_block_bytes: int = 64 * 1024 * 1024):
+    # best match per chunk of e1, global top-k; see similarity.BlockedSimilarity
+    sim = BlockedSimilarity(k=1, max_block_bytes=max_block_bytes).compute(e1, e2)
+    return chunk_matches(sim, topk=topk, mutual=mutual)
@@ -1,8 +1,35 @@
-from typing import List, Dict, Any, Tuple
+import warnings
+from typing import List, Dict, Any, Optional, Tuple
 from diff_match_patch import diff_match_patch
+from .align import abstract_tokens, greedy_tiles
+from .document import Document, prepare_document
 
-def highlight_similar_regions(a: str, b: str, threshold: float = 0.8) -> Dict[str, Any]:
-    # simple char-level diff; in UI we render insert/delete/equals
+def highlight_documents(doc_a: Document, doc_b: Document, min_match: int = 10,
+                        max_seconds: float = 2.0) -> Dict[str, Any]:
+    # token-level alignment on normalized, identifier-abstracted tokens;
+    # tiles are mapped back to character offsets in the original sources
+    tiles, truncated = greedy_tiles(abstract_tokens(doc_a.tokens.texts), abstract_tokens(doc_b.tokens.texts),
+                                    min_match=min_match, max_seconds=max_seconds)
+    ta, tb = doc_a.tokens, doc_b.tokens
+    spans = []
+    for i, j, n in tiles:
+        a_start, a_end = ta.starts[i], ta.ends[i + n - 1]
+        b_start, b_end = tb.starts[j], tb.ends[j + n - 1]
+        spans.append({"a_start": a_start, "a_end": a_end, "b_start": b_start, "b_end": b_end,
+                      "tokens": n, "text": doc_a.code[a_start:a_end][:200]})
+    return {"spans": spans, "truncated": truncated}
+
+def highlight_similar_regions(a: str, b: str, threshold: Optional[float] = None, name_a: str = "",
+                              name_b: str = "", min_match: int = 10) -> Dict[str, Any]:
+    # threshold never had an effect (spans are selected by min_match); it stays
+    # in its positional slot only so that old calls keep working
+    if threshold is not None:
+        warnings.warn("highlight_similar_regions(threshold=...) has no effect and will be removed; "
+                      "use min_match", DeprecationWarning, stacklevel=2)
+    return highlight_documents(prepare_document(a, name_a), prepare_document(b, name_b), min_match=min_match)
+
+def highlight_similar_regions_chars(a: str, b: str) -> Dict[str, Any]:
+    # legacy char-level diff on raw text; kept for comparison benchmarks
     dmp = diff_match_patch()
     diffs = dmp.diff_main(a, b)
     dmp.diff_cleanupSemantic(diffs)
@@ -20,4 +47,4 @@ def highlight_similar_regions(a: str, b: str, threshold: float = 0.8) -> Dict[st
             pos_a += length
         else:  # insertion to b
             pos_b += length
-    return {"spans": spans, "raw_diffs": diffs}
+    return {"spans": spans}
@@ -1,32 +1,92 @@
-from typing import List, Tuple, Set
+import zlib
+from collections import deque
+from functools import lru_cache
+from typing import List
+import numpy as np
 
-def kgrams(tokens: List[str], k: int) -> List[Tuple[int, Tuple[str, ...]]]:
-    out = []
-    for i in range(len(tokens)-k+1):
-        out.append((i, tuple(tokens[i:i+k])))
-    return out
+# Karp-Rabin base; all arithmetic is modulo 2**64 (numpy uint64 wraps around)
+KR_BASE = np.uint64(1000003)
 
-def winnowing_fingerprints(tokens: List[str], k: int = 5, window: int = 4) -> Set[Tuple[int, int]]:
-    # returns set of (hash, pos) minima
+class Fingerprints:
+    """Winnowed fingerprints of one document: parallel uint64 hash and int64
+    k-gram position arrays, plus the sorted distinct hashes used for overlap."""
+    __slots__ = ("hashes", "positions", "_unique")
+
+    def __init__(self, hashes: np.ndarray, positions: np.ndarray):
+        self.hashes = hashes
+        self.positions = positions
+        self._unique = None
+
+    def __len__(self) -> int:
+        return int(self.hashes.size)
+
+    def __iter__(self):
+        return zip(self.hashes.tolist(), self.positions.tolist())
+
+    def unique_hashes(self) -> np.ndarray:
+        if self._unique is None:
+            self._unique = np.unique(self.hashes)
+        return self._unique
+
+EMPTY = Fingerprints(np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64))
+
+@lru_cache(maxsize=65536)
+def token_id(tok: str) -> int:
+    # stable across processes, unlike the salted builtin hash()
+    return zlib.crc32(tok.encode('utf-8', errors='surrogatepass')) + 1
+
+def kgram_hashes(tokens: List[str], k: int) -> np.ndarray:
+    """Karp-Rabin hash of every k-gram of token IDs.
+
+    Horner's rule is applied to k shifted views at once, which gives exactly the
+    values of the rolling recurrence h[i+1] = (h[i] - id[i]*B^(k-1))*B + id[i+k]
+    without a Python-level loop over positions.
+    """
+    n = len(tokens) - k + 1
+    if k <= 0 or n <= 0:
+        return np.zeros(0, dtype=np.uint64)
+    ids = np.fromiter((token_id(t) for t in tokens), dtype=np.uint64, count=len(tokens))
+    h = np.zeros(n, dtype=np.uint64)
+    for j in range(k):
+        h = h * KR_BASE + ids[j:j+n]
+    return h
+
+def winnow(hashes: np.ndarray, window: int) -> np.ndarray:
+    """Positions selected by robust winnowing (rightmost minimum per window),
+    using a monotone deque so each hash is pushed and popped at most once."""
+    hs = hashes.tolist()
+    if not hs:
+        return np.zeros(0, dtype=np.int64)
+    if len(hs) < window:
+        # shorter than one window: keep the single minimum
+        m = min(hs)
+        return np.array([len(hs) - 1 - hs[::-1].index(m)], dtype=np.int64)
+    dq = deque()
+    picked = []
+    last = -1
+    for i, h in enumerate(hs):
+        while dq and hs[dq[-1]] >= h:
+            dq.pop()
+        dq.append(i)
+        if dq[0] <= i - window:
+            dq.popleft()
+        if i >= window - 1 and dq[0] != last:
+            last = dq[0]
+            picked.append(last)
+    return np.array(picked, dtype=np.int64)
+
+def winnowing_fingerprints(tokens: List[str], k: int = 5, window: int = 4) -> Fingerprints:
     if k <= 0 or window <= 0 or len(tokens) < k:
-        return set()
-    kgs = kgrams(tokens, k)
-    hashes = [hash(kg) for _, kg in kgs]
-    res = set()
-    last_min = None
-    for i in range(len(hashes)-window+1):
-        window_hashes = hashes[i:i+window]
-        m = min(window_hashes)
-        pos = i + window_hashes.index(m)
-        cand = (m, pos)
-        if cand != last_min:
-            res.add(cand)
-            last_min = cand
-    return res
-
-def fingerprint_overlap(fp1: Set[Tuple[int,int]], fp2: Set[Tuple[int,int]]) -> float:
-    if not fp1 and not fp2:
+        return EMPTY
+    hashes = kgram_hashes(tokens, k)
+    pos = winnow(hashes, window)
+    return Fingerprints(hashes[pos], pos)
+
+def fingerprint_overlap(fp1: Fingerprints, fp2: Fingerprints) -> float:
+    # Jaccard similarity of the distinct fingerprint hashes (sorted arrays)
+    a = fp1.unique_hashes()
+    b = fp2.unique_hashes()
+    if a.size == 0 and b.size == 0:
         return 0.0
-    inter = len(fp1 & fp2)
-    union = len(fp1 | fp2) if (fp1 or fp2) else 1
-    return inter / union
+    inter = np.intersect1d(a, b, assume_unique=True).size
+    return inter / (a.size + b.size - inter)
@@ -0,0 +1,311 @@
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from .document import Document
+from .fingerprint import Fingerprints
+
+try:
+    import fcntl
+except ImportError:  # no cross-process locking on Windows; threads are still serialized
+    fcntl = None
+
+# one posting per winnowed fingerprint, segments sorted by hash
+POSTING = np.dtype([("hash", "<u8"), ("doc", "<u4"), ("pos", "<u4")])
+_NAMESPACE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+# compacted segments stay on disk this long after the manifest dropped them, for readers of the old manifest
+_RETIRE_SECONDS = 60.0
+
+class UnknownNamespace(LookupError):
+    pass
+
+def _postings(doc_id: int, fps: Fingerprints) -> np.ndarray:
+    out = np.empty(len(fps), dtype=POSTING)
+    out["hash"] = fps.hashes
+    out["doc"] = doc_id
+    out["pos"] = fps.positions
+    return out
+
+class FingerprintIndex:
+    """On-disk inverted index fingerprint hash -> (document, position), MOSS style.
+
+    Each namespace (assignment) is a directory of immutable, hash-sorted
+    segments written once per add and read through mmap, plus a JSON manifest
+    that is replaced atomically under a file lock, so several processes can add
+    and query. Removed documents are tombstoned until compaction merges the
+    segments into one. Fingerprints of registered base (starter) code are
+    dropped from queries, so only what a submission added can match. With
+    create=False a namespace that was never written raises UnknownNamespace
+    instead of being created.
+    """
+
+    def __init__(self, root: str, namespace: str = "default", max_segments: int = 8, create: bool = True):
+        if not _NAMESPACE.match(namespace):
+            raise ValueError(f"invalid namespace {namespace!r}")
+        if not create and not os.path.exists(os.path.join(root, namespace, "manifest.json")):
+            raise UnknownNamespace(f"unknown namespace {namespace!r}")
+        self.root = root
+        self.namespace = namespace
+        self.dir = os.path.join(root, namespace)
+        self.max_segments = max_segments
+        self._lock = threading.RLock()
+        self._manifest: Dict[str, Any] = {}
+        self._mtime = None
+        self._segments: Dict[str, np.ndarray] = {}
+        self._base = np.zeros(0, dtype=np.uint64)
+        self._compactor: Optional[threading.Thread] = None
+        if create:
+            os.makedirs(self.dir, exist_ok=True)
+
+    @staticmethod
+    def namespaces(root: str) -> List[str]:
+        if not os.path.isdir(root):
+            return []
+        return sorted(d for d in os.listdir(root) if os.path.exists(os.path.join(root, d, "manifest.json")))
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.dir, name)
+
+    @contextmanager
+    def _write_lock(self):
+        with self._lock, open(self._path(".lock"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                yield self._manifest
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        # pick up changes made by other processes (manifest replaced => new mtime)
+        path = self._path("manifest.json")
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            if not self._manifest:
+                self._manifest = {"next_doc": 0, "next_segment": 0, "segments": [], "docs": {},
+                                  "deleted": [], "base_files": []}
+            return
+        if mtime == self._mtime:
+            return
+        with open(path) as f:
+            self._manifest = json.load(f)
+        self._mtime = mtime
+        self._segments = {s: self._segments.get(s) for s in self._manifest["segments"]}
+        base = self._path("base.npy")
+        self._base = np.load(base) if os.path.exists(base) else np.zeros(0, dtype=np.uint64)
+
+    def _save(self):
+        tmp = self._path(f"manifest.json.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self._manifest, f)
+        os.replace(tmp, self._path("manifest.json"))
+        self._mtime = os.stat(self._path("manifest.json")).st_mtime_ns
+
+    def _write_segment(self, manifest: Dict[str, Any], postings: np.ndarray) -> str:
+        name = f"seg-{manifest['next_segment']:06d}.npy"
+        manifest["next_segment"] += 1
+        postings = postings[np.argsort(postings["hash"], kind="stable")]
+        tmp = self._path(name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, postings)
+        os.replace(tmp, self._path(name))
+        return name
+
+    def _segment(self, name: str) -> np.ndarray:
+        seg = self._segments.get(name)
+        if seg is None:
+            seg = np.load(self._path(name), mmap_mode="r")
+            self._segments[name] = seg
+        return seg
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._manifest["docs"]) - len(self._manifest["deleted"])
+
+    def add_many(self, docs: Sequence[Document]) -> List[int]:
+        """Index documents as one new segment; a name already present is replaced."""
+        with self._write_lock() as m:
+            by_name = {v[0]: int(k) for k, v in m["docs"].items()}
+            deleted = set(m["deleted"])
+            ids, parts = [], []
+            for d in docs:
+                old = by_name.get(d.name)
+                if old is not None and old not in deleted:
+                    m["deleted"].append(old)
+                    deleted.add(old)
+                doc_id = m["next_doc"]
+                m["next_doc"] += 1
+                m["docs"][str(doc_id)] = [d.name, len(d.fingerprints), len(d.fingerprint_hashes())]
+                by_name[d.name] = doc_id
+                parts.append(_postings(doc_id, d.fingerprints))
+                ids.append(doc_id)
+            if parts:
+                m["segments"].append(self._write_segment(m, np.concatenate(parts)))
+            self._purge_retired(m)
+            self._save()
+            many = len(m["segments"]) > self.max_segments
+        if many:
+            self.compact_async()
+        return ids
+
+    def remove(self, name: str) -> bool:
+        with self._write_lock() as m:
+            deleted = set(m["deleted"])
+            ids = [int(k) for k, v in m["docs"].items() if v[0] == name and int(k) not in deleted]
+            if ids:
+                m["deleted"].extend(ids)
+                self._save()
+            return bool(ids)
+
+    def add_base(self, docs: Iterable[Document]):
+        """Register starter code: its fingerprints never count as matches."""
+        docs = list(docs)
+        with self._write_lock() as m:
+            hashes = [self._base] + [d.fingerprint_hashes() for d in docs]
+            self._base = np.unique(np.concatenate(hashes)).astype(np.uint64)
+            tmp = self._path("base.npy.tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, self._base)
+            os.replace(tmp, self._path("base.npy"))
+            m["base_files"] = sorted(set(m["base_files"]) | {d.name for d in docs})
+            m["base_hashes"] = int(self._base.size)
+            self._save()
+
+    def compact(self) -> int:
+        """Merge all current segments into one, dropping tombstoned documents and
+        base-code postings. The merge runs without the lock; segments added
+        meanwhile are kept. Returns the number of segments merged."""
+        with self._write_lock() as m:
+            names = list(m["segments"])
+            dead = set(m["deleted"])
+            base = self._base
+        if len(names) < 2 and not dead:
+            return 0
+        merged = np.concatenate([np.asarray(self._segment(n)) for n in names] + [np.zeros(0, dtype=POSTING)])
+        keep = ~np.isin(merged["doc"], np.fromiter(dead, dtype=np.uint32, count=len(dead)))
+        if base.size:
+            keep &= ~np.isin(merged["hash"], base)
+        merged = merged[keep]
+        with self._write_lock() as m:
+            if not set(names) <= set(m["segments"]):
+                return 0  # another process compacted these segments first
+            seg = self._write_segment(m, merged)
+            m["segments"] = [seg] + [s for s in m["segments"] if s not in names]
+            m["deleted"] = [d for d in m["deleted"] if d not in dead]
+            for d in dead:
+                m["docs"].pop(str(d), None)
+            # a reader may still hold the old manifest: the merged segments are deleted by a later write
+            self._purge_retired(m)
+            now = time.time()
+            m.setdefault("retired", []).extend([n, now] for n in names)
+            self._save()
+            self._segments = {s: self._segments.get(s) for s in m["segments"]}
+        return len(names)
+
+    def _purge_retired(self, manifest: Dict[str, Any]):
+        # delete segments compacted away more than _RETIRE_SECONDS ago (under the write lock)
+        cutoff = time.time() - _RETIRE_SECONDS
+        keep = []
+        for name, retired in manifest.get("retired", []):
+            if retired > cutoff:
+                keep.append([name, retired])
+                continue
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+        manifest["retired"] = keep
+
+    def compact_async(self):
+        # at most one background compaction per index object
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            self._compactor = threading.Thread(target=self.compact, name="scpis-fp-compact", daemon=True)
+            self._compactor.start()
+
+    def query(self, fps: Fingerprints, top: int = 10, min_shared: int = 1, exclude: Optional[str] = None,
+              with_positions: bool = False) -> Dict[str, Any]:
+        """Indexed documents ranked by the number of distinct fingerprints they
+        share with fps (base code excluded)."""
+        t0 = time.perf_counter()
+        with self._lock:
+            try:
+                m, q, hits = self._lookup(fps)
+            except FileNotFoundError:
+                # a segment was purged after outliving the retire period: read the current manifest once more
+                self._mtime = None
+                m, q, hits = self._lookup(fps)
+            docs = m["docs"]
+            dead = set(m["deleted"])
+        postings = np.concatenate(hits) if hits else np.zeros(0, dtype=POSTING)
+        if dead:
+            postings = postings[~np.isin(postings["doc"], np.fromiter(dead, dtype=np.uint32, count=len(dead)))]
+        pairs = np.unique(np.stack([postings["doc"].astype(np.uint64), postings["hash"]], axis=1), axis=0) \
+            if postings.size else np.zeros((0, 2), dtype=np.uint64)
+        doc_ids, shared = np.unique(pairs[:, 0], return_counts=True)
+        order = np.argsort(-shared, kind="stable")
+        query_pos: Dict[int, List[int]] = {}
+        if with_positions:
+            for h, p in fps:
+                query_pos.setdefault(h, []).append(p)
+        matches = []
+        for i in order.tolist():
+            if shared[i] < min_shared:
+                break
+            name, n_fp, n_unique = docs[str(int(doc_ids[i]))]
+            if name == exclude:
+                continue
+            entry = {"name": name, "shared": int(shared[i]), "doc_fingerprints": n_unique,
+                     "containment": int(shared[i]) / q.size if q.size else 0.0}
+            if with_positions:
+                # (query k-gram index, indexed k-gram index) for every shared fingerprint
+                sel = postings[postings["doc"] == doc_ids[i]]
+                entry["positions"] = sorted((qp, int(p)) for h, p in zip(sel["hash"].tolist(), sel["pos"].tolist())
+                                            for qp in query_pos[h])
+            matches.append(entry)
+            if len(matches) >= top:
+                break
+        return {"namespace": self.namespace, "query_fingerprints": int(q.size), "matches": matches,
+                "seconds": time.perf_counter() - t0}
+
+    def _lookup(self, fps: Fingerprints) -> Tuple[Dict[str, Any], np.ndarray, List[np.ndarray]]:
+        # postings of the query's (non-base) hashes in every live segment
+        self._refresh()
+        m = self._manifest
+        q = fps.unique_hashes()
+        if self._base.size:
+            q = q[~np.isin(q, self._base, assume_unique=True)]
+        hits = []
+        for name in m["segments"]:
+            seg = self._segment(name)
+            keys = seg["hash"]
+            lo = np.searchsorted(keys, q, side="left")
+            hi = np.searchsorted(keys, q, side="right")
+            found = hi > lo
+            if not found.any():
+                continue
+            rows = np.concatenate([np.arange(a, b) for a, b in zip(lo[found], hi[found])])
+            hits.append(np.asarray(seg[rows]))
+        return m, q, hits
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            m = self._manifest
+            return {"namespace": self.namespace, "documents": len(m["docs"]) - len(m["deleted"]),
+                    "tombstones": len(m["deleted"]), "segments": len(m["segments"]),
+                    "postings": int(sum(self._segment(s).shape[0] for s in m["segments"])),
+                    "base_files": len(m["base_files"]), "base_hashes": int(self._base.size)}
+
+def fp_index_from_config(config, namespace: str = "default", create: bool = True) -> FingerprintIndex:
+    return FingerprintIndex(config.FP_INDEX_DIR, namespace=namespace, max_segments=config.FP_INDEX_MAX_SEGMENTS,
+                            create=create)
@@ -0,0 +1,213 @@
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+class Timings:
+    """Wall time and input sizes of the stages of one comparison.
+
+    Stages are recorded with `with timings.stage("embed", texts=12): ...`;
+    a stage entered twice (once per file) adds up its time and sizes and
+    counts calls. NO_TIMINGS is the disabled recorder:
+    its stage() hands back one shared no-op context, so instrumented code
+    costs a method call when nobody is measuring.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, Any]] = {}
+
+    @contextmanager
+    def stage(self, name: str, **sizes):
+        t0 = time.perf_counter()
+        try:
+            yield self
+        finally:
+            rec = self._record(name)
+            rec["seconds"] += time.perf_counter() - t0
+            rec["calls"] += 1
+            self.sizes(name, **sizes)
+
+    def sizes(self, name: str, **sizes):
+        # sizes only known once the stage has run (e.g. tokens out of the lexer)
+        rec = self._record(name)
+        for k, v in sizes.items():
+            rec[k] = rec.get(k, 0) + v
+
+    def _record(self, name: str) -> Dict[str, Any]:
+        rec = self.stages.get(name)
+        if rec is None:
+            rec = self.stages[name] = {"seconds": 0.0, "calls": 0}
+        return rec
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {name: {k: round(v, 6) if k == "seconds" else v for k, v in rec.items()}
+                for name, rec in self.stages.items()}
+
+class _NoTimings(Timings):
+    enabled = False
+    _null = nullcontext()
+
+    def stage(self, name: str, **sizes):
+        return self._null
+
+    def sizes(self, name: str, **sizes):
+        pass
+
+NO_TIMINGS: Timings = _NoTimings()
+
+# seconds; spans sub-millisecond lexing up to slow model batches
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name, self.help = name, help
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[Tuple[str, str], ...], List[float]] = {}  # bucket counts + [sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for key, s in sorted(series.items()):
+            cum = 0.0
+            for b, n in zip(self.buckets, s):
+                cum += n
+                le = 'le="%g"' % b
+                out.append(f"{self.name}_bucket{_labels(key, le)} {cum:g}")
+            le = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_labels(key, le)} {s[-1]:g}")
+            out.append(f"{self.name}_sum{_labels(key)} {s[-2]:.6f}")
+            out.append(f"{self.name}_count{_labels(key)} {s[-1]:g}")
+        return out
+
+class Gauge:
+    """Read when scraped: fn returns a number, a {label value: number} dict or None."""
+
+    def __init__(self, name: str, help: str, fn: Callable[[], Union[None, float, Dict[str, float]]],
+                 label: str = "", kind: str = "gauge"):
+        self.name, self.help, self.fn, self.label, self.kind = name, help, fn, label, kind
+
+    def render(self) -> List[str]:
+        try:
+            value = self.fn()
+        except Exception:  # a failing probe must not break the scrape
+            return []
+        if value is None:
+            return []
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        if isinstance(value, dict):
+            out += [f"{self.name}{_labels(((self.label, k),))} {float(v):g}" for k, v in sorted(value.items())]
+        else:
+            out.append(f"{self.name} {float(value):g}")
+        return out
+
+class Registry:
+    """Metrics of one process in the Prometheus text exposition format.
+
+    Each gunicorn worker keeps its own registry; scrape every worker (or run
+    one) when the numbers have to add up across processes.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Union[Histogram, Gauge]] = {}
+
+    def histogram(self, name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        if name not in self._metrics:
+            self._metrics[name] = Histogram(name, help, buckets)
+        return self._metrics[name]
+
+    def gauge(self, name: str, help: str, fn, label: str = "", kind: str = "gauge") -> Gauge:
+        self._metrics[name] = Gauge(name, help, fn, label, kind)
+        return self._metrics[name]
+
+    def observe_timings(self, timings: Timings):
+        if not timings.enabled:
+            return
+        h = self.histogram("scpis_stage_seconds", "Wall time per scoring stage")
+        for name, rec in timings.stages.items():
+            h.observe(rec["seconds"], stage=name)
+
+    def render(self) -> str:
+        lines = []
+        for m in self._metrics.values():
+            lines += m.render()
+        return "\n".join(lines) + "\n"
+
+class SamplingProfiler:
+    """Statistical profiler for one thread: a helper thread samples its stack
+    every `interval` seconds. collapsed() gives flame-graph input
+    ("outer;inner count" lines), top() the hottest frames by self time."""
+
+    def __init__(self, interval: float = 0.005, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="scpis-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{s} {n}" for s, n in self.stacks.most_common())
+
+    def top(self, n: int = 20) -> List[Dict[str, Any]]:
+        leaf = Counter()
+        for s, c in self.stacks.items():
+            leaf[s.rsplit(";", 1)[-1]] += c
+        return [{"frame": f, "samples": c, "share": c / self.samples} for f, c in leaf.most_common(n)]
+
+    def report(self, n: int = 20) -> Dict[str, Any]:
+        return {"interval": self.interval, "samples": self.samples, "top": self.top(n),
+                "collapsed": self.collapsed()}
+
+def profiled(enabled: bool, interval: float = 0.005):
+    return SamplingProfiler(interval) if enabled else nullcontext()
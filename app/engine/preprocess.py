@@ -1,39 +1,170 @@
+import os
 import re
-from typing import List
-
-SINGLE_LINE_COMMENTS = [
-    (r"//.*?$", re.MULTILINE),          # C/C++/Java/JS
-    (r"#.*?$", re.MULTILINE),           # Python
-    (r"--.*?$", re.MULTILINE),          # SQL
-]
-MULTI_LINE_COMMENTS = [
-    (r"/\*.*?\*/", re.DOTALL),       # C-style
-    (r'"""[\s\S]*?"""', 0),     # Python triple double
-    (r"\'\'\'[\s\S]*?\'\'\'", 0),  # Python triple single
-]
-
-def strip_comments(code: str) -> str:
-    s = code
-    for pat, flags in SINGLE_LINE_COMMENTS:
-        s = re.sub(pat, "", s, flags=flags)
-    for pat, flags in MULTI_LINE_COMMENTS:
-        s = re.sub(pat, "", s, flags=flags)
-    return s
-
-def normalize_code(code: str) -> str:
-    # remove comments, normalize whitespace, collapse literals
-    s = strip_comments(code)
-    # normalize whitespace
-    s = re.sub(r"\r\n|\r", "\n", s)
-    s = re.sub(r"\t", " ", s)
-    s = re.sub(r" +", " ", s)
-    s = re.sub(r"\n{2,}", "\n\n", s)
-    # mask strings and numbers
-    s = re.sub(r"\".*?\"|\'.*?\'", '"STR"', s)
-    s = re.sub(r"\b\d+(?:\.\d+)?\b", 'NUM', s)
-    return s.strip()
-
-def simple_tokenize(code: str) -> List[str]:
-    # split by alnum boundaries and punctuation
-    toks = re.findall(r"[A-Za-z_][A-Za-z0-9_]*|\S", code)
-    return toks
+from itertools import accumulate, compress
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+class Token(NamedTuple):
+    text: str   # normalized form: identifier/keyword, single punctuation char, "STR" or "NUM"
+    start: int  # character offsets into the original source
+    end: int
+
+class Tokens(NamedTuple):
+    # token stream as parallel lists; tokens[i] gives a Token
+    texts: List[str]
+    starts: List[int]
+    ends: List[int]
+    # source layout before each token, normalized: "" (adjacent), " ", "\n" or "\n\n", plus " " if indented
+    seps: List[str]
+
+    def text(self, lo: int = 0, hi: Optional[int] = None) -> str:
+        """Normalized text of tokens[lo:hi]: the tokens laid out as in the
+        source, with whitespace and removed comments reduced to seps."""
+        hi = len(self.texts) if hi is None else hi
+        if lo >= hi:
+            return ""
+        out = [""] * (2 * (hi - lo) - 1)
+        out[0::2] = self.texts[lo:hi]
+        out[1::2] = self.seps[lo + 1:hi]
+        return "".join(out)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, i) -> Token:
+        return Token(self.texts[i], self.starts[i], self.ends[i])
+
+    def __iter__(self):
+        return map(Token, self.texts, self.starts, self.ends)
+
+# language families, selected by file extension
+EXTENSION_LANGUAGES = {
+    ".py": "python",
+    ".rb": "ruby",
+    ".php": "php",
+    ".js": "js", ".ts": "js",
+    ".go": "go",
+    ".c": "c", ".h": "c", ".cpp": "c", ".cc": "c", ".hpp": "c", ".m": "c", ".mm": "c",
+    ".java": "c", ".cs": "c", ".rs": "c",
+    ".kt": "jvm", ".scala": "jvm", ".swift": "jvm",
+}
+
+_LINE = {"c": r"//[^\r\n]*", "hash": r"#[^\r\n]*"}
+_BLOCK = {"c": r"/\*[\s\S]*?(?:\*/|\Z)", "ruby": r"^=begin\b[\s\S]*?(?:^=end\b[^\n]*|\Z)"}
+_DQ = r'"(?:\\.|[^"\\\n])*"'
+_SQ = r"'(?:\\.|[^'\\\n])*'"
+_CHAR = r"'(?:\\[^'\n]{1,10}|[^'\\\n])'"  # char literal, so Rust lifetimes stay punctuation
+_TRIPLE = r'"""[\s\S]*?(?:"""|\Z)|' + r"'''[\s\S]*?(?:'''|\Z)"
+_BACKTICK = r"`[^`]*`"
+
+_LANGUAGES = {
+    # comments, strings, characters that can open either
+    "python": ([_LINE["hash"]], [_TRIPLE, _DQ, _SQ], "#\"'"),
+    "ruby": ([_BLOCK["ruby"], _LINE["hash"]], [_DQ, _SQ], "=#\"'"),
+    "php": ([_BLOCK["c"], _LINE["c"], _LINE["hash"]], [_DQ, _SQ], "/#\"'"),
+    "js": ([_BLOCK["c"], _LINE["c"]], [_DQ, _SQ, _BACKTICK], "/\"'`"),
+    "go": ([_BLOCK["c"], _LINE["c"]], [_DQ, _CHAR, _BACKTICK], "/\"'`"),
+    "c": ([_BLOCK["c"], _LINE["c"]], [_DQ, _CHAR], "/\"'"),
+    "jvm": ([_BLOCK["c"], _LINE["c"]], [_TRIPLE, _DQ, _CHAR], "/\"'"),
+    "generic": ([_BLOCK["c"], _LINE["c"], _LINE["hash"]], [_TRIPLE, _DQ, _SQ], "/#\"'"),
+}
+
+_NUM = r"(?:0[xX][0-9a-fA-F_]+|0[bB][01_]+|(?:\d[\d_]*(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)[A-Za-z]*"
+_IDENT = r"[A-Za-z_][A-Za-z0-9_]*"
+
+def _build(comments: List[str], strings: List[str], openers: str) -> "re.Pattern":
+    # One capturing group around every token kind, so split() yields
+    # [gap, token, gap, token, ..., gap] with the gaps being pure whitespace.
+    # Identifiers and punctuation that cannot open a comment, string or number
+    # are tried first; only the remaining characters reach the slower branches,
+    # and the lookahead skips whitespace without trying any of them.
+    special = re.escape(openers + "0123456789.")
+    return re.compile(
+        r"(?=\S)(" + _IDENT +
+        r"|[^\s" + special + "]"
+        "|" + "|".join(comments) +
+        "|" + "|".join(strings) +
+        "|" + _NUM +
+        r"|\S)",
+        re.MULTILINE)
+
+_SCANNERS: Dict[str, Tuple["re.Pattern", str]] = {
+    lang: (_build(*spec), spec[2]) for lang, spec in _LANGUAGES.items()}
+
+# a triple-quoted string opening a line after one of these is a value, not a docstring
+_VALUE_CONTEXT = set("([{,=+%\\")
+_PY_STRING_PREFIXES = {"r", "b", "u", "f", "br", "rb", "fr", "rf"}
+
+class _Separators(dict):
+    # normalized form of the whitespace (and removed comments) between two tokens
+    def __missing__(self, gap: str) -> str:
+        lines = gap.replace("\r\n", "\n").replace("\r", "\n")
+        n = lines.count("\n")
+        if not n:
+            sep = " " if gap else ""
+        else:
+            sep = "\n\n"[:min(n, 2)] + (" " if lines[lines.rfind("\n") + 1:] else "")
+        if len(self) >= 4096:
+            self.clear()  # gaps with comments are rarely seen twice; keep the cache small
+        self[gap] = sep
+        return sep
+
+_SEPS = _Separators()
+
+def language_for(filename: Optional[str]) -> str:
+    if not filename:
+        return "generic"
+    return EXTENSION_LANGUAGES.get(os.path.splitext(filename)[1].lower(), "generic")
+
+def _classify(tok: str, openers: str) -> str:
+    c = tok[0]
+    if c.isdigit() or (c == "." and len(tok) > 1):
+        return "NUM"
+    if c in "\"'`" and len(tok) > 1:
+        return "STR"
+    if c in openers and len(tok) > 1 and (c != "/" or tok[1] in "/*"):
+        return ""  # comment
+    return tok
+
+def lex(code: str, language: str = "generic") -> Tokens:
+    """Single scan of the source producing normalized tokens with their
+    character offsets into the original source.
+
+    Comments and whitespace are dropped and string and number literals
+    collapse to STR/NUM. Python docstrings are dropped like comments. The
+    whitespace before each token is kept in normalized form (Tokens.seps), so
+    the normalized text is rendered from the tokens without another scan.
+    """
+    scanner, openers = _SCANNERS.get(language, _SCANNERS["generic"])
+    parts = scanner.split(code)
+    offsets = list(accumulate(map(len, parts), initial=0))
+    raw = parts[1::2]
+    gaps = parts[0::2]
+    starts = offsets[1::2]
+    ends = offsets[2::2]
+    seps = list(map(_SEPS.__getitem__, gaps))
+    special = set(openers + "0123456789.")
+    keep = bytearray(b"\x01") * len(raw)
+    for i in [i for i, t in enumerate(raw) if t[0] in special]:
+        tok = raw[i]
+        norm = _classify(tok, openers)
+        if norm == "STR" and language == "python":
+            if i and not gaps[i] and raw[i-1].lower() in _PY_STRING_PREFIXES:
+                keep[i-1] = 0  # r"...", b'...', f"..."
+                starts[i] = starts[i-1]
+                seps[i] = seps[i-1]
+                raw[i-1] = ""
+            if tok[:3] in ('"""', "'''") and (i == 0 or ("\n" in gaps[i] or "\r" in gaps[i])
+                                               and raw[i-1] not in _VALUE_CONTEXT):
+                norm = ""  # docstring
+        raw[i] = norm
+        if not norm:
+            keep[i] = 0
+            # a removed comment separates its neighbours like whitespace: a/*b*/c is "a c"
+            gaps[i+1] = gaps[i] + " " + gaps[i+1]
+            seps[i+1] = _SEPS[gaps[i+1]]
+    return Tokens(list(compress(raw, keep)), list(compress(starts, keep)), list(compress(ends, keep)),
+                  list(compress(seps, keep)))
+
+def normalize_code(code: str, language: str = "generic") -> str:
+    # normalized text of a whole source (see lex and Tokens.text)
+    return lex(code, language).text()
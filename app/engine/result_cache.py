@@ -0,0 +1,195 @@
+import dataclasses
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+_TOUCH_FLUSH_KEYS = 1000
+_TOUCH_FLUSH_SECONDS = 30.0
+
+# bump when a change to the engine alters comparison results for the same inputs and settings
+ENGINE_VERSION = "4"
+
+def scorer_fingerprint(scorer, **settings) -> str:
+    """Hash of everything besides the two sources that a comparison result depends on.
+
+    Read from the live scorer (model, backend, chunking, matching, TF-IDF mode
+    and fitted IDF, cascade bounds) plus the caller's `settings` (explain
+    parameters, threshold), so changing any of them yields new cache keys and
+    old results are never served. A model given as a local path also
+    contributes its modification time.
+    """
+    emb = scorer.embedder
+    parts: Dict[str, Any] = {
+        "engine": ENGINE_VERSION,
+        "model": emb.model_name,
+        "backend": emb.backend,
+        "topk": scorer.topk,
+        "mutual": scorer.mutual_matches,
+        "chunking": [scorer.chunking, scorer.chunk_tokens],
+        "heatmap": scorer.similarity.heatmap_size,
+        "tfidf": scorer.tfidf.mode,
+        "cascade": dataclasses.asdict(scorer.cascade) if scorer.cascade is not None else None,
+        **settings,
+    }
+    if os.path.exists(emb.model_name):
+        parts["model_mtime"] = os.path.getmtime(emb.model_name)
+    idf = getattr(scorer.tfidf.vectorizer, "idf_", None)
+    if idf is not None:
+        parts["idf"] = hashlib.sha256(idf.tobytes()).hexdigest()
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def pair_key(code_a: str, code_b: str, fingerprint: str, language_a: str, language_b: str) -> str:
+    # raw sources, not the normalized text: spans are character offsets into the originals;
+    # the language picks the lexer, so the same bytes as .c and as .py are different comparisons
+    h = hashlib.sha256(fingerprint.encode("ascii"))
+    for code, language in ((code_a, language_a), (code_b, language_b)):
+        h.update(b"\0")
+        h.update(language.encode("utf-8"))
+        h.update(b"\0")
+        h.update(hashlib.sha256(code.encode("utf-8", errors="surrogatepass")).digest())
+    return h.hexdigest()
+
+class ResultCache:
+    """On-disk cache of comparison results (JSON), keyed by pair_key().
+
+    SQLite in WAL mode shared by all workers, like EmbeddingCache. Entries
+    older than `ttl` seconds are treated as missing and purged; beyond
+    max_bytes the least recently used entries are evicted. As in
+    EmbeddingCache, access times are buffered and written in batches.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, ttl: Optional[float] = 7 * 86400):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # last_access of recent reads, written with the next put or after _TOUCH_FLUSH_KEYS / _SECONDS
+        self._touched: Dict[str, float] = {}
+        self._touch_flushed = time.time()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conn() as c:
+            c.execute("CREATE TABLE IF NOT EXISTS results ("
+                      "key TEXT PRIMARY KEY, payload BLOB NOT NULL, nbytes INTEGER NOT NULL, "
+                      "created REAL NOT NULL, last_access REAL NOT NULL)")
+            c.execute("CREATE INDEX IF NOT EXISTS results_lru ON results(last_access)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str, count: bool = True) -> Optional[Dict[str, Any]]:
+        """Cached payload or None. Only lookups with count=True enter the hit
+        rate: one per comparison, not one per entry read."""
+        conn = self._conn()
+        row = conn.execute("SELECT payload, created FROM results WHERE key=?", (key,)).fetchone()
+        now = time.time()
+        if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+            with conn:
+                conn.execute("DELETE FROM results WHERE key=?", (key,))
+            row = None
+        if count:
+            with self._lock:
+                if row is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+        if row is None:
+            return None
+        self._touch(conn, key, now)
+        return json.loads(row[0])
+
+    def touch(self, key: str) -> bool:
+        """Mark an entry as recently used without reading it; False if it is not cached."""
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute("SELECT 1 FROM results WHERE key=? AND created >= ?",
+                           (key, now - self.ttl if self.ttl is not None else 0.0)).fetchone()
+        if row is not None:
+            self._touch(conn, key, now)
+        return row is not None
+
+    def _touch(self, conn: sqlite3.Connection, key: str, now: float):
+        with self._lock:
+            self._touched[key] = now
+            flush = len(self._touched) >= _TOUCH_FLUSH_KEYS or now - self._touch_flushed >= _TOUCH_FLUSH_SECONDS
+        if flush:
+            with conn:
+                self._flush_touches(conn)
+
+    def _flush_touches(self, conn: sqlite3.Connection):
+        # write the buffered last_access times (in the caller's transaction)
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            self._touch_flushed = time.time()
+        if touched:
+            conn.executemany("UPDATE results SET last_access=? WHERE key=?", [(t, k) for k, t in touched.items()])
+
+    def put(self, key: str, payload: Dict[str, Any]):
+        buf = json.dumps(payload).encode("utf-8")
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            self._flush_touches(conn)
+            conn.execute("INSERT OR REPLACE INTO results(key, payload, nbytes, created, last_access) "
+                         "VALUES (?, ?, ?, ?, ?)", (key, buf, len(buf), now, now))
+        self._evict()
+
+    def _evict(self):
+        conn = self._conn()
+        victims = set()
+        if self.ttl is not None:
+            victims.update(conn.execute("SELECT key FROM results WHERE created < ?", (time.time() - self.ttl,)))
+        total = conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM results").fetchone()[0]
+        if total > self.max_bytes:
+            # free down to 90% of the cap so we do not evict on every insert
+            to_free = total - int(self.max_bytes * 0.9)
+            for key, nbytes in conn.execute("SELECT key, nbytes FROM results ORDER BY last_access"):
+                victims.add((key,))
+                to_free -= nbytes
+                if to_free <= 0:
+                    break
+        if not victims:
+            return
+        with conn:
+            conn.executemany("DELETE FROM results WHERE key=?", victims)
+        with self._lock:
+            self.evictions += len(victims)
+
+    def clear(self):
+        with self._lock:
+            self._touched = {}
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM results")
+
+    def stats(self) -> Dict[str, float]:
+        entries, size = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM results").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+def result_cache_from_config(config) -> Optional[ResultCache]:
+    if not config.RESULT_CACHE_PATH:
+        return None
+    return ResultCache(config.RESULT_CACHE_PATH, max_bytes=config.RESULT_CACHE_MAX_MB * 1024 * 1024,
+                       ttl=config.RESULT_CACHE_TTL or None)
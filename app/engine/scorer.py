@@ -1,57 +1,169 @@
-from typing import Dict, Any
-from .preprocess import normalize_code, simple_tokenize
-from .fingerprint import winnowing_fingerprints, fingerprint_overlap
-from .embeddings import Embedder, cosine, chunk_text, topk_chunk_matches
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import math
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+from .fingerprint import fingerprint_overlap
+from .embeddings import Embedder, cosine, encode_groups
+from .chunking import chunk_document, chunk_spans
+from .similarity import BlockedSimilarity, chunk_matches, heatmap_payload
+from .document import Document, prepare_document
+from .metrics import NO_TIMINGS, Timings
+from .cache import EmbeddingCache, cache_from_config
+from .tfidf import TfidfModel, tfidf_from_config
 import numpy as np
 
+# weights can be tuned; start with (embedding 0.6, tfidf 0.25, fp 0.15)
+WEIGHTS = {"embedding_cos": 0.6, "tfidf_cos": 0.25, "fp_overlap": 0.15}
+
+@dataclass
+class Cascade:
+    """Confidence bounds for staged scoring. After a cheap stage, a value below
+    its low bound (clearly unrelated) or at/above its high bound (clear copy)
+    ends scoring; None disables that bound. An early exit's ensemble score
+    agrees with its verdict: at least `threshold` (the suspicion threshold)
+    for a copy, below it when unrelated."""
+    fp_low: Optional[float] = None
+    fp_high: Optional[float] = 0.85
+    tfidf_low: Optional[float] = 0.15
+    tfidf_high: Optional[float] = 0.95
+    threshold: float = 0.8
+
+    @staticmethod
+    def decide(value: float, low: Optional[float], high: Optional[float]) -> Optional[str]:
+        if low is not None and value < low:
+            return "unrelated"
+        if high is not None and value >= high:
+            return "copy"
+        return None
+
+    @classmethod
+    def from_config(cls, config) -> Optional["Cascade"]:
+        if not config.SCORER_CASCADE:
+            return None
+        return cls(config.CASCADE_FP_LOW, config.CASCADE_FP_HIGH, config.CASCADE_TFIDF_LOW, config.CASCADE_TFIDF_HIGH,
+                   config.SIM_THRESHOLD)
+
 class HybridScorer:
-    def __init__(self, model_name: str, device: str = "cpu", topk_matches: int = 5):
-        self.embedder = Embedder(model_name, device=device)
+    def __init__(self, model_name: str, device: str = "cpu", topk_matches: int = 5,
+                 cache: Optional[EmbeddingCache] = None, tfidf: Optional[TfidfModel] = None,
+                 cascade: Optional[Cascade] = None, backend: str = "torch", onnx_dir: Optional[str] = None,
+                 similarity: Optional[BlockedSimilarity] = None, mutual_matches: bool = False,
+                 chunking: str = "structure", chunk_tokens: int = 128):
+        self.embedder = Embedder(model_name, device=device, cache=cache, backend=backend, onnx_dir=onnx_dir)
         self.topk = topk_matches
-        self.vectorizer = TfidfVectorizer(ngram_range=(1,3), analyzer='word', min_df=1)
-
-    def score(self, code_a: str, code_b: str) -> Dict[str, Any]:
-        # Normalize
-        norm_a = normalize_code(code_a)
-        norm_b = normalize_code(code_b)
-
-        # Token + fingerprints
-        toks_a = simple_tokenize(norm_a)
-        toks_b = simple_tokenize(norm_b)
-        fp_a = winnowing_fingerprints(toks_a, k=5, window=4)
-        fp_b = winnowing_fingerprints(toks_b, k=5, window=4)
-        fp_overlap = fingerprint_overlap(fp_a, fp_b)
-
-        # TF-IDF cosine
-        X = self.vectorizer.fit_transform([norm_a, norm_b])
-        tfidf_cos = float(cosine_similarity(X[0], X[1])[0,0])
-
-        # Embedding (file-level)
-        emb_file_a = self.embedder.encode([norm_a])[0]
-        emb_file_b = self.embedder.encode([norm_b])[0]
+        self.tfidf = tfidf or TfidfModel("pair")
+        self.cascade = cascade
+        self.similarity = similarity or BlockedSimilarity(k=1)
+        self.mutual_matches = mutual_matches
+        self.chunking = chunking
+        self.chunk_tokens = chunk_tokens
+
+    @classmethod
+    def from_config(cls, config) -> "HybridScorer":
+        return cls(config.MODEL_NAME, device=config.DEVICE, topk_matches=config.TOPK_CHUNK_MATCHES,
+                   cache=cache_from_config(config), tfidf=tfidf_from_config(config),
+                   cascade=Cascade.from_config(config), backend=config.EMBED_BACKEND,
+                   onnx_dir=config.ONNX_MODEL_DIR,
+                   similarity=BlockedSimilarity(k=1, max_block_bytes=config.SIM_BLOCK_MB * 1024 * 1024,
+                                                heatmap_size=config.HEATMAP_SIZE),
+                   mutual_matches=config.CHUNK_MATCH_MUTUAL, chunking=config.CHUNKING,
+                   chunk_tokens=config.CHUNK_TOKENS)
+
+    def prepare(self, code: str, name: str = "", timings: Timings = NO_TIMINGS) -> Document:
+        return prepare_document(code, name=name, k=5, window=4, timings=timings)
+
+    def score(self, code_a: str, code_b: str, name_a: str = "", name_b: str = "",
+              timings: Timings = NO_TIMINGS) -> Dict[str, Any]:
+        # file names only select the lexer (by extension)
+        return self.score_documents(self.prepare(code_a, name_a, timings), self.prepare(code_b, name_b, timings),
+                                    timings=timings)
+
+    def score_documents(self, doc_a: Document, doc_b: Document, tfidf_cos: Optional[float] = None,
+                        timings: Timings = NO_TIMINGS) -> Dict[str, Any]:
+        # Normalized text, tokens and fingerprints come from prepare(); stage
+        # wall times and input sizes go to timings when it is enabled
+        norm_a = doc_a.norm
+        norm_b = doc_b.norm
+        cascade = self.cascade
+        with timings.stage("fingerprint", fingerprints=len(doc_a.fingerprints) + len(doc_b.fingerprints)):
+            fp_overlap = fingerprint_overlap(doc_a.fingerprints, doc_b.fingerprints)
+        if cascade is not None:
+            verdict = cascade.decide(fp_overlap, cascade.fp_low, cascade.fp_high)
+            if verdict:
+                return self._partial_report({"fp_overlap": fp_overlap}, ["fingerprint"], verdict)
+
+        # TF-IDF cosine (may be precomputed in bulk by the caller)
+        if tfidf_cos is None:
+            with timings.stage("tfidf", bytes=len(norm_a) + len(norm_b)):
+                tfidf_cos = self.tfidf.pair_cosine(doc_a, doc_b)
+        if cascade is not None:
+            verdict = cascade.decide(tfidf_cos, cascade.tfidf_low, cascade.tfidf_high)
+            if verdict:
+                return self._partial_report({"tfidf_cos": tfidf_cos, "fp_overlap": fp_overlap},
+                                            ["fingerprint", "tfidf"], verdict)
+
+        # Embeddings: files and chunks of both sides go through the model as one batch
+        # (chunks are content-hashed: with the embedding cache, a resubmission only
+        # re-embeds the functions that changed)
+        with timings.stage("chunk"):
+            spans_a = chunk_document(doc_a, max_tokens=self.chunk_tokens, mode=self.chunking)
+            spans_b = chunk_document(doc_b, max_tokens=self.chunk_tokens, mode=self.chunking)
+        timings.sizes("chunk", chunks=len(spans_a) + len(spans_b))
+        chunks_a = [c.text for c in spans_a]
+        chunks_b = [c.text for c in spans_b]
+        # a file that fits in one chunk reuses its file-level embedding
+        own_a = chunks_a if len(chunks_a) > 1 else []
+        own_b = chunks_b if len(chunks_b) > 1 else []
+        texts = [norm_a, norm_b] + own_a + own_b
+        with timings.stage("embed", texts=len(texts), bytes=sum(len(t) for t in texts)):
+            # numpy rows; with the memory-mapped store, views of the shared map rather than copies
+            emb_file_a, emb_file_b, emb_own_a, emb_own_b = encode_groups(self.embedder, [[norm_a], [norm_b], own_a, own_b])
         emb_cos = cosine(emb_file_a, emb_file_b)
+        e_chunks_a = emb_own_a if own_a else emb_file_a
+        e_chunks_b = emb_own_b if own_b else emb_file_b
 
-        # Chunk-level matches
-        chunks_a = chunk_text(norm_a, max_tokens=128, stride=96)
-        chunks_b = chunk_text(norm_b, max_tokens=128, stride=96)
-        chunk_matches = topk_chunk_matches(chunks_a, chunks_b, self.embedder, topk=self.topk)
+        # Chunk-level matches: best match per chunk in both directions, tiled under a memory cap
+        with timings.stage("chunk_match", cells=len(e_chunks_a) * len(e_chunks_b)):
+            sim = self.similarity.compute(e_chunks_a, e_chunks_b)
+            matches = chunk_matches(sim, topk=self.topk, mutual=self.mutual_matches)
+        for m in matches:  # source offsets, for highlighting
+            ca, cb = spans_a[m["chunk1_idx"]], spans_b[m["chunk2_idx"]]
+            m.update(a_start=ca.start, a_end=ca.end, b_start=cb.start, b_end=cb.end)
 
         # Ensemble score (weighted)
-        # weights can be tuned; start with (embedding 0.6, tfidf 0.25, fp 0.15)
-        ensemble = 0.6*emb_cos + 0.25*tfidf_cos + 0.15*fp_overlap
+        ensemble = (WEIGHTS["embedding_cos"]*emb_cos + WEIGHTS["tfidf_cos"]*tfidf_cos
+                    + WEIGHTS["fp_overlap"]*fp_overlap)
 
         return {
             "ensemble_score": float(ensemble),
+            "stages": ["fingerprint", "tfidf", "embedding"],
+            "early_exit": None,
             "components": {
                 "embedding_cos": float(emb_cos),
                 "tfidf_cos": float(tfidf_cos),
                 "fp_overlap": float(fp_overlap),
             },
+            # chunk offsets, not texts: a report for two large files stays small
             "chunks": {
-                "a": chunks_a,
-                "b": chunks_b,
-                "topk_matches": chunk_matches
+                "a_spans": chunk_spans(spans_a),
+                "b_spans": chunk_spans(spans_b),
+                "topk_matches": matches,
+                "heatmap": heatmap_payload(sim["heatmap"], len(e_chunks_a), len(e_chunks_b)),
             }
         }
+
+    def _partial_report(self, components: Dict[str, float], stages, verdict: str) -> Dict[str, Any]:
+        # components that did not run are estimated by the mean of those that did,
+        # then the score is moved to the verdict's side of the threshold
+        est = sum(components.values()) / len(components)
+        ensemble = sum(w * components.get(k, est) for k, w in WEIGHTS.items())
+        if verdict == "copy":
+            ensemble = max(ensemble, self.cascade.threshold)
+        else:
+            ensemble = min(ensemble, math.nextafter(self.cascade.threshold, 0.0))
+        return {
+            "ensemble_score": float(ensemble),
+            "stages": stages,
+            "early_exit": verdict,
+            "components": {k: float(v) for k, v in components.items()},
+            "chunks": {"a_spans": [], "b_spans": [], "topk_matches": [], "heatmap": None},
+        }
@@ -0,0 +1,126 @@
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+def _as_unit_rows(x) -> np.ndarray:
+    # numpy float32 rows of unit length (accepts torch tensors and float16 store views)
+    if not isinstance(x, np.ndarray):
+        x = x.detach().cpu().numpy()
+    x = np.atleast_2d(np.asarray(x, dtype=np.float32))
+    return x / np.clip(np.linalg.norm(x, axis=1, keepdims=True), 1e-12, None)
+
+def _merge_topk(scores: np.ndarray, idx: np.ndarray, new_scores: np.ndarray, new_idx: np.ndarray,
+                k: int) -> Tuple[np.ndarray, np.ndarray]:
+    # keep the k best of (running best, candidates from the current tile) per row
+    s = np.concatenate([scores, new_scores], axis=1)
+    i = np.concatenate([idx, new_idx], axis=1)
+    if s.shape[1] > k:
+        part = np.argpartition(-s, k - 1, axis=1)[:, :k]
+        s = np.take_along_axis(s, part, axis=1)
+        i = np.take_along_axis(i, part, axis=1)
+    return s, i
+
+def _tile_topk(tile: np.ndarray, k: int, offset: int, axis: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    # k best entries along axis, as (rows of the other axis, k) score and index arrays
+    if k == 1:  # plain argmax is several times faster than a partition
+        j = np.expand_dims(np.argmax(tile, axis=axis), axis)
+        s = np.take_along_axis(tile, j, axis=axis)
+        return (s, j + offset) if axis == 1 else (s.T, j.T + offset)
+    if axis == 0:
+        tile = tile.T
+    k = min(k, tile.shape[1])
+    part = np.argpartition(-tile, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(tile, part, axis=1), part + offset
+
+def _sorted(scores: np.ndarray, idx: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # descending by score; ties go to the lower index, like argmax
+    order = np.lexsort((idx, -scores), axis=1) if scores.size else np.zeros(scores.shape, dtype=np.int64)
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(idx, order, axis=1)
+
+class BlockedSimilarity:
+    """Chunk-vs-chunk cosine similarity computed tile by tile.
+
+    No tile of the n1 x n2 matrix is larger than max_block_bytes, so memory
+    stays bounded however many chunks the files have. While tiling, the k best
+    matches of every row and of every column are kept (vectorized merge), and
+    the matrix can be max-pooled into a heatmap of at most heatmap_size cells
+    per side.
+    """
+
+    def __init__(self, k: int = 5, max_block_bytes: int = 64 * 1024 * 1024, heatmap_size: int = 0):
+        self.k = max(1, k)
+        self.max_block_bytes = max_block_bytes
+        self.heatmap_size = heatmap_size
+
+    def _blocks(self, n1: int, n2: int) -> Tuple[int, int]:
+        cells = max(1, self.max_block_bytes // 4)  # float32 cells per tile
+        bc = min(n2, max(1, int(np.sqrt(cells))) if n1 * n2 > cells else n2)
+        br = min(n1, max(1, cells // max(bc, 1)))
+        return br, bc
+
+    def compute(self, e1, e2) -> Dict[str, Any]:
+        a, b = _as_unit_rows(e1), _as_unit_rows(e2)
+        n1, n2 = a.shape[0], b.shape[0]
+        k1, k2 = min(self.k, n2), min(self.k, n1)
+        heat = None
+        if self.heatmap_size and n1 and n2:
+            h, w = min(self.heatmap_size, n1), min(self.heatmap_size, n2)
+            heat = np.full((h, w), -1.0, dtype=np.float32)
+            row_bin = np.arange(n1) * h // n1
+            col_bin = np.arange(n2) * w // n2
+        br, bc = self._blocks(max(n1, 1), max(n2, 1))
+        empty = lambda n: (np.zeros((n, 0), dtype=np.float32), np.zeros((n, 0), dtype=np.int64))
+        rows_best = [empty(len(a[r0:r0 + br])) for r0 in range(0, n1, br)]
+        cols_best = []
+        for c0 in range(0, n2, bc):
+            bt = b[c0:c0 + bc]
+            cs, ci = empty(len(bt))
+            for bi, r0 in enumerate(range(0, n1, br)):
+                tile = a[r0:r0 + br] @ bt.T
+                rows_best[bi] = _merge_topk(*rows_best[bi], *_tile_topk(tile, k1, c0), k1)
+                cs, ci = _merge_topk(cs, ci, *_tile_topk(tile, k2, r0, axis=0), k2)
+                if heat is not None:
+                    self._pool(heat, tile, row_bin[r0:r0 + br], col_bin[c0:c0 + bc])
+            cols_best.append((cs, ci))
+        row_s, row_i = (np.concatenate([x[0] for x in rows_best]), np.concatenate([x[1] for x in rows_best])) \
+            if rows_best else empty(0)
+        col_s, col_i = (np.concatenate([x[0] for x in cols_best]), np.concatenate([x[1] for x in cols_best])) \
+            if cols_best else empty(0)
+        if not n2:
+            row_s, row_i = empty(n1)
+        row_s, row_i = _sorted(row_s, row_i)
+        col_s, col_i = _sorted(col_s, col_i)
+        return {"row_scores": row_s, "row_idx": row_i, "col_scores": col_s, "col_idx": col_i,
+                "heatmap": heat}
+
+    @staticmethod
+    def _pool(heat: np.ndarray, tile: np.ndarray, rbins: np.ndarray, cbins: np.ndarray):
+        # max-pool the tile into heatmap cells; bins are non-decreasing along both axes
+        r_starts = np.flatnonzero(np.r_[True, rbins[1:] != rbins[:-1]])
+        c_starts = np.flatnonzero(np.r_[True, cbins[1:] != cbins[:-1]])
+        pooled = np.maximum.reduceat(np.maximum.reduceat(tile, r_starts, axis=0), c_starts, axis=1)
+        cells = np.ix_(rbins[r_starts], cbins[c_starts])
+        heat[cells] = np.maximum(heat[cells], pooled)
+
+def mutual_best(sim: Dict[str, Any]) -> np.ndarray:
+    """Rows i whose best column j has i as its best row (boolean mask over rows)."""
+    if not sim["row_idx"].size or not sim["col_idx"].size:
+        return np.zeros(sim["row_idx"].shape[0], dtype=bool)
+    best_j = sim["row_idx"][:, 0]
+    return sim["col_idx"][best_j, 0] == np.arange(len(best_j))
+
+def chunk_matches(sim: Dict[str, Any], topk: int = 5, mutual: bool = False) -> List[Dict[str, Any]]:
+    """Global top-k of the per-row best matches, optionally only mutual best pairs."""
+    if not sim["row_idx"].size:
+        return []
+    best_j = sim["row_idx"][:, 0]
+    best_s = sim["row_scores"][:, 0]
+    rows = np.flatnonzero(mutual_best(sim)) if mutual else np.arange(len(best_j))
+    order = rows[np.lexsort((rows, -best_s[rows]))][:topk]
+    return [{"chunk1_idx": int(i), "chunk2_idx": int(best_j[i]), "score": float(best_s[i])} for i in order]
+
+def heatmap_payload(heat: Optional[np.ndarray], n1: int, n2: int) -> Optional[Dict[str, Any]]:
+    # JSON-friendly heatmap: cell (r, c) covers chunks [r*n1/rows, (r+1)*n1/rows) of A, likewise for B
+    if heat is None:
+        return None
+    return {"rows": int(heat.shape[0]), "cols": int(heat.shape[1]), "chunks_a": n1, "chunks_b": n2,
+            "values": np.round(heat, 4).tolist()}
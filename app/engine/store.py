@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # appends are only serialized within one process on Windows
+    fcntl = None
+
+# index record: sha256 digest of the content key, row in the vector matrix
+# (raw bytes: an "S32" field would strip trailing NUL bytes from the digest)
+_RECORD = np.dtype([("key", "u1", (32,)), ("row", "<i8")])
+
+class EmbeddingStore:
+    """Append-only columnar embedding store opened with np.memmap.
+
+    The directory holds one contiguous row-major matrix file (float16 by
+    default), an append-only table of (key digest, row) records and a small
+    meta.json with dim and dtype. Every process maps the same file, so the
+    embeddings live once in the page cache instead of once per worker, and
+    lookups return views into the mapping rather than copies.
+
+    Appends take an exclusive file lock, write the vectors first and the index
+    records after them, so readers, which only trust whole index records, never
+    see a row that is not fully written. A crashed append is truncated away by
+    the next writer. Drop-in for EmbeddingCache (get_many/put_many/stats); there
+    is no eviction: once max_bytes is reached new vectors are not stored.
+    """
+
+    def __init__(self, directory: str, dtype: str = "float16", max_bytes: Optional[int] = None):
+        self.dir = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.dropped = 0
+        self._lock = threading.RLock()
+        self._rows: Dict[bytes, int] = {}
+        self._index_offset = 0
+        self._matrix: Optional[np.ndarray] = None
+        os.makedirs(directory, exist_ok=True)
+        meta = self._read_meta()
+        self.dtype = np.dtype(meta["dtype"] if meta else dtype)
+        self.dim = meta["dim"] if meta else None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.dir, name)
+
+    def _read_meta(self) -> Optional[dict]:
+        try:
+            with open(self._path("meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _digest(key: str) -> bytes:
+        return bytes.fromhex(key)
+
+    def _refresh(self):
+        # read index records appended (by any process) since the last look
+        try:
+            size = os.path.getsize(self._path("index.bin"))
+        except FileNotFoundError:
+            return
+        whole = size - size % _RECORD.itemsize
+        if whole <= self._index_offset:
+            return
+        if self.dim is None:
+            meta = self._read_meta()
+            self.dtype, self.dim = np.dtype(meta["dtype"]), meta["dim"]
+        with open(self._path("index.bin"), "rb") as f:
+            f.seek(self._index_offset)
+            recs = np.frombuffer(f.read(whole - self._index_offset), dtype=_RECORD)
+        raw = recs["key"].tobytes()
+        keys = [raw[i:i + 32] for i in range(0, len(raw), 32)]
+        self._rows.update(zip(keys, recs["row"].tolist()))
+        self._index_offset = whole
+
+    def _mapped(self, rows: int) -> np.ndarray:
+        # the mapping has a fixed size; map again once rows beyond it are indexed
+        if self._matrix is None or self._matrix.shape[0] < rows:
+            self._matrix = np.memmap(self._path("vectors.bin"), dtype=self.dtype, mode="r",
+                                     shape=(rows, self.dim))
+        return self._matrix
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._rows)
+
+    def row_ids(self, keys: List[str]) -> np.ndarray:
+        """Matrix rows of keys; -1 for keys that are not stored."""
+        with self._lock:
+            self._refresh()
+            return np.array([self._rows.get(self._digest(k), -1) for k in keys], dtype=np.int64)
+
+    def rows(self, keys: List[str]) -> np.ndarray:
+        """Vectors of keys (all must be stored). Rows that were appended together
+        and are asked for in order come back as a zero-copy view of the map."""
+        idx = self.row_ids(keys)
+        if (idx < 0).any():
+            raise KeyError(f"{int((idx < 0).sum())} keys are not in the store")
+        with self._lock:
+            m = self._mapped(len(self._rows))
+        if len(idx) and (len(idx) == 1 or (np.diff(idx) == 1).all()):
+            return m[idx[0]:idx[-1] + 1]
+        return m[idx]
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        if not keys:
+            return {}
+        idx = self.row_ids(keys)
+        out = {}
+        with self._lock:
+            if (idx >= 0).any():
+                m = self._mapped(len(self._rows))
+                out = {k: m[r] for k, r in zip(keys, idx.tolist()) if r >= 0}
+            self.hits += int((idx >= 0).sum())
+            self.misses += int((idx < 0).sum())
+        return out
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        if not items:
+            return
+        with self._lock, open(self._path("store.lock"), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._append(items)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _append(self, items: Dict[str, np.ndarray]):
+        self._refresh()
+        fresh = {self._digest(k): v for k, v in items.items() if self._digest(k) not in self._rows}
+        if not fresh:
+            return
+        vecs = np.stack([np.asarray(v, dtype=self.dtype).reshape(-1) for v in fresh.values()])
+        if self.dim is None:
+            self.dim = int(vecs.shape[1])
+            tmp = self._path("meta.json.tmp")
+            with open(tmp, "w") as f:
+                json.dump({"dim": self.dim, "dtype": self.dtype.name}, f)
+            os.replace(tmp, self._path("meta.json"))
+        if vecs.shape[1] != self.dim:
+            raise ValueError(f"embedding dim {vecs.shape[1]} does not match store dim {self.dim}")
+        n = len(self._rows)
+        row_bytes = self.dim * self.dtype.itemsize
+        if self.max_bytes is not None and (n + len(vecs)) * row_bytes > self.max_bytes:
+            self.dropped += len(vecs)
+            return
+        with open(self._path("vectors.bin"), "ab") as f:
+            f.truncate(n * row_bytes)  # drop the tail of an append that crashed before indexing
+            f.write(vecs.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        recs = np.empty(len(fresh), dtype=_RECORD)
+        recs["key"] = np.frombuffer(b"".join(fresh), dtype=np.uint8).reshape(-1, 32)
+        recs["row"] = np.arange(n, n + len(fresh))
+        with open(self._path("index.bin"), "ab") as f:
+            f.truncate(self._index_offset)
+            f.write(recs.tobytes())
+        self._refresh()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            self._refresh()
+            lookups = self.hits + self.misses
+            entries = len(self._rows)
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": 0,
+                "dropped": self.dropped,
+                "entries": entries,
+                "bytes": entries * (self.dim or 0) * self.dtype.itemsize,
+                "dtype": self.dtype.name,
+            }
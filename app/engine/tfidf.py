@@ -0,0 +1,83 @@
+from typing import Any, List, Sequence, Tuple
+import numpy as np
+import joblib
+from scipy.sparse import vstack
+from sklearn.base import clone
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from .document import Document
+
+TFIDF_MODES = ("pair", "corpus", "hashing")
+
+def _vectorizer() -> TfidfVectorizer:
+    return TfidfVectorizer(ngram_range=(1,3), analyzer='word', min_df=1)
+
+class TfidfModel:
+    """TF-IDF features for the ensemble.
+
+    pair    -- legacy behaviour: a fresh vectorizer is fitted on the two documents
+               of every comparison (nothing can be cached).
+    corpus  -- vectorizer fitted once on a reference corpus and saved to disk;
+               IDF reflects the whole corpus.
+    hashing -- stateless HashingVectorizer (l2-normalized term counts), no fit.
+
+    In corpus/hashing mode each document is vectorized once and the row is
+    cached on the Document, so many pairs reduce to sparse dot products.
+    """
+
+    def __init__(self, mode: str = "pair", vectorizer: Any = None):
+        if mode not in TFIDF_MODES:
+            raise ValueError(f"unknown TF-IDF mode {mode!r}, expected one of {TFIDF_MODES}")
+        if mode == "hashing" and vectorizer is None:
+            vectorizer = HashingVectorizer(ngram_range=(1,3), analyzer='word', n_features=2**20,
+                                           alternate_sign=False, norm='l2')
+        if mode == "corpus" and vectorizer is None:
+            raise ValueError("corpus mode needs a fitted vectorizer; use TfidfModel.fit() or load()")
+        self.mode = mode
+        self.vectorizer = vectorizer
+
+    @classmethod
+    def fit(cls, texts: Sequence[str]) -> "TfidfModel":
+        return cls("corpus", _vectorizer().fit(texts))
+
+    @classmethod
+    def load(cls, path: str) -> "TfidfModel":
+        data = joblib.load(path)
+        return cls(data["mode"], data["vectorizer"])
+
+    def save(self, path: str):
+        if self.mode == "pair":
+            raise ValueError("pair mode has no fitted state to save")
+        joblib.dump({"mode": self.mode, "vectorizer": self.vectorizer}, path)
+
+    def vector(self, doc: Document):
+        # l2-normalized sparse row, computed once per document
+        vec = doc.features.get("tfidf")
+        if vec is None:
+            vec = self.vectorizer.transform([doc.norm])
+            doc.features["tfidf"] = vec
+        return vec
+
+    def pair_cosine(self, doc_a: Document, doc_b: Document) -> float:
+        if self.mode == "pair":
+            # fresh estimator per call: shared scorer state is never mutated
+            try:
+                X = clone(self.vectorizer or _vectorizer()).fit_transform([doc_a.norm, doc_b.norm])
+            except ValueError:  # empty vocabulary
+                return 0.0
+            return float(X[0].multiply(X[1]).sum())
+        return float(self.vector(doc_a).multiply(self.vector(doc_b)).sum())
+
+    def pairwise_cosine(self, docs: List[Document], pairs: List[Tuple[int, int]]) -> np.ndarray:
+        """Cosine for every (i, j) in pairs with one sparse product over stacked rows."""
+        if not pairs:
+            return np.zeros(0)
+        if self.mode == "pair":
+            return np.array([self.pair_cosine(docs[i], docs[j]) for i, j in pairs])
+        X = vstack([self.vector(d) for d in docs]).tocsr()
+        idx = np.asarray(pairs)
+        return np.asarray(X[idx[:, 0]].multiply(X[idx[:, 1]]).sum(axis=1)).ravel()
+
+def tfidf_from_config(config) -> TfidfModel:
+    if config.TFIDF_MODE == "corpus":
+        return TfidfModel.load(config.TFIDF_MODEL_PATH)
+    return TfidfModel(config.TFIDF_MODE)
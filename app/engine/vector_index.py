@@ -0,0 +1,331 @@
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from .document import Document
+from .embeddings import encode_batch
+from .chunking import chunk_document
+
+FILE, CHUNK = 0, 1
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    return x / np.clip(np.linalg.norm(x, axis=-1, keepdims=True), 1e-12, None)
+
+def spherical_kmeans(x: np.ndarray, k: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    # k-means on the unit sphere (assignment by dot product); x must be normalized
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), size=k, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(x @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        empty = ~sums.any(axis=1)
+        sums[empty] = x[rng.choice(len(x), size=int(empty.sum()))]  # reseed empty lists
+        centroids = _normalize(sums)
+    return centroids
+
+def embed_document(embedder, doc: Document, chunking: str = "structure",
+                   chunk_tokens: int = 128) -> Tuple[np.ndarray, np.ndarray]:
+    """File embedding and chunk embeddings of a document, chunked like the scorer."""
+    chunks = [c.text for c in chunk_document(doc, max_tokens=chunk_tokens, mode=chunking)]
+    own = chunks if len(chunks) > 1 else []
+    embs = encode_batch(embedder, [doc.norm] + own).cpu().numpy()
+    return embs[0], (embs[1:] if own else embs[0:1])
+
+class VectorIndex:
+    """Persistent file- and chunk-level embedding index for archive lookups.
+
+    Vectors and the archived source live in SQLite (WAL, like the embedding
+    cache), so files can be added and removed incrementally from any process.
+    Searches run on an in-memory matrix of l2-normalized vectors that is
+    reloaded when another process changed the index. Small indexes are searched
+    exhaustively; past ivf_min_rows vectors an inverted-file (IVF) layer is
+    trained with spherical k-means and a query only scans the nprobe lists
+    closest to it. New vectors go to their nearest existing list; the lists are
+    retrained once the index has doubled since the last training.
+    """
+
+    def __init__(self, path: str, namespace: str = "", ivf_min_rows: int = 20000, nprobe: int = 8):
+        self.path = path
+        self.namespace = namespace
+        self.ivf_min_rows = ivf_min_rows
+        self.nprobe = nprobe
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._generation = None
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        with self._conn() as c:
+            c.execute("CREATE TABLE IF NOT EXISTS files ("
+                      "id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, code BLOB NOT NULL)")
+            c.execute("CREATE TABLE IF NOT EXISTS vectors ("
+                      "id INTEGER PRIMARY KEY, file_id INTEGER NOT NULL, kind INTEGER NOT NULL, "
+                      "chunk INTEGER NOT NULL, list INTEGER NOT NULL DEFAULT -1, vec BLOB NOT NULL)")
+            c.execute("CREATE INDEX IF NOT EXISTS vectors_file ON vectors(file_id)")
+            c.execute("CREATE TABLE IF NOT EXISTS centroids (list INTEGER PRIMARY KEY, vec BLOB NOT NULL)")
+            c.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            c.execute("INSERT OR IGNORE INTO meta VALUES ('generation', '0')")
+            if namespace:
+                c.execute("INSERT OR IGNORE INTO meta VALUES ('namespace', ?)", (namespace,))
+        stored = self._meta("namespace")
+        if namespace and stored != namespace:
+            raise ValueError(f"index {path} holds {stored!r} embeddings, not {namespace!r}")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._conn().execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _bump(conn: sqlite3.Connection):
+        conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key='generation'")
+
+    def _load(self):
+        # (re)build the in-memory matrix when the SQLite contents changed
+        generation = self._meta("generation")
+        if generation == self._generation:
+            return
+        conn = self._conn()
+        rows = conn.execute("SELECT file_id, kind, chunk, list, vec, id FROM vectors").fetchall()
+        self._names = dict(conn.execute("SELECT id, name FROM files"))
+        # rows sorted by (kind, list): every kind and every IVF list is a contiguous block
+        rows.sort(key=lambda r: (r[1], r[3]))
+        if rows:
+            self._vecs = np.stack([np.frombuffer(r[4], dtype=np.float32) for r in rows])
+        else:
+            self._vecs = np.zeros((0, 0), dtype=np.float32)
+        self._file = np.array([r[0] for r in rows], dtype=np.int64)
+        self._kind = np.array([r[1] for r in rows], dtype=np.int8)
+        self._chunk = np.array([r[2] for r in rows], dtype=np.int64)
+        self._list = np.array([r[3] for r in rows], dtype=np.int64)
+        self._ids = np.array([r[5] for r in rows], dtype=np.int64)
+        self._kind_start = np.searchsorted(self._kind, [FILE, CHUNK, CHUNK + 1])
+        cents = conn.execute("SELECT vec FROM centroids ORDER BY list").fetchall()
+        self._centroids = np.stack([np.frombuffer(c[0], dtype=np.float32) for c in cents]) if cents else None
+        self._generation = generation
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def __contains__(self, name: str) -> bool:
+        return self._conn().execute("SELECT 1 FROM files WHERE name=?", (name,)).fetchone() is not None
+
+    def names(self) -> List[str]:
+        return [r[0] for r in self._conn().execute("SELECT name FROM files ORDER BY name")]
+
+    def code(self, name: str) -> Optional[str]:
+        row = self._conn().execute("SELECT code FROM files WHERE name=?", (name,)).fetchone()
+        return zlib.decompress(row[0]).decode('utf-8') if row else None
+
+    def add_many(self, items: Sequence[Tuple[str, str, np.ndarray, np.ndarray]]):
+        """Add or replace archived files: (name, code, file_vec, chunk_vecs) each."""
+        if not items:
+            return
+        with self._lock:
+            self._load()
+            conn = self._conn()
+            centroids = self._centroids
+            removed, added = [], []
+            with conn:
+                for name, code, file_vec, chunk_vecs in items:
+                    old = self._delete(conn, name)
+                    if old is not None:
+                        removed.append(old)
+                    cur = conn.execute("INSERT INTO files(name, code) VALUES (?, ?)",
+                                       (name, zlib.compress(code.encode('utf-8'))))
+                    vecs = _normalize(np.vstack([file_vec, chunk_vecs]))
+                    if self._vecs.size and vecs.shape[1] != self._vecs.shape[1]:
+                        raise ValueError(f"embedding dim {vecs.shape[1]} does not match index dim {self._vecs.shape[1]}")
+                    lists = (np.argmax(vecs @ centroids.T, axis=1) if centroids is not None
+                             else np.full(len(vecs), -1))
+                    conn.executemany(
+                        "INSERT INTO vectors(file_id, kind, chunk, list, vec) VALUES (?, ?, ?, ?, ?)",
+                        [(cur.lastrowid, FILE if r == 0 else CHUNK, max(r - 1, 0), int(lists[r]), vecs[r].tobytes())
+                         for r in range(len(vecs))])
+                    ids = [r[0] for r in conn.execute("SELECT id FROM vectors WHERE file_id=? ORDER BY id",
+                                                      (cur.lastrowid,))]
+                    added.append((cur.lastrowid, name, vecs, lists, ids))
+                before = self._meta("generation")
+                self._bump(conn)
+            if before == self._generation:
+                # nobody else wrote since our last load: apply the batch in memory instead of reloading
+                self._apply(removed, added, str(int(before) + 1))
+            else:
+                self._load()
+            trained = int(self._meta("trained_rows") or 0)
+            if len(self._vecs) >= self.ivf_min_rows and len(self._vecs) >= 2 * trained:
+                self.train()
+
+    def _apply(self, removed: List[int], added: List[Tuple[int, str, np.ndarray, np.ndarray, List[int]]],
+               generation: str):
+        # the in-memory matrix after this process's own add_many, without reading the vectors back
+        keep = ~np.isin(self._file, removed)
+        for fid in removed:
+            self._names.pop(fid, None)
+        vecs = [self._vecs[keep]] if self._vecs.size else []
+        files, kinds, chunks, lists, ids = [self._file[keep]], [self._kind[keep]], [self._chunk[keep]], \
+            [self._list[keep]], [self._ids[keep]]
+        for fid, name, v, lst, row_ids in added:
+            self._names[fid] = name
+            vecs.append(v)
+            files.append(np.full(len(v), fid, dtype=np.int64))
+            kinds.append(np.array([FILE] + [CHUNK] * (len(v) - 1), dtype=np.int8))
+            chunks.append(np.maximum(np.arange(len(v)) - 1, 0))
+            lists.append(np.asarray(lst, dtype=np.int64))
+            ids.append(np.array(row_ids, dtype=np.int64))
+        kind, lst = np.concatenate(kinds), np.concatenate(lists)
+        order = np.lexsort((lst, kind))  # stable: keeps every kind and IVF list contiguous, like _load
+        self._vecs = np.concatenate(vecs)[order]
+        self._file = np.concatenate(files)[order]
+        self._kind = kind[order]
+        self._chunk = np.concatenate(chunks)[order]
+        self._list = lst[order]
+        self._ids = np.concatenate(ids)[order]
+        self._kind_start = np.searchsorted(self._kind, [FILE, CHUNK, CHUNK + 1])
+        self._generation = generation
+
+    def remove(self, name: str) -> bool:
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                found = self._delete(conn, name) is not None
+                if found:
+                    self._bump(conn)
+            return found
+
+    @staticmethod
+    def _delete(conn: sqlite3.Connection, name: str) -> Optional[int]:
+        row = conn.execute("SELECT id FROM files WHERE name=?", (name,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("DELETE FROM vectors WHERE file_id=?", row)
+        conn.execute("DELETE FROM files WHERE id=?", row)
+        return row[0]
+
+    def train(self, nlist: Optional[int] = None, sample: int = 50000, seed: int = 0):
+        """(Re)build the IVF lists: spherical k-means on a sample of the vectors,
+        nlist defaulting to ~sqrt(n)."""
+        with self._lock:
+            self._load()
+            n = len(self._vecs)
+            if n == 0:
+                return
+            nlist = min(nlist or max(1, int(np.sqrt(n))), n)
+            rng = np.random.default_rng(seed)
+            train_x = self._vecs[rng.choice(n, size=min(n, sample), replace=False)]
+            centroids = spherical_kmeans(train_x, nlist, seed=seed)
+            assign = np.argmax(self._vecs @ centroids.T, axis=1)
+            conn = self._conn()
+            with conn:
+                conn.execute("DELETE FROM centroids")
+                conn.executemany("INSERT INTO centroids(list, vec) VALUES (?, ?)",
+                                 [(i, c.tobytes()) for i, c in enumerate(centroids)])
+                conn.executemany("UPDATE vectors SET list=? WHERE id=?", zip(assign.tolist(), self._ids.tolist()))
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('trained_rows', ?)", (str(n),))
+                self._bump(conn)
+            self._load()
+
+    def _candidates(self, queries: np.ndarray, kind: int, nprobe: int):
+        # rows to scan: the whole block of this kind, or only the probed IVF lists
+        lo, hi = int(self._kind_start[kind]), int(self._kind_start[kind + 1])
+        if self._centroids is None or nprobe >= len(self._centroids):
+            return np.arange(lo, hi), self._vecs[lo:hi]
+        probe = np.unique(np.argsort(-(queries @ self._centroids.T), axis=1)[:, :nprobe])
+        lists = self._list[lo:hi]
+        starts = lo + np.searchsorted(lists, probe, side="left")
+        ends = lo + np.searchsorted(lists, probe, side="right")
+        rows = np.concatenate([np.arange(a, b) for a, b in zip(starts, ends)] + [np.zeros(0, dtype=np.int64)])
+        return rows, self._vecs[rows]
+
+    def search(self, file_vec: np.ndarray, chunk_vecs: Optional[np.ndarray] = None, k: int = 10,
+               nprobe: Optional[int] = None, exclude: Optional[str] = None) -> Dict[str, Any]:
+        """Most similar archived files and chunks.
+
+        files:  top k files by max(file cosine, best chunk cosine), with both
+        chunks: top k (query chunk, archived chunk) pairs by cosine
+        """
+        nprobe = nprobe or self.nprobe
+        with self._lock:
+            self._load()
+            if not len(self._vecs):
+                return {"files": [], "chunks": [], "indexed_files": 0}
+            q_file = _normalize(file_vec)[None, :]
+            q_chunks = _normalize(chunk_vecs) if chunk_vecs is not None and len(chunk_vecs) else q_file
+            skip = next((fid for fid, nm in self._names.items() if nm == exclude), None)
+
+            file_rows, file_mat = self._candidates(q_file, FILE, nprobe)
+            file_sims = file_mat @ q_file[0]
+            chunk_rows, chunk_mat = self._candidates(q_chunks, CHUNK, nprobe)
+            sims = q_chunks @ chunk_mat.T
+            best_q = np.argmax(sims, axis=0) if sims.size else np.zeros(0, dtype=np.int64)
+            best = sims[best_q, np.arange(sims.shape[1])] if sims.size else np.zeros(0)
+
+            per_file: Dict[int, Dict[str, Any]] = {}
+            for r, s in zip(file_rows.tolist(), file_sims.tolist()):
+                per_file[int(self._file[r])] = {"file_cos": s, "best_chunk_cos": None}
+            chunks = []
+            for col in np.argsort(-best)[:max(k * 4, k)].tolist():
+                r = chunk_rows[col]
+                fid = int(self._file[r])
+                if fid == skip:
+                    continue
+                if len(chunks) < k:
+                    chunks.append({"name": self._names[fid], "chunk_idx": int(self._chunk[r]),
+                                   "query_chunk_idx": int(best_q[col]), "score": float(best[col])})
+                entry = per_file.setdefault(fid, {"file_cos": None, "best_chunk_cos": None})
+                if entry["best_chunk_cos"] is None:
+                    entry["best_chunk_cos"] = float(best[col])
+            files = []
+            for fid, entry in per_file.items():
+                if fid == skip:
+                    continue
+                score = max(s for s in (entry["file_cos"], entry["best_chunk_cos"]) if s is not None)
+                files.append({"name": self._names[fid], "score": float(score), **entry})
+            files.sort(key=lambda f: f["score"], reverse=True)
+            return {"files": files[:k], "chunks": chunks, "indexed_files": len(self._names)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._load()
+            return {"files": len(self._names), "vectors": int(len(self._vecs)),
+                    "dim": int(self._vecs.shape[1]) if self._vecs.size else 0,
+                    "lists": 0 if self._centroids is None else int(len(self._centroids)),
+                    "namespace": self._meta("namespace")}
+
+def index_documents(index: VectorIndex, docs: Sequence[Document], embedder, batch: int = 64,
+                    chunking: str = "structure", chunk_tokens: int = 128):
+    for s in range(0, len(docs), batch):
+        index.add_many([(d.name, d.code, *embed_document(embedder, d, chunking, chunk_tokens))
+                        for d in docs[s:s + batch]])
+
+def find_similar(index: VectorIndex, doc: Document, embedder, k: int = 10, scorer=None,
+                 rerank: int = 0, exclude_self: bool = True, chunking: str = "structure",
+                 chunk_tokens: int = 128) -> Dict[str, Any]:
+    """Nearest archived files for doc. With a scorer, the best `rerank` file
+    candidates are re-scored with the full ensemble and ordered by it."""
+    file_vec, chunk_vecs = embed_document(embedder, doc, chunking, chunk_tokens)
+    result = index.search(file_vec, chunk_vecs, k=max(k, rerank), exclude=doc.name if exclude_self else None)
+    if scorer is not None and rerank:
+        for cand in result["files"][:rerank]:
+            other = scorer.prepare(index.code(cand["name"]), cand["name"])
+            report = scorer.score_documents(doc, other)
+            cand["ensemble_score"] = report["ensemble_score"]
+            cand["components"] = report["components"]
+        head = sorted(result["files"][:rerank], key=lambda f: f["ensemble_score"], reverse=True)
+        result["files"] = head + result["files"][rerank:]
+    result["files"] = result["files"][:k]
+    return result
+
+def index_from_config(config, embedder) -> VectorIndex:
+    return VectorIndex(config.VECTOR_INDEX_PATH, namespace=embedder.cache_namespace, nprobe=config.INDEX_NPROBE)
@@ -0,0 +1,178 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+class JobQueueFull(Exception):
+    pass
+
+class JobManager:
+    """Bounded local worker pool for long comparisons.
+
+    Work runs on threads of the process that accepted the job; job status and
+    results live in SQLite (WAL), so any gunicorn worker can answer a poll or a
+    cancel. No external broker is involved. Finished jobs are deleted after
+    result_ttl seconds. Each unfinished job holds a lease of lease seconds that
+    a heartbeat thread of the process running it keeps renewing; queued or
+    running jobs whose lease has run out (a restarted, crashed or hung worker)
+    are marked failed, so they expire like any other finished job. Unlike a
+    pid check this does not depend on pids not being reused.
+    """
+
+    def __init__(self, db_path: str, workers: int = 2, max_queue: int = 64, result_ttl: float = 3600.0,
+                 lease: float = 60.0):
+        self.db_path = db_path
+        self.result_ttl = result_ttl
+        self.lease = lease
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._mine = set()  # ids of this process's unfinished jobs, whose leases it renews
+        d = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(d, exist_ok=True)
+        with self._conn() as c:
+            c.execute("CREATE TABLE IF NOT EXISTS jobs ("
+                      "id TEXT PRIMARY KEY, status TEXT NOT NULL, created REAL NOT NULL, "
+                      "started REAL, finished REAL, result TEXT, error TEXT, "
+                      "cancel INTEGER NOT NULL DEFAULT 0, owner INTEGER, lease REAL)")
+            cols = [r[1] for r in c.execute("PRAGMA table_info(jobs)")]
+            for col, kind in (("owner", "INTEGER"), ("lease", "REAL")):
+                if col not in cols:
+                    c.execute(f"ALTER TABLE jobs ADD COLUMN {col} {kind}")
+        self._fail_orphans()
+        self._threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self._worker, name=f"scpis-job-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._heartbeat, name="scpis-job-lease", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _update(self, job_id: str, **fields):
+        cols = ", ".join(f"{k}=?" for k in fields)
+        conn = self._conn()
+        with conn:
+            conn.execute(f"UPDATE jobs SET {cols} WHERE id=?", (*fields.values(), job_id))
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, fn: Callable[..., Dict[str, Any]], *args) -> str:
+        self.expire()
+        job_id = uuid.uuid4().hex
+        conn = self._conn()
+        now = time.time()
+        with self._lock:
+            self._mine.add(job_id)
+        with conn:
+            conn.execute("INSERT INTO jobs(id, status, created, owner, lease) VALUES (?, ?, ?, ?, ?)",
+                         (job_id, QUEUED, now, os.getpid(), now + self.lease))
+        try:
+            self._queue.put_nowait((job_id, fn, args))
+        except queue.Full:
+            with self._lock:
+                self._mine.discard(job_id)
+            with conn:
+                conn.execute("DELETE FROM jobs WHERE id=?", (job_id,))
+            raise JobQueueFull(f"job queue is full ({self._queue.maxsize} waiting)")
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        self.expire()
+        row = self._conn().execute(
+            "SELECT id, status, created, started, finished, result, error FROM jobs WHERE id=?",
+            (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {"job_id": row[0], "status": row[1], "created_at": row[2], "started_at": row[3],
+               "finished_at": row[4]}
+        if row[5] is not None:
+            job["result"] = json.loads(row[5])
+        if row[6] is not None:
+            job["error"] = row[6]
+        return job
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Cancel a job; returns its resulting status, or None if unknown.
+
+        Queued jobs are cancelled at once. A running job cannot be interrupted
+        mid-inference, so it is flagged and its result discarded when it ends.
+        """
+        conn = self._conn()
+        with conn:
+            conn.execute("UPDATE jobs SET cancel=1, status=CASE WHEN status=? THEN ? ELSE status END, "
+                         "finished=CASE WHEN status=? THEN ? ELSE finished END WHERE id=?",
+                         (QUEUED, CANCELLED, QUEUED, time.time(), job_id))
+        row = conn.execute("SELECT status FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def expire(self):
+        self._fail_orphans()
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?",
+                         (time.time() - self.result_ttl,))
+
+    def _fail_orphans(self):
+        # unfinished jobs whose lease ran out will never finish: their process
+        # stopped renewing it, and their queue died with it
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("UPDATE jobs SET status=?, finished=?, error=? "
+                         "WHERE status IN (?, ?) AND (lease IS NULL OR lease < ?)",
+                         (FAILED, now, "worker process exited before the job finished (lease expired)",
+                          QUEUED, RUNNING, now))
+
+    def _heartbeat(self):
+        # renew well before expiry, so a slow SQLite write does not cost a live job its lease
+        while True:
+            time.sleep(self.lease / 3)
+            with self._lock:
+                mine = list(self._mine)
+            if not mine:
+                continue
+            conn = self._conn()
+            with conn:
+                conn.executemany("UPDATE jobs SET lease=? WHERE id=? AND status IN (?, ?)",
+                                 [(time.time() + self.lease, j, QUEUED, RUNNING) for j in mine])
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        row = self._conn().execute("SELECT cancel FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return row is None or bool(row[0])
+
+    def _worker(self):
+        while True:
+            job_id, fn, args = self._queue.get()
+            try:
+                if self._cancel_requested(job_id):
+                    continue
+                self._update(job_id, status=RUNNING, started=time.time())
+                try:
+                    result = fn(*args)
+                except Exception as e:
+                    self._update(job_id, status=FAILED, finished=time.time(), error=f"{type(e).__name__}: {e}")
+                    continue
+                if self._cancel_requested(job_id):
+                    self._update(job_id, status=CANCELLED, finished=time.time())
+                else:
+                    self._update(job_id, status=DONE, finished=time.time(), result=json.dumps(result))
+            finally:
+                with self._lock:
+                    self._mine.discard(job_id)
+                self._queue.task_done()
@@ -1,8 +1,27 @@
-from flask import Flask, request, render_template, jsonify
+import threading
+import time
+import json
+import re
+from collections import OrderedDict
+from flask import Flask, Response, g, request, render_template, jsonify, stream_with_context, url_for
 from config import Config
 from engine.scorer import HybridScorer
-from engine.explain import highlight_similar_regions
+from engine.explain import highlight_documents
+from engine.archive import ArchiveTooLarge, open_archive
+from engine.backends import is_preloaded, set_torch_threads
+from engine.batching import BatchingEmbedder
+from engine.corpus import scan_stream
+from engine.fp_index import FingerprintIndex, UnknownNamespace, fp_index_from_config
+from engine.metrics import NO_TIMINGS, Registry, Timings, profiled
+from engine.preprocess import language_for
+from engine.result_cache import pair_key, result_cache_from_config, scorer_fingerprint
+from engine.vector_index import find_similar, index_from_config
+from jobs import JobManager, JobQueueFull
 import os
+from typing import Dict, Tuple
+
+COMPARE_DETAILS = ("score", "summary", "full")
+_COMPARISON_ID = re.compile(r"^[0-9a-f]{64}$")
 
 def allowed_file(filename: str) -> bool:
     if '.' not in filename:
@@ -14,7 +33,200 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
 
-    scorer = HybridScorer(Config.MODEL_NAME, device=Config.DEVICE, topk_matches=Config.TOPK_CHUNK_MATCHES)
+    set_torch_threads(Config.TORCH_THREADS, Config.TORCH_INTEROP_THREADS)
+    scorer = HybridScorer.from_config(Config)
+    if Config.EMBED_MICROBATCH:
+        scorer.embedder = BatchingEmbedder(scorer.embedder, max_batch=Config.EMBED_BATCH_MAX,
+                                           max_wait_ms=Config.EMBED_BATCH_WAIT_MS)
+    # finished comparisons keyed by both sources and everything else the result depends on
+    result_cache = result_cache_from_config(Config)
+    result_fingerprint = scorer_fingerprint(scorer, threshold=Config.SIM_THRESHOLD,
+                                            span_min_tokens=Config.SPAN_MIN_TOKENS,
+                                            span_max_seconds=Config.SPAN_MAX_SECONDS)
+    jobs = JobManager(Config.JOB_DB_PATH, workers=Config.JOB_WORKERS, max_queue=Config.JOB_QUEUE_MAX,
+                      result_ttl=Config.JOB_RESULT_TTL, lease=Config.JOB_LEASE)
+
+    # readiness: set once one inference went through the model in this process
+    warm = {"ready": False, "seconds": None, "error": None, "thread": None}
+    warm_lock = threading.Lock()
+
+    def run_warmup():
+        t0 = time.perf_counter()
+        try:
+            scorer.embedder.warmup()
+        except Exception as e:
+            warm.update(error=f"{type(e).__name__}: {e}", thread=None)  # the next probe retries
+            return
+        warm.update(ready=True, seconds=time.perf_counter() - t0, error=None)
+
+    def start_warmup():
+        with warm_lock:
+            if warm["ready"] or warm["thread"] is not None:
+                return
+            warm["thread"] = threading.Thread(target=run_warmup, name="scpis-warmup", daemon=True)
+            warm["thread"].start()
+
+    if Config.EMBED_WARMUP:
+        start_warmup()
+
+    archive = {}
+
+    def archive_index():
+        # opened on first use, so apps that never query the archive don't create it
+        if "index" not in archive:
+            archive["index"] = index_from_config(Config, scorer.embedder)
+        return archive["index"]
+
+    # only namespaces filled through the cli are served; the least recently queried are closed beyond FP_INDEX_OPEN_MAX
+    fp_indexes: "OrderedDict[str, FingerprintIndex]" = OrderedDict()
+    fp_lock = threading.Lock()
+
+    def fp_index(namespace: str):
+        with fp_lock:
+            index = fp_indexes.pop(namespace, None)
+            if index is None:
+                index = fp_index_from_config(Config, namespace, create=False)
+            fp_indexes[namespace] = index
+            while len(fp_indexes) > Config.FP_INDEX_OPEN_MAX:
+                fp_indexes.popitem(last=False)
+            return index
+
+    metrics = Registry()
+    request_seconds = metrics.histogram("scpis_request_seconds", "Request latency by endpoint")
+    cache_stats = lambda: scorer.embedder.cache.stats() if scorer.embedder.cache is not None else None
+    metrics.gauge("scpis_embedding_cache_hits_total", "Embedding cache hits",
+                  lambda: (cache_stats() or {}).get("hits"), kind="counter")
+    metrics.gauge("scpis_embedding_cache_misses_total", "Embedding cache misses",
+                  lambda: (cache_stats() or {}).get("misses"), kind="counter")
+    metrics.gauge("scpis_embedding_cache_entries", "Embeddings stored in the cache",
+                  lambda: (cache_stats() or {}).get("entries"))
+    metrics.gauge("scpis_embedding_cache_bytes", "Bytes of embeddings stored in the cache",
+                  lambda: (cache_stats() or {}).get("bytes"))
+    result_stats = lambda: result_cache.stats() if result_cache is not None else None
+    metrics.gauge("scpis_result_cache_hits_total", "Comparison results served from the cache",
+                  lambda: (result_stats() or {}).get("hits"), kind="counter")
+    metrics.gauge("scpis_result_cache_misses_total", "Comparisons not found in the result cache",
+                  lambda: (result_stats() or {}).get("misses"), kind="counter")
+    metrics.gauge("scpis_embedding_batch_queue_depth", "Texts waiting for the next model batch",
+                  lambda: scorer.embedder.stats()["queue_depth"]
+                  if isinstance(scorer.embedder, BatchingEmbedder) else None)
+    metrics.gauge("scpis_job_queue_depth", "Comparison jobs waiting for a worker", jobs.queue_depth)
+    metrics.gauge("scpis_model_loaded", "1 once the embedding model is loaded",
+                  lambda: float(scorer.embedder.loaded))
+    metrics.gauge("scpis_ready", "1 once the warm-up inference finished", lambda: float(warm["ready"]))
+    metrics.gauge("scpis_model_load_seconds", "Time it took to load the embedding model",
+                  lambda: scorer.embedder.load_seconds)
+
+    if Config.METRICS_ENABLED:
+        @app.before_request
+        def start_timer():
+            g.started = time.perf_counter()
+
+        @app.after_request
+        def observe_request(response):
+            if "started" in g:
+                request_seconds.observe(time.perf_counter() - g.started, endpoint=request.endpoint or "unknown")
+            return response
+
+    def flag(name: str) -> bool:
+        return request.values.get(name, "").lower() in ("1", "true", "yes")
+
+    def compare_key(code1: str, name1: str, code2: str, name2: str) -> str:
+        return pair_key(code1, code2, result_fingerprint, language_for(name1), language_for(name2))
+
+    def explain(doc1, doc2, timings=NO_TIMINGS):
+        with timings.stage("explain", tokens=len(doc1.tokens) + len(doc2.tokens)):
+            return highlight_documents(doc1, doc2, min_match=Config.SPAN_MIN_TOKENS,
+                                       max_seconds=Config.SPAN_MAX_SECONDS)
+
+    def compare_payload(code1: str, name1: str, code2: str, name2: str, with_timings: bool = False,
+                        with_profile: bool = False, detail: str = "full"):
+        """Score a pair; with detail="score" no explanation work is done at all.
+
+        The result cache holds the scores, the spans and the two sources as
+        separate entries under the comparison ID, so a summary is answered
+        without spans text or heatmap and the follow-up endpoints can page
+        through (or lazily compute) the rest in any worker.
+        """
+        cid = compare_key(code1, name1, code2, name2)
+        sources = {"a": code1, "b": code2, "name_a": name1, "name_b": name2}
+        # a timed or profiled request has to run; anything else may come from the result cache
+        cached = result_cache is not None and not with_timings and not with_profile
+        scores = result_cache.get(cid) if cached else None
+        if scores is not None and not result_cache.touch(cid + ":sources"):
+            # evicted on its own (entries are LRU each): the summary's source links need it back
+            result_cache.put(cid + ":sources", sources)
+        spans = result_cache.get(cid + ":spans", count=False) if cached and detail != "score" else None
+        timings = Timings() if with_timings or Config.METRICS_ENABLED else NO_TIMINGS
+        with profiled(with_profile and Config.PROFILE_REQUESTS, Config.PROFILE_INTERVAL_MS / 1000.0) as prof:
+            docs = None
+            if scores is None:
+                docs = scorer.prepare(code1, name1, timings), scorer.prepare(code2, name2, timings)
+                report = scorer.score_documents(*docs, timings=timings)
+                scores = {
+                    "threshold": Config.SIM_THRESHOLD,
+                    "ensemble_score": report['ensemble_score'],
+                    "components": report['components'],
+                    "stages": report['stages'],
+                    "early_exit": report['early_exit'],
+                    "chunk_matches": report['chunks']['topk_matches'],
+                    "heatmap": report['chunks']['heatmap'],
+                }
+                if result_cache is not None:
+                    result_cache.put(cid, scores)
+                    result_cache.put(cid + ":sources", sources)
+            if spans is None and detail != "score":
+                docs = docs or (scorer.prepare(code1, name1, timings), scorer.prepare(code2, name2, timings))
+                spans = explain(*docs, timings)
+                if result_cache is not None:
+                    result_cache.put(cid + ":spans", spans)
+        metrics.observe_timings(timings)
+        payload = {"comparison_id": cid if result_cache is not None else None,
+                   **{k: scores[k] for k in ("threshold", "ensemble_score", "components", "stages", "early_exit")}}
+        if detail == "summary":
+            # offsets only; text, the remaining spans and the heatmap come from the follow-up endpoints
+            head = spans['spans'][:Config.SUMMARY_SPANS]
+            payload.update(chunk_matches=scores['chunk_matches'],
+                           spans=[{k: v for k, v in sp.items() if k != "text"} for sp in head],
+                           spans_total=len(spans['spans']))
+            if result_cache is not None:
+                payload["links"] = comparison_links(cid)
+        elif detail == "full":
+            payload.update(chunk_matches=scores['chunk_matches'], heatmap=scores['heatmap'], spans=spans['spans'])
+        if with_timings:
+            payload["timings"] = timings.as_dict()
+        if prof is not None:
+            payload["profile"] = prof.report()
+        return payload
+
+    def comparison_links(cid: str) -> Dict[str, str]:
+        # plain paths, not url_for: job worker threads build payloads outside any app context
+        base = f"/api/comparisons/{cid}"
+        return {"spans": f"{base}/spans", "heatmap": f"{base}/heatmap",
+                "source_a": f"{base}/source/a", "source_b": f"{base}/source/b"}
+
+    def detail_arg() -> str:
+        detail = request.args.get('detail', Config.COMPARE_DETAIL)
+        if detail not in COMPARE_DETAILS:
+            raise ValueError(f"detail must be one of {', '.join(COMPARE_DETAILS)}")
+        return detail
+
+    def page_args() -> Tuple[int, int]:
+        offset = int(request.args.get('offset', 0))
+        limit = min(int(request.args.get('limit', Config.PAGE_MAX)), Config.PAGE_MAX)
+        if offset < 0 or limit < 1:
+            raise ValueError("offset must be >= 0 and limit >= 1")
+        return offset, limit
+
+    def comparison_entry(cid: str, part: str = ""):
+        if result_cache is None or not _COMPARISON_ID.match(cid):
+            return None
+        # follow-up reads of a comparison already counted by compare_payload
+        entry = result_cache.get(cid + part, count=False)
+        if entry is not None and not part:
+            # the sources live as long as the scores are in use, so spans can still be recomputed
+            result_cache.touch(cid + ":sources")
+        return entry
 
     @app.route('/', methods=['GET'])
     def home():
@@ -31,21 +243,24 @@ def create_app():
 
         code1 = f1.read().decode('utf-8', errors='ignore')
         code2 = f2.read().decode('utf-8', errors='ignore')
+        # summary first: sources, span excerpts and the heatmap are fetched by the page as needed
+        lazy = result_cache is not None
+        result = compare_payload(code1, f1.filename, code2, f2.filename, detail="summary" if lazy else "full")
 
-        report = scorer.score(code1, code2)
-        spans = highlight_similar_regions(code1, code2)
-
-        suspicious = report['ensemble_score'] >= app.config['SIM_THRESHOLD']
+        suspicious = result['ensemble_score'] >= app.config['SIM_THRESHOLD']
 
         return render_template('result.html',
                                suspicious=suspicious,
                                threshold=int(app.config['SIM_THRESHOLD']*100),
-                               ensemble=round(report['ensemble_score']*100, 2),
-                               components={k: round(v*100,2) for k,v in report['components'].items()},
-                               chunk_matches=report['chunks']['topk_matches'],
-                               spans=spans['spans'],
-                               code1=code1,
-                               code2=code2)
+                               ensemble=round(result['ensemble_score']*100, 2),
+                               components={k: round(v*100,2) for k,v in result['components'].items()},
+                               chunk_matches=result['chunk_matches'],
+                               heatmap=result.get('heatmap'),
+                               spans=result['spans'],
+                               spans_total=result.get('spans_total', len(result['spans'])),
+                               links=result.get('links'),
+                               code1=None if lazy else code1,
+                               code2=None if lazy else code2)
 
     @app.route('/api/compare', methods=['POST'])
     def api_compare():
@@ -55,14 +270,204 @@ def create_app():
             return jsonify({"error": "Both files required"}), 400
         code1 = f1.read().decode('utf-8', errors='ignore')
         code2 = f2.read().decode('utf-8', errors='ignore')
-        report = scorer.score(code1, code2)
-        spans = highlight_similar_regions(code1, code2)
+        try:
+            detail = detail_arg()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        with_timings, with_profile = flag('timings'), flag('profile')
+        if with_timings or with_profile:
+            return jsonify(compare_payload(code1, f1.filename, code2, f2.filename, with_timings=with_timings,
+                                           with_profile=with_profile, detail=detail))
+        # the result is a function of the two sources and the engine settings, so that hash is the ETag
+        etag = f"{compare_key(code1, f1.filename, code2, f2.filename)}-{detail}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = jsonify(compare_payload(code1, f1.filename, code2, f2.filename, detail=detail))
+        response.set_etag(etag)
+        return response
+
+    @app.route('/api/comparisons/<cid>', methods=['GET'])
+    def api_comparison(cid):
+        scores = comparison_entry(cid)
+        if scores is None:
+            return jsonify({"error": "Unknown or expired comparison"}), 404
+        return jsonify({"comparison_id": cid, **scores, "links": comparison_links(cid)})
+
+    @app.route('/api/comparisons/<cid>/spans', methods=['GET'])
+    def api_comparison_spans(cid):
+        try:
+            offset, limit = page_args()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        spans = comparison_entry(cid, ":spans")
+        if spans is None:
+            # first request after a score-only comparison: align now, once
+            sources = comparison_entry(cid, ":sources")
+            if sources is None:
+                return jsonify({"error": "Unknown or expired comparison"}), 404
+            spans = explain(scorer.prepare(sources['a'], sources['name_a']),
+                            scorer.prepare(sources['b'], sources['name_b']))
+            result_cache.put(cid + ":spans", spans)
+        return jsonify({"comparison_id": cid, "offset": offset, "limit": limit, "total": len(spans['spans']),
+                        "truncated": spans['truncated'], "spans": spans['spans'][offset:offset + limit]})
+
+    @app.route('/api/comparisons/<cid>/heatmap', methods=['GET'])
+    def api_comparison_heatmap(cid):
+        scores = comparison_entry(cid)
+        if scores is None:
+            return jsonify({"error": "Unknown or expired comparison"}), 404
+        return jsonify({"comparison_id": cid, "heatmap": scores['heatmap']})
+
+    @app.route('/api/comparisons/<cid>/source/<side>', methods=['GET'])
+    def api_comparison_source(cid, side):
+        if side not in ("a", "b"):
+            return jsonify({"error": "side must be a or b"}), 404
+        try:
+            offset, limit = page_args()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        sources = comparison_entry(cid, ":sources")
+        if sources is None:
+            return jsonify({"error": "Unknown or expired comparison"}), 404
+        code = sources[side]
+        lines = code.splitlines(keepends=True)
+        # char offset of the page, so span offsets can be mapped onto it
+        start = sum(len(line) for line in lines[:offset])
+        return jsonify({"comparison_id": cid, "side": side, "name": sources['name_' + side], "offset": offset,
+                        "limit": limit, "total_lines": len(lines), "char_offset": start,
+                        "lines": lines[offset:offset + limit]})
+
+    @app.route('/api/batch', methods=['POST'])
+    def api_batch():
+        # MAX_CONTENT_LENGTH is per source file; an archive gets its own cap
+        request.max_content_length = Config.BATCH_MAX_ARCHIVE_MB * 1024 * 1024
+        if request.mimetype == 'multipart/form-data':
+            f = request.files.get('archive')
+            if not f:
+                return jsonify({"error": "Archive required"}), 400
+            stream = f.stream
+        else:
+            # raw body: tarballs are decompressed while the upload is still arriving
+            stream = request.stream
+        try:
+            min_overlap = float(request.args.get('min_overlap', Config.SCAN_MIN_OVERLAP))
+            top = int(request.args.get('top', Config.BATCH_TOP))
+            members = open_archive(stream, Config.ALLOWED_EXTENSIONS, Config.MAX_CONTENT_LENGTH,
+                                   max_files=Config.BATCH_MAX_FILES,
+                                   max_archive_bytes=request.max_content_length)
+        except ArchiveTooLarge as e:
+            return jsonify({"error": str(e)}), 413
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        def events():
+            try:
+                for event in scan_stream(members, scorer, min_overlap=min_overlap, threshold=Config.SIM_THRESHOLD,
+                                         max_df=Config.SCAN_MAX_DF, top=top):
+                    yield json.dumps(event) + "\n"
+            except Exception as e:  # the status line is already sent; report it in the stream
+                app.logger.exception("batch scan failed")
+                yield json.dumps({"type": "error", "error": f"{type(e).__name__}: {e}"}) + "\n"
+
+        return Response(stream_with_context(events()), mimetype='application/x-ndjson')
+
+    @app.route('/api/similar', methods=['POST'])
+    def api_similar():
+        f = request.files.get('file')
+        if not f:
+            return jsonify({"error": "File required"}), 400
+        try:
+            k = int(request.form.get('k', 10))
+        except ValueError:
+            return jsonify({"error": "k must be an integer"}), 400
+        doc = scorer.prepare(f.read().decode('utf-8', errors='ignore'), f.filename)
+        result = find_similar(archive_index(), doc, scorer.embedder, k=k, scorer=scorer,
+                              rerank=Config.INDEX_RERANK, exclude_self=False, chunking=scorer.chunking,
+                              chunk_tokens=scorer.chunk_tokens)
+        return jsonify(result)
+
+    @app.route('/api/fp-matches', methods=['POST'])
+    def api_fp_matches():
+        f = request.files.get('file')
+        if not f:
+            return jsonify({"error": "File required"}), 400
+        try:
+            top = int(request.form.get('top', 10))
+            index = fp_index(request.form.get('namespace', 'default'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except UnknownNamespace as e:
+            return jsonify({"error": str(e)}), 404
+        doc = scorer.prepare(f.read().decode('utf-8', errors='ignore'), f.filename)
+        return jsonify(index.query(doc.fingerprints, top=top))
+
+    @app.route('/api/jobs', methods=['POST'])
+    def api_submit_job():
+        f1 = request.files.get('file1')
+        f2 = request.files.get('file2')
+        if not f1 or not f2:
+            return jsonify({"error": "Both files required"}), 400
+        code1 = f1.read().decode('utf-8', errors='ignore')
+        code2 = f2.read().decode('utf-8', errors='ignore')
+        try:
+            job_id = jobs.submit(compare_payload, code1, f1.filename, code2, f2.filename, flag('timings'), False,
+                                 detail_arg())
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except JobQueueFull as e:
+            return jsonify({"error": str(e)}), 429, {"Retry-After": "5"}
+        status_url = url_for('api_job_status', job_id=job_id)
+        return jsonify({"job_id": job_id, "status": "queued", "status_url": status_url}), 202, {"Location": status_url}
+
+    @app.route('/api/jobs/<job_id>', methods=['GET'])
+    def api_job_status(job_id):
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown or expired job"}), 404
+        return jsonify(job)
+
+    @app.route('/api/jobs/<job_id>', methods=['DELETE'])
+    def api_cancel_job(job_id):
+        status = jobs.cancel(job_id)
+        if status is None:
+            return jsonify({"error": "Unknown or expired job"}), 404
+        if status in ("done", "failed"):
+            return jsonify({"job_id": job_id, "status": status, "error": "Job already finished"}), 409
+        return jsonify({"job_id": job_id, "status": status})
+
+    @app.route('/api/stats', methods=['GET'])
+    def api_stats():
+        embedder = scorer.embedder
         return jsonify({
-            "threshold": Config.SIM_THRESHOLD,
-            "ensemble_score": report['ensemble_score'],
-            "components": report['components'],
-            "chunk_matches": report['chunks']['topk_matches'],
-            "spans": spans['spans']
+            "embedding_cache": embedder.cache.stats() if embedder.cache is not None else None,
+            "result_cache": result_stats(),
+            "embedding_batches": embedder.stats() if isinstance(embedder, BatchingEmbedder) else None,
+            "embedding_backend": {"name": embedder.backend, "loaded": embedder.loaded,
+                                  "load_seconds": embedder.load_seconds},
+            "job_queue_depth": jobs.queue_depth(),
         })
 
+    @app.route('/healthz', methods=['GET'])
+    def healthz():
+        return jsonify({"status": "ok", "pid": os.getpid()})
+
+    @app.route('/readyz', methods=['GET'])
+    def readyz():
+        # not ready until a warm-up inference finished; the first probe starts one
+        start_warmup()
+        embedder = scorer.embedder
+        body = {"ready": warm["ready"], "pid": os.getpid(), "warmup_seconds": warm["seconds"],
+                "model_load_seconds": embedder.load_seconds,
+                "model_preloaded": is_preloaded(embedder.backend, embedder.model_name, embedder.device,
+                                                embedder.onnx_dir),
+                "error": warm["error"]}
+        return jsonify(body), 200 if warm["ready"] else 503
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        if not Config.METRICS_ENABLED:
+            return jsonify({"error": "Metrics are disabled"}), 404
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
     return app
@@ -0,0 +1,56 @@
+"""Span alignment on large file pairs: token-level tiling vs. the old char-level diff.
+
+    python benchmarks/bench_alignment.py [--kb 50 100 200] [source.py]
+
+File B is file A with identifiers renamed and a few lines inserted, so the
+char diff also has to cope with renames.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from app.engine.document import prepare_document
+from app.engine.explain import highlight_documents, highlight_similar_regions_chars
+
+
+def make_pair(seed: str, size: int):
+    a = (seed * (size // max(1, len(seed)) + 1))[:size]
+    names = sorted(set(re.findall(r"\b[a-z_][a-z0-9_]{3,}\b", a)))[:40]
+    b = a
+    for n in names:
+        b = re.sub(r"\b%s\b" % n, n[::-1] + "_x", b)
+    lines = b.split("\n")
+    for k in range(0, len(lines), 50):
+        lines.insert(k, "    pass  # inserted")
+    return a, "\n".join(lines)
+
+
+def coverage(spans, key, n):
+    return sum(s[key + "_end"] - s[key + "_start"] for s in spans) / max(1, n)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("source", nargs="?", default=os.path.join(REPO_DIR, "streamlit_app.py"))
+    p.add_argument("--kb", type=int, nargs="+", default=[50, 100, 200])
+    args = p.parse_args()
+    seed = open(args.source, encoding="utf-8", errors="ignore").read()
+    print(f"{'size':>6} {'chars ms':>10} {'chars cov':>9} {'tokens ms':>10} {'tokens cov':>10}")
+    for kb in args.kb:
+        a, b = make_pair(seed, kb * 1024)
+        t0 = time.perf_counter()
+        old = highlight_similar_regions_chars(a, b)
+        t1 = time.perf_counter()
+        new = highlight_documents(prepare_document(a, "a.py"), prepare_document(b, "b.py"))
+        t2 = time.perf_counter()
+        print(f"{kb:>4}KB {(t1 - t0) * 1000:>10.1f} {coverage(old['spans'], 'a', len(a)):>9.1%} "
+              f"{(t2 - t1) * 1000:>10.1f} {coverage(new['spans'], 'a', len(a)):>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Per-comparison embedding latency: one batched forward pass vs. the old four encode calls.
+
+    python benchmarks/bench_compare_batching.py [--model NAME] [--repeat 20] [file_a file_b]
+
+Runs on CPU with the embedding cache disabled, so every call pays for inference.
+Both sides embed exactly the same texts (both files and their chunk_text
+windows) and only the embedding calls are timed.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from app.config import Config
+from app.engine.embeddings import chunk_text, encode_batch
+from app.engine.scorer import HybridScorer
+
+
+def legacy_embedding_stage(embedder, norm_a, norm_b, chunks_a, chunks_b):
+    # what HybridScorer.score did before batching: four separate encode calls
+    embedder.encode([norm_a])
+    embedder.encode([norm_b])
+    embedder.encode(chunks_a)
+    embedder.encode(chunks_b)
+
+
+def batched_embedding_stage(embedder, norm_a, norm_b, chunks_a, chunks_b):
+    encode_batch(embedder, [norm_a, norm_b] + chunks_a + chunks_b)
+
+
+def timed(fn, repeat):
+    fn()  # warm-up
+    out = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - t0) * 1000)
+    return out
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("files", nargs="*", default=[os.path.join(REPO_DIR, "sample_data/py/a.py"),
+                                                 os.path.join(REPO_DIR, "sample_data/py/b.py")])
+    p.add_argument("--model", default=Config.MODEL_NAME)
+    p.add_argument("--repeat", type=int, default=20)
+    args = p.parse_args()
+    code_a, code_b = (open(f, encoding="utf-8", errors="ignore").read() for f in args.files[:2])
+
+    scorer = HybridScorer(args.model, device="cpu")
+    doc_a, doc_b = scorer.prepare(code_a), scorer.prepare(code_b)
+    texts = (doc_a.norm, doc_b.norm, chunk_text(doc_a.norm), chunk_text(doc_b.norm))
+    old = timed(lambda: legacy_embedding_stage(scorer.embedder, *texts), args.repeat)
+    new = timed(lambda: batched_embedding_stage(scorer.embedder, *texts), args.repeat)
+    print(f"chunks: a={len(texts[2])} b={len(texts[3])}")
+    print(f"legacy (4 encode calls):       median {statistics.median(old):8.2f} ms")
+    print(f"batched (1 encode_batch call): median {statistics.median(new):8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Concurrent /api/compare-style load with and without embedding micro-batching.
+
+    python benchmarks/bench_microbatch.py [--model NAME] [--clients 8] [--requests 200]
+
+Each client thread scores file pairs back to back (embedding cache disabled);
+reports requests/sec and p50/p99 latency for both modes.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import numpy as np
+from app.config import Config
+from app.engine.batching import BatchingEmbedder
+from app.engine.scorer import HybridScorer
+
+
+def run(scorer, pairs, clients, total):
+    lat = []
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def client():
+        while True:
+            with lock:
+                k = next(counter, None)
+            if k is None:
+                return
+            a, b = pairs[k % len(pairs)]
+            t0 = time.perf_counter()
+            scorer.score(a, b, "a.py", "b.py")
+            with lock:
+                lat.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    ms = np.array(lat) * 1000
+    return total / wall, np.percentile(ms, 50), np.percentile(ms, 99)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--model", default=Config.MODEL_NAME)
+    p.add_argument("--clients", type=int, default=8)
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--max-batch", type=int, default=Config.EMBED_BATCH_MAX)
+    p.add_argument("--max-wait-ms", type=float, default=Config.EMBED_BATCH_WAIT_MS)
+    args = p.parse_args()
+    seed = open(os.path.join(REPO_DIR, "sample_data/py/a.py")).read()
+    pairs = [(seed.replace("factorial", f"f{i}"), seed.replace("n", f"v{i}")) for i in range(50)]
+
+    scorer = HybridScorer(args.model, device="cpu")
+    plain = scorer.embedder
+    for name in ("direct", "micro-batched"):
+        if name == "micro-batched":
+            scorer.embedder = BatchingEmbedder(plain, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+        rps, p50, p99 = run(scorer, pairs, args.clients, args.requests)
+        print(f"{name:>14}: {rps:7.1f} req/s  p50 {p50:7.1f} ms  p99 {p99:7.1f} ms")
+    print(scorer.embedder.stats())
+
+
+if __name__ == "__main__":
+    main()
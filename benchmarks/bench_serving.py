@@ -0,0 +1,98 @@
+"""Startup time and memory of the gunicorn serving mode, model preloaded vs. per worker.
+
+    python benchmarks/bench_serving.py [--workers 1 2 4] [--model NAME] [--json out.json]
+
+For each worker count and mode (GUNICORN_PRELOAD_MODEL=true/false) starts
+`gunicorn -c gunicorn.conf.py`, polls GET /readyz until every worker answered
+ready (warm-up inference done), then sums memory over the master and its
+workers from /proc/<pid>/smaps_rollup: RSS counts shared pages once per
+process, PSS splits them between the processes sharing them, so PSS is the
+real footprint. Linux only.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def children(pid):
+    out = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            out += [int(c) for c in f.read().split()]
+    return out
+
+def memory_mb(pids):
+    total = {"Rss": 0, "Pss": 0}
+    for pid in pids:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key = line.split(":")[0]
+                if key in total:
+                    total[key] += int(line.split()[1])
+    return {k.lower() + "_mb": v / 1024 for k, v in total.items()}
+
+def wait_ready(port, workers, timeout):
+    ready = set()
+    deadline = time.time() + timeout
+    while len(ready) < workers:
+        if time.time() > deadline:
+            raise TimeoutError(f"only {len(ready)} of {workers} workers ready")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/readyz", timeout=5) as r:
+                ready.add(json.load(r)["pid"])
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.05)
+
+def run(workers, preload, model, timeout):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers), MODEL_NAME=model,
+               GUNICORN_PRELOAD_MODEL="true" if preload else "false", EMBED_CACHE_PATH="",
+               JOB_DB_PATH=os.path.join("/tmp", f"scpis-bench-jobs-{port}.sqlite3"))
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"], cwd=REPO_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port, workers, timeout)
+        ready_s = time.perf_counter() - t0
+        time.sleep(1.0)  # let the workers settle after warm-up
+        pids = [proc.pid] + children(proc.pid)
+        return {"workers": workers, "preload": preload, "ready_seconds": ready_s, **memory_mb(pids)}
+    finally:
+        proc.terminate()
+        proc.wait(30)
+
+def main():
+    p = argparse.ArgumentParser()
+    sys.path.insert(0, os.path.join(REPO_DIR, "app"))
+    from config import Config
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    p.add_argument("--model", default=Config.MODEL_NAME)
+    p.add_argument("--timeout", type=float, default=600)
+    p.add_argument("--json", dest="out_json", default=None)
+    args = p.parse_args()
+    rows = []
+    print(f"{'workers':>7} {'mode':>10} {'ready s':>8} {'RSS MB':>8} {'PSS MB':>8}")
+    for n in args.workers:
+        for preload in (False, True):
+            r = run(n, preload, args.model, args.timeout)
+            rows.append(r)
+            print(f"{n:>7} {'preload' if preload else 'per-worker':>10} {r['ready_seconds']:8.1f} "
+                  f"{r['rss_mb']:8.0f} {r['pss_mb']:8.0f}")
+    if args.out_json:
+        with open(args.out_json, "w") as f:
+            json.dump({"model": args.model, "cpus": os.cpu_count(), "runs": rows}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
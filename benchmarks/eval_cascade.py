@@ -0,0 +1,99 @@
+"""How much model compute the cascading scorer saves, and what it costs in accuracy.
+
+    python benchmarks/eval_cascade.py submissions/ [--model NAME] [--all-pairs]
+        [--fp-high 0.85] [--tfidf-low 0.15] [--tfidf-high 0.95] [--json out.json]
+
+Scores the same pairs with the full ensemble and with the cascade, then reports
+how many pairs exited at each stage, embedded texts and wall time saved, the
+ensemble-score drift of early-exit verdicts and verdict agreement at
+SIM_THRESHOLD. By default only scan candidates (fingerprint-pruned) are used.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from itertools import combinations
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import numpy as np
+from app.config import Config
+from app.engine.corpus import candidate_pairs, load_corpus
+from app.engine.scorer import Cascade, HybridScorer
+
+
+def count_texts(scorer):
+    counter = {"texts": 0}
+    encode = scorer.embedder.encode
+
+    def counting(texts):
+        counter["texts"] += len(texts)
+        return encode(texts)
+    scorer.embedder.encode = counting
+    return counter
+
+
+def run(scorer, docs, pairs, counter):
+    counter["texts"] = 0
+    t0 = time.perf_counter()
+    reports = [scorer.score_documents(docs[i], docs[j]) for i, j in pairs]
+    return reports, time.perf_counter() - t0, counter["texts"]
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("directory")
+    p.add_argument("--model", default=Config.MODEL_NAME)
+    p.add_argument("--all-pairs", action="store_true", help="Evaluate every pair, not only scan candidates")
+    p.add_argument("--fp-low", type=float, default=Config.CASCADE_FP_LOW)
+    p.add_argument("--fp-high", type=float, default=Config.CASCADE_FP_HIGH)
+    p.add_argument("--tfidf-low", type=float, default=Config.CASCADE_TFIDF_LOW)
+    p.add_argument("--tfidf-high", type=float, default=Config.CASCADE_TFIDF_HIGH)
+    p.add_argument("--threshold", type=float, default=Config.SIM_THRESHOLD)
+    p.add_argument("--json", dest="out_json", default=None)
+    args = p.parse_args()
+
+    docs = load_corpus(args.directory, Config.ALLOWED_EXTENSIONS, max_bytes=Config.MAX_CONTENT_LENGTH)
+    if args.all_pairs:
+        pairs = list(combinations(range(len(docs)), 2))
+    else:
+        pairs = [(i, j) for i, j, _ in candidate_pairs(docs, Config.SCAN_MIN_OVERLAP, Config.SCAN_MAX_DF)]
+    scorer = HybridScorer(args.model, device=Config.DEVICE)
+    counter = count_texts(scorer)
+
+    full, full_s, full_texts = run(scorer, docs, pairs, counter)
+    scorer.cascade = Cascade(args.fp_low, args.fp_high, args.tfidf_low, args.tfidf_high)
+    casc, casc_s, casc_texts = run(scorer, docs, pairs, counter)
+
+    exits = {}
+    drift = []
+    agree = 0
+    for f, c in zip(full, casc):
+        key = f"{c['stages'][-1]}:{c['early_exit']}" if c['early_exit'] else "full"
+        exits[key] = exits.get(key, 0) + 1
+        if c['early_exit']:
+            drift.append(abs(f['ensemble_score'] - c['ensemble_score']))
+        agree += (f['ensemble_score'] >= args.threshold) == (c['ensemble_score'] >= args.threshold)
+    n = max(1, len(pairs))
+    summary = {
+        "files": len(docs),
+        "pairs": len(pairs),
+        "bounds": vars(scorer.cascade),
+        "exits": exits,
+        "embedded_texts": {"full": full_texts, "cascade": casc_texts,
+                           "saved": 1 - casc_texts / full_texts if full_texts else 0.0},
+        "seconds": {"full": full_s, "cascade": casc_s, "saved": 1 - casc_s / full_s if full_s else 0.0},
+        "early_exit_drift": {"mean": float(np.mean(drift)) if drift else 0.0,
+                             "max": float(np.max(drift)) if drift else 0.0},
+        "verdict_agreement": agree / n,
+    }
+    print(json.dumps(summary, indent=2))
+    if args.out_json:
+        with open(args.out_json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Reproducible engine benchmark on a synthetic plagiarism corpus.
+
+    python -m benchmarks.suite [--variants 4] [--families 8] [--seed 0] [--model NAME]
+        [--max-pairs 2000] [--json results.json] [--baseline old.json] [--tolerance 0.25]
+
+Generates a corpus with benchmarks.synth, prepares every file (lexing,
+winnowing), then scores every pair (or a seeded sample of --max-pairs) with
+HybridScorer plus span alignment, embedding cache disabled. Reports files/sec,
+pairs/sec, p50/p99 per-pair latency, per-stage time shares and input sizes,
+peak RSS, and precision/recall at SIM_THRESHOLD (same family = plagiarism),
+with recall broken down by obfuscation transform.
+
+With --baseline, the run is compared against an earlier result file: latency
+or throughput worse by more than --tolerance (relative), or precision/recall
+lower by more than --quality-tolerance (absolute), is a regression and the
+exit status is 1. Timing numbers are only comparable on the same machine.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from itertools import combinations
+from typing import Any, Dict, List
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import numpy as np
+from app.config import Config
+from app.engine.document import prepare_document
+from app.engine.explain import highlight_documents
+from app.engine.metrics import Timings
+from app.engine.scorer import HybridScorer
+from benchmarks.synth import TRANSFORMS, generate_corpus, load_seeds
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB elsewhere
+
+def quality(scores, truth, threshold: float) -> Dict[str, Any]:
+    pred = np.asarray(scores) >= threshold
+    truth = np.asarray(truth, dtype=bool)
+    tp, fp = int((pred & truth).sum()), int((pred & ~truth).sum())
+    fn, tn = int((~pred & truth).sum()), int((~pred & ~truth).sum())
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"threshold": threshold, "precision": precision, "recall": recall, "f1": f1,
+            "tp": tp, "fp": fp, "fn": fn, "tn": tn}
+
+def run(args) -> Dict[str, Any]:
+    files = generate_corpus(load_seeds(args.seeds), args.variants, args.seed, args.transforms, args.families)
+    scorer = HybridScorer(args.model, device=Config.DEVICE, chunking=Config.CHUNKING,
+                          chunk_tokens=Config.CHUNK_TOKENS)
+    scorer.embedder.warmup()
+
+    prep = Timings()
+    t0 = time.perf_counter()
+    docs = [prepare_document(f.code, f.name, timings=prep) for f in files]
+    prep_s = time.perf_counter() - t0
+
+    pairs = list(combinations(range(len(files)), 2))
+    if args.max_pairs and len(pairs) > args.max_pairs:
+        pairs = sorted(random.Random(args.seed).sample(pairs, args.max_pairs))
+    stages = Timings()
+    latency, scores = [], []
+    t0 = time.perf_counter()
+    for i, j in pairs:
+        p0 = time.perf_counter()
+        report = scorer.score_documents(docs[i], docs[j], timings=stages)
+        with stages.stage("explain", tokens=len(docs[i].tokens) + len(docs[j].tokens)):
+            highlight_documents(docs[i], docs[j], min_match=Config.SPAN_MIN_TOKENS,
+                                max_seconds=Config.SPAN_MAX_SECONDS)
+        latency.append(time.perf_counter() - p0)
+        scores.append(report["ensemble_score"])
+    score_s = time.perf_counter() - t0
+
+    truth = [files[i].family == files[j].family for i, j in pairs]
+    by_transform = {}
+    for t in args.transforms:
+        # original vs. variants that used transform t
+        sel = [k for k, (i, j) in enumerate(pairs) if files[i].family == files[j].family
+               and not files[i].transforms and t in files[j].transforms]
+        if sel:
+            by_transform[t] = quality([scores[k] for k in sel], [True] * len(sel), args.threshold)["recall"]
+    total = sum(r["seconds"] for t in (prep, stages) for r in t.stages.values()) or 1.0
+    ms = np.array(latency) * 1000 if latency else np.zeros(1)
+    return {
+        "config": {"model": args.model, "device": Config.DEVICE, "seed": args.seed, "variants": args.variants,
+                   "families": len({f.family for f in files}), "transforms": list(args.transforms),
+                   "chunking": Config.CHUNKING, "threshold": args.threshold},
+        "env": {"python": platform.python_version(), "platform": platform.platform(),
+                "numpy": np.__version__, "cpus": os.cpu_count()},
+        "corpus": {"files": len(files), "pairs": len(pairs), "positive_pairs": int(sum(truth)),
+                   "bytes": sum(len(f.code) for f in files)},
+        "throughput": {"prepare_files_per_sec": len(files) / prep_s if prep_s else 0.0,
+                       "pairs_per_sec": len(pairs) / score_s if score_s else 0.0,
+                       "files_per_sec": len(files) / (prep_s + score_s) if prep_s + score_s else 0.0},
+        "latency_ms": {"p50": float(np.percentile(ms, 50)), "p99": float(np.percentile(ms, 99)),
+                       "mean": float(ms.mean())},
+        "stages": {name: {**rec, "share": rec["seconds"] / total}
+                   for name, rec in {**prep.as_dict(), **stages.as_dict()}.items()},
+        "peak_rss_mb": peak_rss_mb(),
+        "quality": quality(scores, truth, args.threshold),
+        "recall_by_transform": by_transform,
+    }
+
+# (path, direction): +1 = higher is better, -1 = lower is better
+_TIMED = [(("throughput", "prepare_files_per_sec"), 1), (("throughput", "pairs_per_sec"), 1),
+          (("latency_ms", "p50"), -1), (("latency_ms", "p99"), -1), (("peak_rss_mb",), -1)]
+_QUALITY = [("quality", "precision"), ("quality", "recall")]
+
+def _get(d: Dict[str, Any], path):
+    for k in path:
+        d = d.get(k) if isinstance(d, dict) else None
+    return d
+
+def regressions(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float = 0.25,
+                quality_tolerance: float = 0.02) -> List[str]:
+    out = []
+    for path, direction in _TIMED:
+        old, new = _get(baseline, path), _get(current, path)
+        if not old or new is None:
+            continue
+        change = (new - old) / old * direction  # negative = worse
+        if change < -tolerance:
+            out.append(f"{'.'.join(path)}: {old:.4g} -> {new:.4g} ({change:+.0%})")
+    for path in _QUALITY:
+        old, new = _get(baseline, path), _get(current, path)
+        if old is not None and new is not None and new < old - quality_tolerance:
+            out.append(f"{'.'.join(path)}: {old:.3f} -> {new:.3f}")
+    return out
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--seeds", default=None, help="Directory of seed .py programs (default: built-in seeds)")
+    p.add_argument("--variants", type=int, default=4)
+    p.add_argument("--families", type=int, default=None)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--transforms", nargs="+", choices=TRANSFORMS, default=list(TRANSFORMS))
+    p.add_argument("--model", default=Config.MODEL_NAME)
+    p.add_argument("--threshold", type=float, default=Config.SIM_THRESHOLD)
+    p.add_argument("--max-pairs", type=int, default=2000)
+    p.add_argument("--json", dest="out_json", default=None)
+    p.add_argument("--baseline", default=None, help="Earlier --json output to compare against")
+    p.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown")
+    p.add_argument("--quality-tolerance", type=float, default=0.02, help="Allowed precision/recall drop")
+    args = p.parse_args()
+
+    result = run(args)
+    if args.baseline:
+        with open(args.baseline) as f:
+            result["regressions"] = regressions(json.load(f), result, args.tolerance, args.quality_tolerance)
+    if args.out_json:
+        with open(args.out_json, "w") as f:
+            json.dump(result, f, indent=2)
+    print(json.dumps(result, indent=2))
+    if result.get("regressions"):
+        print("regressions:\n  " + "\n  ".join(result["regressions"]), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,492 @@
+"""Synthetic plagiarism corpus: seed programs plus obfuscated copies.
+
+    python -m benchmarks.synth out_dir/ [--seeds DIR] [--variants 4] [--seed 0]
+
+Every seed program is one family: the original and `variants` copies, each
+made with a random subset of the transforms below (identifier renaming,
+statement reordering, comment/whitespace changes, dead-code insertion, for ->
+while loop rewriting). Files of a family are plagiarism pairs; files of
+different families are not. Python seeds only (transforms work on the ast);
+the same random seed always yields the same corpus. Writes the files and a
+labels.json with family and transforms per file.
+"""
+import argparse
+import ast
+import builtins
+import json
+import os
+import random
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+TRANSFORMS = ("rename", "reorder", "comments", "dead_code", "loops")
+
+SEEDS = {
+    "bubble_sort": '''
+def bubble_sort(items):
+    data = list(items)
+    n = len(data)
+    for i in range(n):
+        swapped = False
+        for j in range(0, n - i - 1):
+            if data[j] > data[j + 1]:
+                data[j], data[j + 1] = data[j + 1], data[j]
+                swapped = True
+        if not swapped:
+            break
+    return data
+
+def is_sorted(items):
+    for k in range(1, len(items)):
+        if items[k - 1] > items[k]:
+            return False
+    return True
+
+if __name__ == "__main__":
+    values = [5, 3, 8, 1, 9, 2]
+    result = bubble_sort(values)
+    print(result, is_sorted(result))
+''',
+    "binary_search": '''
+def binary_search(arr, target):
+    low = 0
+    high = len(arr) - 1
+    while low <= high:
+        mid = (low + high) // 2
+        if arr[mid] == target:
+            return mid
+        elif arr[mid] < target:
+            low = mid + 1
+        else:
+            high = mid - 1
+    return -1
+
+def count_found(arr, targets):
+    found = 0
+    for t in targets:
+        if binary_search(arr, t) >= 0:
+            found += 1
+    return found
+
+if __name__ == "__main__":
+    nums = list(range(0, 100, 3))
+    print(binary_search(nums, 42), count_found(nums, [3, 4, 5, 6]))
+''',
+    "word_count": '''
+def tokenize(text):
+    words = []
+    current = ""
+    for ch in text.lower():
+        if ch.isalnum():
+            current += ch
+        elif current:
+            words.append(current)
+            current = ""
+    if current:
+        words.append(current)
+    return words
+
+def word_count(text):
+    counts = {}
+    for word in tokenize(text):
+        counts[word] = counts.get(word, 0) + 1
+    return counts
+
+def top_words(text, n):
+    counts = word_count(text)
+    ranked = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))
+    return ranked[:n]
+
+if __name__ == "__main__":
+    sample = "the quick brown fox jumps over the lazy dog the end"
+    print(top_words(sample, 3))
+''',
+    "matrix": '''
+def zeros(rows, cols):
+    return [[0 for _ in range(cols)] for _ in range(rows)]
+
+def multiply(a, b):
+    rows, inner, cols = len(a), len(b), len(b[0])
+    out = zeros(rows, cols)
+    for i in range(rows):
+        for j in range(cols):
+            total = 0
+            for k in range(inner):
+                total += a[i][k] * b[k][j]
+            out[i][j] = total
+    return out
+
+def transpose(m):
+    result = zeros(len(m[0]), len(m))
+    for i in range(len(m)):
+        for j in range(len(m[0])):
+            result[j][i] = m[i][j]
+    return result
+
+if __name__ == "__main__":
+    m = [[1, 2], [3, 4]]
+    print(multiply(m, transpose(m)))
+''',
+    "primes": '''
+def sieve(limit):
+    is_prime = [True] * (limit + 1)
+    is_prime[0] = is_prime[1] = False
+    for p in range(2, int(limit ** 0.5) + 1):
+        if is_prime[p]:
+            for multiple in range(p * p, limit + 1, p):
+                is_prime[multiple] = False
+    return [i for i, flag in enumerate(is_prime) if flag]
+
+def gcd(a, b):
+    while b:
+        a, b = b, a % b
+    return a
+
+def lcm(a, b):
+    return a * b // gcd(a, b)
+
+if __name__ == "__main__":
+    print(sieve(50), gcd(84, 36), lcm(4, 6))
+''',
+    "stack": '''
+class Stack:
+    def __init__(self):
+        self.items = []
+
+    def push(self, value):
+        self.items.append(value)
+
+    def pop(self):
+        if not self.items:
+            raise IndexError("pop from empty stack")
+        return self.items.pop()
+
+    def peek(self):
+        return self.items[-1] if self.items else None
+
+    def size(self):
+        return len(self.items)
+
+def balanced(expr):
+    pairs = {")": "(", "]": "[", "}": "{"}
+    stack = Stack()
+    for ch in expr:
+        if ch in "([{":
+            stack.push(ch)
+        elif ch in pairs:
+            if stack.size() == 0 or stack.pop() != pairs[ch]:
+                return False
+    return stack.size() == 0
+
+if __name__ == "__main__":
+    print(balanced("([]{})"), balanced("(]"))
+''',
+    "graph_bfs": '''
+from collections import deque
+
+def build_graph(edges):
+    graph = {}
+    for u, v in edges:
+        graph.setdefault(u, []).append(v)
+        graph.setdefault(v, []).append(u)
+    return graph
+
+def bfs(graph, start):
+    seen = {start}
+    order = []
+    queue = deque([start])
+    while queue:
+        node = queue.popleft()
+        order.append(node)
+        for nxt in graph.get(node, []):
+            if nxt not in seen:
+                seen.add(nxt)
+                queue.append(nxt)
+    return order
+
+def shortest_path_length(graph, start, goal):
+    dist = {start: 0}
+    queue = deque([start])
+    while queue:
+        node = queue.popleft()
+        if node == goal:
+            return dist[node]
+        for nxt in graph.get(node, []):
+            if nxt not in dist:
+                dist[nxt] = dist[node] + 1
+                queue.append(nxt)
+    return -1
+
+if __name__ == "__main__":
+    g = build_graph([(1, 2), (2, 3), (3, 4), (1, 5)])
+    print(bfs(g, 1), shortest_path_length(g, 1, 4))
+''',
+    "bank_account": '''
+class Account:
+    def __init__(self, owner, balance=0):
+        self.owner = owner
+        self.balance = balance
+        self.history = []
+
+    def deposit(self, amount):
+        if amount <= 0:
+            raise ValueError("amount must be positive")
+        self.balance += amount
+        self.history.append(("deposit", amount))
+
+    def withdraw(self, amount):
+        if amount > self.balance:
+            raise ValueError("insufficient funds")
+        self.balance -= amount
+        self.history.append(("withdraw", amount))
+
+def apply_interest(accounts, rate):
+    for acc in accounts:
+        interest = acc.balance * rate
+        acc.deposit(round(interest, 2))
+    return sum(acc.balance for acc in accounts)
+
+if __name__ == "__main__":
+    a = Account("ann", 100)
+    a.withdraw(30)
+    print(apply_interest([a, Account("bob", 50)], 0.05))
+''',
+}
+
+_RESERVED = set(dir(builtins)) | {"self", "cls", "__name__", "__init__", "__main__"}
+# method names that builtin containers also have: renaming them would break e.g. list.pop()
+_BUILTIN_ATTRS = {a for t in (list, dict, set, str, tuple, bytes, int, float) for a in dir(t)}
+_NAMES = ["alpha", "beta", "gamma", "delta", "value", "item", "temp", "node", "count", "buf", "acc", "res",
+          "data", "elem", "cur", "idx", "tmp", "aux", "xs", "ys", "val", "key", "out", "store"]
+
+class SynthFile(NamedTuple):
+    name: str
+    code: str
+    family: str
+    transforms: tuple  # applied to make this file from the seed; () for the original
+
+def _defined_names(tree: ast.AST) -> List[str]:
+    # names the program binds itself (functions, classes, args, assigned names); never
+    # attributes, imported or builtin names, so renaming keeps the program valid
+    imported = {a.asname or a.name.split(".")[0] for n in ast.walk(tree)
+                if isinstance(n, (ast.Import, ast.ImportFrom)) for a in n.names}
+    out = []
+    for n in ast.walk(tree):
+        if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            out.append(n.name)
+        elif isinstance(n, ast.arg):
+            out.append(n.arg)
+        elif isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store):
+            out.append(n.id)
+    seen = set()
+    return [x for x in out if x not in _RESERVED and x not in imported and not x.startswith("__")
+            and not (x in seen or seen.add(x))]
+
+class _Rename(ast.NodeTransformer):
+    def __init__(self, mapping: Dict[str, str]):
+        self.mapping = mapping
+
+    def visit_Name(self, node):
+        node.id = self.mapping.get(node.id, node.id)
+        return node
+
+    def visit_arg(self, node):
+        node.arg = self.mapping.get(node.arg, node.arg)
+        return node
+
+    def visit_FunctionDef(self, node):
+        node.name = self.mapping.get(node.name, node.name)
+        self.generic_visit(node)
+        return node
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node):
+        node.name = self.mapping.get(node.name, node.name)
+        self.generic_visit(node)
+        return node
+
+    def visit_Attribute(self, node):
+        # methods are looked up by attribute: rename those consistently too
+        self.generic_visit(node)
+        node.attr = self.mapping.get(node.attr, node.attr) if node.attr in self.methods else node.attr
+        return node
+
+def rename_identifiers(tree: ast.Module, rng: random.Random) -> ast.Module:
+    names = _defined_names(tree)
+    pool = list(_NAMES)
+    rng.shuffle(pool)
+    mapping = {n: f"{pool[i % len(pool)]}{i // len(pool) or ''}_{rng.randrange(100)}" for i, n in enumerate(names)}
+    renamer = _Rename(mapping)
+    renamer.methods = {f.name for c in ast.walk(tree) if isinstance(c, ast.ClassDef)
+                       for f in c.body if isinstance(f, ast.FunctionDef)} - _BUILTIN_ATTRS
+    for m in set(mapping) & _BUILTIN_ATTRS - renamer.methods:
+        del mapping[m]  # kept as-is everywhere, since attribute uses are not renamed
+    return renamer.visit(tree)
+
+def _reads_writes(stmt: ast.stmt):
+    reads = {n.id for n in ast.walk(stmt) if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Load)}
+    writes = {n.id for n in ast.walk(stmt) if isinstance(n, ast.Name) and not isinstance(n.ctx, ast.Load)}
+    return reads, writes
+
+def _independent(a: ast.stmt, b: ast.stmt) -> bool:
+    simple = (ast.Assign, ast.AugAssign, ast.AnnAssign)
+    if not (isinstance(a, simple) and isinstance(b, simple)):
+        return False
+    ra, wa = _reads_writes(a)
+    rb, wb = _reads_writes(b)
+    return not (wa & (rb | wb) or wb & ra)
+
+def reorder_statements(tree: ast.Module, rng: random.Random) -> ast.Module:
+    # shuffle top-level definitions and class members, swap independent adjacent assignments
+    defs = [i for i, s in enumerate(tree.body) if isinstance(s, (ast.FunctionDef, ast.ClassDef))]
+    order = [tree.body[i] for i in defs]
+    rng.shuffle(order)
+    for i, s in zip(defs, order):
+        tree.body[i] = s
+    for node in ast.walk(tree):
+        body = getattr(node, "body", None)
+        if not isinstance(body, list):
+            continue
+        if isinstance(node, ast.ClassDef):
+            methods = [i for i, s in enumerate(body) if isinstance(s, ast.FunctionDef) and s.name != "__init__"]
+            moved = [body[i] for i in methods]
+            rng.shuffle(moved)
+            for i, s in zip(methods, moved):
+                body[i] = s
+        for i in range(len(body) - 1):
+            if _independent(body[i], body[i + 1]) and rng.random() < 0.7:
+                body[i], body[i + 1] = body[i + 1], body[i]
+    return tree
+
+_DEAD = ["_unused = {n}", "if False:\n    print({n})", "_check = [x * {n} for x in range(0)]",
+         "for _ in range(0):\n    pass", "_flag = {n} < 0 and {n} > 0"]
+
+def insert_dead_code(tree: ast.Module, rng: random.Random, rate: float = 0.3) -> ast.Module:
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.body:
+            pos = rng.randrange(len(node.body))  # never after the last statement (may be a return)
+            stmt = ast.parse(rng.choice(_DEAD).format(n=rng.randrange(1, 99))).body
+            node.body[pos:pos] = stmt
+            if rng.random() < rate and len(node.body) > 1:
+                node.body[1:1] = ast.parse(rng.choice(_DEAD).format(n=rng.randrange(1, 99))).body
+    return tree
+
+def _has(node: ast.AST, kinds) -> bool:
+    return any(isinstance(n, kinds) for n in ast.walk(node))
+
+class _ForToWhile(ast.NodeTransformer):
+    """for v in range(a[, b[, step]]) -> v = a; while v < b: ...; v += step
+    (only loops without continue/else and with a positive literal step)."""
+
+    def visit_For(self, node):
+        self.generic_visit(node)
+        it = node.iter
+        if not (isinstance(node.target, ast.Name) and isinstance(it, ast.Call) and isinstance(it.func, ast.Name)
+                and it.func.id == "range" and 1 <= len(it.args) <= 3 and not it.keywords
+                and not node.orelse and not _has(node, ast.Continue)):
+            return node
+        args = it.args
+        start, stop = (ast.Constant(0), args[0]) if len(args) == 1 else (args[0], args[1])
+        step = args[2] if len(args) == 3 else ast.Constant(1)
+        if not (isinstance(step, ast.Constant) and isinstance(step.value, int) and step.value > 0):
+            return node
+        v = node.target.id
+        # the bound is evaluated once, like range(); _stop_<v> keeps it stable if the body changes it
+        bound = f"_stop_{v}"
+        init = ast.parse(f"{v} = 0\n{bound} = 0").body
+        init[0].value, init[1].value = start, stop
+        loop = ast.While(test=ast.Compare(ast.Name(v, ast.Load()), [ast.Lt()], [ast.Name(bound, ast.Load())]),
+                         body=node.body + [ast.AugAssign(ast.Name(v, ast.Store()), ast.Add(), step)], orelse=[])
+        return init + [loop]
+
+def rewrite_loops(tree: ast.Module, rng: random.Random) -> ast.Module:
+    return _ForToWhile().visit(tree)
+
+_COMMENTS = ["# helper", "# TODO: tidy up", "# main logic", "# edge case", "# see notes", "# loop over input",
+             "# compute result", "# NOTE: keep this simple"]
+
+def restyle(code: str, rng: random.Random) -> str:
+    """Comments, blank lines and indentation width; the program is unchanged."""
+    indent = rng.choice([2, 3, 4, 8])
+    out = []
+    for line in code.split("\n"):
+        stripped = line.lstrip(" ")
+        level = (len(line) - len(stripped)) // 4
+        text = " " * (indent * level) + stripped
+        if stripped and rng.random() < 0.15:
+            out.append(" " * (indent * level) + rng.choice(_COMMENTS))
+        if stripped and rng.random() < 0.1:
+            text += "  " + rng.choice(_COMMENTS)
+        out.append(text)
+        if stripped and rng.random() < 0.08:
+            out.append("")
+    return "\n".join(out) + "\n"
+
+def obfuscate(code: str, transforms: Sequence[str], rng: random.Random) -> str:
+    tree = ast.parse(code)
+    if "reorder" in transforms:
+        tree = reorder_statements(tree, rng)
+    if "loops" in transforms:
+        tree = rewrite_loops(tree, rng)
+    if "dead_code" in transforms:
+        tree = insert_dead_code(tree, rng)
+    if "rename" in transforms:
+        tree = rename_identifiers(tree, rng)
+    out = ast.unparse(ast.fix_missing_locations(tree))
+    if "comments" in transforms:
+        out = restyle(out, rng)
+    return out
+
+def load_seeds(directory: Optional[str] = None) -> Dict[str, str]:
+    if not directory:
+        return {k: v.lstrip("\n") for k, v in SEEDS.items()}
+    seeds = {}
+    for fn in sorted(os.listdir(directory)):
+        if fn.endswith(".py"):
+            with open(os.path.join(directory, fn), encoding="utf-8", errors="ignore") as f:
+                seeds[fn[:-3]] = f.read()
+    return seeds
+
+def generate_corpus(seeds: Dict[str, str], variants: int = 4, seed: int = 0,
+                    transforms: Sequence[str] = TRANSFORMS, families: Optional[int] = None) -> List[SynthFile]:
+    """Original plus `variants` obfuscated copies per seed program; each copy gets
+    1..all of `transforms`. With families > number of seeds, seeds are reused
+    under fresh random renamings so they still form separate families."""
+    rng = random.Random(seed)
+    names = sorted(seeds)
+    families = families or len(names)
+    files = []
+    for f in range(families):
+        base_name = names[f % len(names)]
+        family = base_name if f < len(names) else f"{base_name}_{f // len(names)}"
+        base = seeds[base_name] if f < len(names) else obfuscate(seeds[base_name], ("rename",), rng)
+        files.append(SynthFile(f"{family}__orig.py", base, family, ()))
+        for v in range(variants):
+            chosen = tuple(t for t in transforms if rng.random() < 0.5) or (rng.choice(list(transforms)),)
+            files.append(SynthFile(f"{family}__v{v}.py", obfuscate(base, chosen, rng), family, chosen))
+    return files
+
+def write_corpus(files: Sequence[SynthFile], out_dir: str):
+    os.makedirs(out_dir, exist_ok=True)
+    for f in files:
+        with open(os.path.join(out_dir, f.name), "w", encoding="utf-8") as fh:
+            fh.write(f.code)
+    labels = {f.name: {"family": f.family, "transforms": list(f.transforms)} for f in files}
+    with open(os.path.join(out_dir, "labels.json"), "w") as fh:
+        json.dump(labels, fh, indent=2)
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("out_dir")
+    p.add_argument("--seeds", default=None, help="Directory of seed .py programs (default: built-in seeds)")
+    p.add_argument("--variants", type=int, default=4)
+    p.add_argument("--families", type=int, default=None)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--transforms", nargs="+", choices=TRANSFORMS, default=list(TRANSFORMS))
+    args = p.parse_args()
+    files = generate_corpus(load_seeds(args.seeds), args.variants, args.seed, args.transforms, args.families)
+    write_corpus(files, args.out_dir)
+    print(f"{len(files)} files in {len({f.family for f in files})} families -> {args.out_dir}")
+
+if __name__ == "__main__":
+    main()
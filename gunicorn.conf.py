@@ -0,0 +1,51 @@
+"""Production serving: gunicorn -c gunicorn.conf.py app.app:app
+
+The master loads the embedding model once before forking (GUNICORN_PRELOAD_MODEL,
+default on), so the workers share its weights copy-on-write instead of loading
+one copy each. Only the model is preloaded, not the app: the job workers, the
+embedding micro-batcher and SQLite connections are created per worker, because
+threads and open connections do not survive fork(). Each worker pins torch to
+TORCH_THREADS (default: cores / workers) and runs a warm-up inference; GET
+/readyz answers 200 once that is done.
+"""
+import gc
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# app/ modules import each other as top-level packages (from config import Config). Appended,
+# not prepended like gunicorn's `pythonpath` would, so "app" still resolves to the package.
+sys.path.append(os.path.join(ROOT, "app"))
+
+wsgi_app = "app.app:app"
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# threads let concurrent requests of one worker share embedding batches
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_model = os.getenv("GUNICORN_PRELOAD_MODEL", "true").lower() == "true"
+
+# read by Config in every worker
+os.environ.setdefault("TORCH_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+os.environ.setdefault("EMBED_WARMUP", "true")
+
+def on_starting(server):
+    if not preload_model:
+        return
+    import torch
+    from config import Config
+    from engine.backends import preload_backend
+    # single-threaded in the master: no intra-op thread pool exists when the workers fork
+    torch.set_num_threads(1)
+    t0 = time.perf_counter()
+    model = preload_backend(Config.EMBED_BACKEND, Config.MODEL_NAME, device=Config.DEVICE,
+                            onnx_dir=Config.ONNX_MODEL_DIR)
+    if model is None:
+        server.log.info("backend %s is loaded per worker", Config.EMBED_BACKEND)
+        return
+    # keep the collector from touching (and so un-sharing) the pages of preloaded objects
+    gc.collect()
+    gc.freeze()
+    server.log.info("preloaded %s (%s) in %.1fs", Config.MODEL_NAME, Config.EMBED_BACKEND, time.perf_counter() - t0)
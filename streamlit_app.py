@@ -16,7 +16,11 @@ if APP_DIR not in sys.path:
 
 from config import Config
 from engine.scorer import HybridScorer
-from engine.explain import highlight_similar_regions
+from engine.explain import highlight_documents
+from engine.cache import cache_from_config
+from engine.preprocess import language_for
+from engine.result_cache import pair_key, result_cache_from_config, scorer_fingerprint
+from engine.similarity import BlockedSimilarity
 
 
 # ----- Helpers
@@ -46,7 +50,41 @@ def load_scorer() -> HybridScorer:
     model_name = get_env_or_secret("MODEL_NAME", Config.MODEL_NAME)
     device = get_env_or_secret("DEVICE", Config.DEVICE)
     topk = int(get_env_or_secret("TOPK_CHUNK_MATCHES", str(Config.TOPK_CHUNK_MATCHES)))
-    return HybridScorer(model_name, device=device, topk_matches=topk)
+    similarity = BlockedSimilarity(k=1, max_block_bytes=Config.SIM_BLOCK_MB * 1024 * 1024,
+                                   heatmap_size=Config.HEATMAP_SIZE)
+    return HybridScorer(model_name, device=device, topk_matches=topk, cache=cache_from_config(Config),
+                        similarity=similarity, mutual_matches=Config.CHUNK_MATCH_MUTUAL)
+
+
+@st.cache_resource(show_spinner=False)
+def load_result_cache():
+    # reruns and repeated uploads of the same pair are answered from here (RESULT_CACHE_PATH="" disables it)
+    return result_cache_from_config(Config)
+
+
+def compare_sources(scorer: HybridScorer, code1: str, name1: str, code2: str, name2: str) -> Dict:
+    """Scores, chunk matches, heatmap and spans for a pair, from the result cache when possible."""
+    results = load_result_cache()
+    fingerprint = scorer_fingerprint(scorer, span_min_tokens=Config.SPAN_MIN_TOKENS,
+                                     span_max_seconds=Config.SPAN_MAX_SECONDS)
+    key = pair_key(code1, code2, fingerprint, language_for(name1), language_for(name2))
+    cached = results.get(key) if results is not None else None
+    if cached is not None:
+        return cached
+    doc1, doc2 = scorer.prepare(code1, name1), scorer.prepare(code2, name2)
+    report = scorer.score_documents(doc1, doc2)
+    spans = highlight_documents(doc1, doc2, min_match=Config.SPAN_MIN_TOKENS,
+                                max_seconds=Config.SPAN_MAX_SECONDS)
+    result = {
+        "ensemble_score": report["ensemble_score"],
+        "components": report["components"],
+        "chunk_matches": report["chunks"]["topk_matches"],
+        "heatmap": report["chunks"]["heatmap"],
+        "spans": spans["spans"],
+    }
+    if results is not None:
+        results.put(key, result)
+    return result
 
 
 def to_percent(x: float) -> float:
@@ -92,8 +130,9 @@ def _build_marks(code: str, ranges: List[Tuple[int, int]]) -> str:
 
 def render_highlights(code1: str, code2: str, spans_obj: Dict) -> Tuple[str, str]:
     """
-    Convert spans from highlight_similar_regions() into HTML for both sides.
+    Convert spans from highlight_documents() into HTML for both sides.
     We accept either:
+      - {'spans': [{'a_start': s, 'a_end': e, 'b_start': s, 'b_end': e}, ...]}
       - {'spans': [{'a': [s,e], 'b': [s,e]}, ...]}
       - or {'spans1': [[s,e],...], 'spans2': [[s,e],...]}
     """
@@ -111,11 +150,11 @@ def render_highlights(code1: str, code2: str, spans_obj: Dict) -> Tuple[str, str
     else:
         # Pairs with 'a' and 'b'
         for item in spans_list:
-            a = item.get("a")
-            b = item.get("b")
-            if a and len(a) == 2:
+            a = item.get("a") or (item.get("a_start"), item.get("a_end"))
+            b = item.get("b") or (item.get("b_start"), item.get("b_end"))
+            if a and len(a) == 2 and a[0] is not None:
                 a_ranges.append((int(a[0]), int(a[1])))
-            if b and len(b) == 2:
+            if b and len(b) == 2 and b[0] is not None:
                 b_ranges.append((int(b[0]), int(b[1])))
 
     html1 = _build_marks(code1, a_ranges)
@@ -123,6 +162,17 @@ def render_highlights(code1: str, code2: str, spans_obj: Dict) -> Tuple[str, str
     return html1, html2
 
 
+def render_heatmap(heatmap: Dict) -> str:
+    """Heatmap cells as a table, red intensity = highest cosine in the cell."""
+    rows = []
+    for row in heatmap["values"]:
+        cells = "".join(
+            f'<td title="{v * 100:.1f}%" style="width:14px;height:14px;'
+            f'background-color:rgba(220,38,38,{max(v, 0.0):.3f})"></td>' for v in row)
+        rows.append(f"<tr>{cells}</tr>")
+    return f'<table style="border-collapse:collapse">{"".join(rows)}</table>'
+
+
 # ----- UI
 
 st.set_page_config(page_title="Source Code Plagiarism Inspection", layout="wide")
@@ -163,13 +213,11 @@ if compare_btn:
     code2 = f2.read().decode("utf-8", errors="ignore")
 
     with st.spinner("Loading model and computing scores..."):
-        scorer = load_scorer()
-        report = scorer.score(code1, code2)
-        spans = highlight_similar_regions(code1, code2)
+        result = compare_sources(load_scorer(), code1, f1.name, code2, f2.name)
 
-    ensemble = float(report.get("ensemble_score", 0.0))
-    components = report.get("components", {})
-    chunk_matches = report.get("chunks", {}).get("topk_matches", [])
+    ensemble = float(result.get("ensemble_score", 0.0))
+    components = result.get("components", {})
+    chunk_matches = result.get("chunk_matches", [])
     suspicious = ensemble >= (sim_threshold_ui / 100.0)
 
     # --- Summary header
@@ -202,9 +250,17 @@ if compare_btn:
             })
         st.dataframe(rows, use_container_width=True)
 
+    # --- Chunk heatmap
+    heatmap = result.get("heatmap")
+    if heatmap:
+        st.write("**Chunk similarity heatmap**")
+        st.caption(f"Rows: {heatmap['chunks_a']} chunks of File A, columns: {heatmap['chunks_b']} chunks of File B "
+                   "(highest cosine per cell).")
+        st.components.v1.html(render_heatmap(heatmap), height=16 * heatmap["rows"] + 20)
+
     # --- Highlighted code
     st.subheader("Highlighted overlaps")
-    html1, html2 = render_highlights(code1, code2, spans)
+    html1, html2 = render_highlights(code1, code2, result)
 
     c1, c2 = st.columns(2)
     with c1:
@@ -0,0 +1,42 @@
+import os
+import pytest
+
+VOCAB = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + \
+    list("abcdefghijklmnopqrstuvwxyz0123456789()[]{}:;+-*/=<>,._\"'") + \
+    ["def", "return", "if", "for", "while", "class", "STR", "NUM"]
+
+@pytest.fixture(scope="session")
+def tiny_model(tmp_path_factory):
+    # small random BERT saved as a SentenceTransformer, so tests never hit the network
+    import torch
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+    from sentence_transformers import SentenceTransformer, models
+    d = str(tmp_path_factory.mktemp("tiny_model"))
+    vocab_file = os.path.join(d, "vocab.txt")
+    with open(vocab_file, "w") as f:
+        f.write("\n".join(VOCAB))
+    torch.manual_seed(0)
+    cfg = BertConfig(vocab_size=len(VOCAB), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                     intermediate_size=64, max_position_embeddings=256)
+    BertModel(cfg).save_pretrained(d)
+    BertTokenizerFast(vocab_file=vocab_file).save_pretrained(d)
+    t = models.Transformer(d, max_seq_length=128)
+    p = models.Pooling(cfg.hidden_size, "mean")
+    out = os.path.join(d, "st")
+    SentenceTransformer(modules=[t, p], device="cpu").save(out)
+    return out
+
+@pytest.fixture
+def web_app(tiny_model, tmp_path, monkeypatch):
+    # the web layer imports modules from app/ as top-level packages, like app.app does
+    app_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+    monkeypatch.syspath_prepend(app_dir)
+    from config import Config
+    monkeypatch.setattr(Config, "MODEL_NAME", tiny_model)
+    monkeypatch.setattr(Config, "EMBED_CACHE_PATH", "")
+    monkeypatch.setattr(Config, "RESULT_CACHE_PATH", str(tmp_path / "results.sqlite3"))
+    monkeypatch.setattr(Config, "JOB_DB_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(Config, "VECTOR_INDEX_PATH", str(tmp_path / "vectors.sqlite3"))
+    monkeypatch.setattr(Config, "FP_INDEX_DIR", str(tmp_path / "fpindex"))
+    from web import create_app
+    return create_app()
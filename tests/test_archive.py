@@ -0,0 +1,64 @@
+import io
+import json
+import tarfile
+import zipfile
+import pytest
+from app.engine.archive import ArchiveTooLarge, open_archive
+
+FILES = {"class/alice/sol.py": b"def f(x):\n    return x * 2\n", "class/bob/sol.py": b"def g(y):\n    return y * 2\n",
+         "class/bob/notes.md": b"# notes\n", "class/.git/config.py": b"x = 1\n", "class/carol/huge.py": b"#" * 500}
+
+def tarball(mode="w:gz"):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode=mode) as tf:
+        for name, data in FILES.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+def zipped():
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in FILES.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+class OneWay(io.RawIOBase):
+    """Non-seekable stream, like a WSGI request body."""
+
+    def __init__(self, data):
+        self.buf = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self.buf.readinto(b)
+
+@pytest.mark.parametrize("data", [tarball(), tarball("w"), zipped()], ids=["tar.gz", "tar", "zip"])
+def test_members_filtered_and_capped(data):
+    members = list(open_archive(OneWay(data), {".py"}, max_bytes=100, max_files=1))
+    assert [(m.name, m.skipped) for m in members] == [
+        ("class/alice/sol.py", None), ("class/bob/sol.py", "max_files"), ("class/carol/huge.py", "too_large")]
+    assert members[0].code.startswith("def f")
+
+def test_invalid_and_oversized_archives():
+    with pytest.raises(ValueError):
+        open_archive(io.BytesIO(b"not an archive at all"), {".py"}, max_bytes=100)
+    with pytest.raises(ArchiveTooLarge):
+        open_archive(io.BytesIO(zipped()), {".py"}, max_bytes=100, max_archive_bytes=64)
+
+def test_batch_api_streams_ndjson(web_app):
+    client = web_app.test_client()
+    resp = client.post("/api/batch?min_overlap=0", data=tarball(), content_type="application/gzip")
+    assert resp.status_code == 200 and resp.mimetype == "application/x-ndjson"
+    events = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert [e["file"] for e in events if e["type"] == "file"] == [
+        "class/alice/sol.py", "class/bob/sol.py", "class/carol/huge.py"]
+    summary = events[-1]
+    assert summary["type"] == "summary" and summary["files"] == 3 and summary["skipped"] == 0
+    multipart = client.post("/api/batch", data={"archive": (io.BytesIO(zipped()), "class.zip")},
+                            content_type="multipart/form-data")
+    assert json.loads(multipart.get_data(as_text=True).splitlines()[-1])["files"] == 3
+    assert client.post("/api/batch", data=b"garbage", content_type="application/zip").status_code == 400
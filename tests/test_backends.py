@@ -0,0 +1,70 @@
+import time
+import numpy as np
+import pytest
+import torch
+from app.engine.backends import OnnxBackend, parity_report
+from app.engine.embeddings import Embedder
+
+TEXTS = ["def add ( a , b ) : return a + b", "for i in range ( NUM ) : print ( i )", "x = STR"]
+
+def test_model_loads_lazily(tiny_model):
+    emb = Embedder(tiny_model)
+    assert not emb.loaded and emb.load_seconds is None
+    out = emb.encode(TEXTS)
+    assert emb.loaded and emb.load_seconds > 0
+    assert isinstance(out, torch.Tensor) and out.shape[0] == len(TEXTS)
+
+def test_unknown_backend_rejected(tiny_model):
+    with pytest.raises(ValueError):
+        Embedder(tiny_model, backend="tensorrt")
+
+def test_int8_cache_entries_are_separate(tiny_model):
+    assert Embedder(tiny_model).cache_namespace != Embedder(tiny_model, backend="torch-int8").cache_namespace
+
+def test_onnx_backends_match_torch(tiny_model, tmp_path):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnx")
+    report = parity_report(tiny_model, TEXTS, backends=["torch", "torch-int8", "onnx", "onnx-int8"],
+                           onnx_dir=str(tmp_path / "onnx"))
+    drift = report["backends"]
+    assert drift["torch"]["min_cosine"] == pytest.approx(1.0, abs=1e-6)
+    assert drift["onnx"]["min_cosine"] > 0.9999
+    assert drift["torch-int8"]["min_cosine"] > 0.95 and drift["onnx-int8"]["min_cosine"] > 0.95
+    # a second load reuses the exported graph instead of exporting again
+    backend = OnnxBackend(tiny_model, model_dir=str(tmp_path / "onnx"))
+    ref = Embedder(tiny_model).encode(TEXTS).numpy()
+    assert np.allclose(backend.encode(TEXTS), ref, atol=1e-4)
+
+def test_onnx_export_rejects_extra_modules(tiny_model, tmp_path):
+    import os
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Dense
+    from app.engine.backends import export_onnx
+    st = SentenceTransformer(tiny_model, device="cpu")
+    st.append(Dense(st.get_sentence_embedding_dimension(), 8))  # a projection the graph would drop
+    st.save(str(tmp_path / "dense"))
+    with pytest.raises(ValueError, match="Dense"):
+        export_onnx(str(tmp_path / "dense"), str(tmp_path / "onnx"))
+    assert not os.path.exists(tmp_path / "onnx" / "model.onnx")
+
+def test_preloaded_backend_is_shared(tiny_model, monkeypatch):
+    from app.engine import backends
+    monkeypatch.setattr(backends, "_PRELOADED", {})
+    model = backends.preload_backend("torch", tiny_model)
+    assert backends.is_preloaded("torch", tiny_model) and not backends.is_preloaded("torch-int8", tiny_model)
+    assert Embedder(tiny_model).model is model
+    assert backends.preload_backend("onnx", tiny_model) is None
+
+def test_readiness_probe(web_app):
+    client = web_app.test_client()
+    assert client.get("/healthz").get_json()["status"] == "ok"
+    first = client.get("/readyz")
+    assert first.status_code in (200, 503)  # the first probe starts the warm-up
+    for _ in range(600):
+        resp = client.get("/readyz")
+        if resp.status_code == 200:
+            break
+        time.sleep(0.05)
+    body = resp.get_json()
+    assert resp.status_code == 200 and body["ready"] and body["warmup_seconds"] is not None
+    assert body["model_preloaded"] is False
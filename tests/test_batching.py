@@ -0,0 +1,28 @@
+import threading
+import torch
+from app.engine.batching import BatchingEmbedder
+from app.engine.embeddings import Embedder
+
+def test_concurrent_calls_share_batches(tiny_model):
+    inner = Embedder(tiny_model)
+    calls = []
+    encode = inner.encode
+    inner.encode = lambda texts: calls.append(len(texts)) or encode(texts)
+    batcher = BatchingEmbedder(inner, max_batch=64, max_wait_ms=50)
+    inputs = [[f"x = {i}", "return NUM", f"y = {i} + {i}"] for i in range(8)]
+    out = [None] * len(inputs)
+
+    def worker(k):
+        out[k] = batcher.encode(inputs[k])
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(len(inputs))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for k, texts in enumerate(inputs):
+        assert torch.allclose(out[k], encode(texts), atol=1e-5)
+    stats = batcher.stats()
+    assert stats["requests"] == 8 and stats["batches"] < 8
+    assert sum(calls) == stats["texts"] < 8 * 3  # "return NUM" embedded once per batch
+    assert batcher.model_name == tiny_model
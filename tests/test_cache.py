@@ -0,0 +1,50 @@
+import sqlite3
+from types import SimpleNamespace
+import numpy as np
+import torch
+from app.engine.cache import EmbeddingCache, cache_from_config, content_key
+from app.engine.embeddings import Embedder
+
+def test_cache_lru_eviction(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite3"), max_bytes=3 * 4 * 4)  # three 4-d float32 vectors
+    for i in range(3):
+        cache.put_many({f"k{i}": np.full(4, i, dtype=np.float32)})
+    cache.get_many(["k0"])  # k0 becomes most recently used
+    cache.put_many({"k3": np.zeros(4, dtype=np.float32)})
+    found = cache.get_many(["k0", "k1", "k2", "k3"])
+    assert "k0" in found and "k3" in found and "k1" not in found
+    assert cache.stats()["evictions"] >= 1
+
+def test_cache_size_total_and_batched_touches(tmp_path):
+    path = str(tmp_path / "emb.sqlite3")
+    cache = EmbeddingCache(path, max_bytes=10 * 4 * 4)
+    cache.put_many({f"k{i}": np.zeros(4, dtype=np.float32) for i in range(8)})
+    cache.put_many({"k0": np.zeros(8, dtype=np.float32)})  # replaced with a larger vector
+    stored = sqlite3.connect(path).execute("SELECT SUM(nbytes) FROM embeddings").fetchone()[0]
+    assert cache.stats()["bytes"] == stored == 9 * 4 * 4
+    before = sqlite3.connect(path).execute("SELECT last_access FROM embeddings WHERE key='k1'").fetchone()
+    cache.get_many(["k1"])  # a hit does not write ...
+    assert sqlite3.connect(path).execute("SELECT last_access FROM embeddings WHERE key='k1'").fetchone() == before
+    cache.put_many({f"n{i}": np.zeros(4, dtype=np.float32) for i in range(3)})  # ... until the next put
+    assert "k1" in cache.get_many(["k1"]) and "k2" not in cache.get_many(["k2"])
+    stored = sqlite3.connect(path).execute("SELECT SUM(nbytes) FROM embeddings").fetchone()[0]
+    assert cache.stats()["bytes"] == stored <= 10 * 4 * 4
+
+def test_empty_cache_path_disables_every_backend(tmp_path):
+    for backend in ("sqlite", "mmap"):
+        config = SimpleNamespace(EMBED_CACHE_PATH="", EMBED_CACHE_BACKEND=backend, EMBED_CACHE_MAX_MB=1,
+                                 EMBED_STORE_DIR=str(tmp_path / "store"), EMBED_STORE_DTYPE="float16")
+        assert cache_from_config(config) is None
+    assert not (tmp_path / "store").exists()
+
+def test_embedder_cache_hits(tmp_path, tiny_model):
+    texts = ["def add ( a , b ) : return a + b", "x = NUM"]
+    plain = Embedder(tiny_model).encode(texts)
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite3"))
+    emb = Embedder(tiny_model, cache=cache)
+    first = emb.encode(texts)
+    second = emb.encode(texts + texts[:1])
+    assert torch.allclose(first, plain, atol=1e-5)
+    assert torch.allclose(second[:2], first)
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 2
+    assert content_key(texts[0], tiny_model) != content_key(texts[0], "other-model")
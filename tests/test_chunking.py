@@ -0,0 +1,49 @@
+from app.engine.cache import EmbeddingCache
+from app.engine.chunking import chunk_document
+from app.engine.document import prepare_document
+from app.engine.scorer import HybridScorer
+
+PY = "\n\n".join(f"def f{i}(x, y):\n    total = x * {i} + y\n    for k in range(y):\n"
+                 f"        total += k\n    return total\n" for i in range(12))
+
+def test_python_chunks_follow_functions():
+    doc = prepare_document(PY, "a.py")
+    chunks = chunk_document(doc, max_tokens=40, min_tokens=8)
+    assert len(chunks) == 12 and all(c.kind == "function" for c in chunks)
+    for i, c in enumerate(chunks):
+        assert PY[c.start:c.end].startswith(f"def f{i}(") and PY[c.start:c.end].endswith("return total")
+
+def test_brace_chunks_split_large_class_into_methods():
+    js = "class Stack {\n" + "".join(f"  m{i}(x) {{ if (x > {i}) {{ return x; }} return {i}; }}\n"
+                                     for i in range(10)) + "}\nfunction top(s) { return s.m1(1); }\n"
+    chunks = chunk_document(prepare_document(js, "a.js"), max_tokens=40, min_tokens=4)
+    assert len(chunks) > 2
+    # no chunk cuts a method in half
+    for i in range(10):
+        start = js.index(f"  m{i}(") + 2
+        end = js.index("\n", start)
+        assert any(c.start <= start and end <= c.end for c in chunks)
+
+def test_edit_changes_only_its_chunk():
+    edited = PY.replace("total = x * 5 + y", "total = x * 5 - y * y")
+    before = chunk_document(prepare_document(PY, "a.py"), max_tokens=40, min_tokens=8)
+    after = chunk_document(prepare_document(edited, "a.py"), max_tokens=40, min_tokens=8)
+    changed = [i for i, (a, b) in enumerate(zip(before, after)) if a.key != b.key]
+    assert changed == [5]
+
+def test_resubmission_reembeds_changed_chunks(tmp_path, tiny_model):
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite3"))
+    s = HybridScorer(tiny_model, cache=cache, chunk_tokens=40)
+    base = "x = 1\n"
+    s.score(PY, base, "a.py", "b.py")
+    misses = cache.stats()["misses"]
+    report = s.score(PY.replace("total = x * 5 + y", "total = x * 5 - y * y"), base, "a.py", "b.py")
+    assert cache.stats()["misses"] - misses == 2  # the whole file and the edited function
+    m = report["chunks"]["topk_matches"][0]
+    assert 0 <= m["a_start"] < m["a_end"] and len(report["chunks"]["a_spans"]) == 12
+
+def test_deep_nesting_is_not_recursed_into():
+    for code, name in [("{" * 3000 + "}" * 3000, "a.c"),
+                       ("".join(" " * i + f"x{i}\n" for i in range(3000)), "a.txt")]:
+        chunks = chunk_document(prepare_document(code, name), max_tokens=64, min_tokens=8)
+        assert chunks[0].start == 0 and chunks[-1].end == len(code.rstrip())
@@ -0,0 +1,24 @@
+from app.engine.clusters import UnionFind, cluster_pairs
+
+def pair(a, b, score, matches=()):
+    return {"file_a": a, "file_b": b, "ensemble_score": score,
+            "chunk_matches": [{"chunk1_idx": i, "chunk2_idx": i, "score": s} for i, s in enumerate(matches)]}
+
+def test_union_find_merges_by_size():
+    uf = UnionFind()
+    for a, b in [(1, 2), (3, 4), (2, 4), (5, 6)]:
+        uf.union(a, b)
+    assert uf.find(1) == uf.find(3) != uf.find(5)
+    assert uf.size[uf.find(1)] == 4
+
+def test_cluster_pairs_finds_rings():
+    pairs = [pair("a", "b", 0.95, [0.99, 0.7]), pair("b", "c", 0.85, [0.9]), pair("a", "c", 0.82),
+             pair("d", "e", 0.9, [0.95]), pair("c", "d", 0.5), pair("f", "g", 0.3)]
+    clusters = cluster_pairs(pairs, threshold=0.8, top_edges=2, top_matches=2)
+    assert [c["files"] for c in clusters] == [["a", "b", "c"], ["d", "e"]]
+    ring = clusters[0]
+    assert ring["cluster_id"] == 0 and ring["edges"] == 3 and ring["density"] == 1.0
+    assert [(e["file_a"], e["file_b"]) for e in ring["strongest_edges"]] == [("a", "b"), ("b", "c")]
+    assert [m["score"] for m in ring["chunk_matches"]] == [0.99, 0.9]
+    assert ring["chunk_matches"][0]["file_a"] == "a"
+    assert [c["files"] for c in cluster_pairs(pairs, threshold=0.8, min_size=3)] == [["a", "b", "c"]]
@@ -0,0 +1,52 @@
+import io
+import sqlite3
+
+A = "".join(f"def f{i}(x):\n    total = x + {i}\n    return total * 2\n\n" for i in range(40))
+B = A.replace("total", "acc")
+
+def post(client, query="", **headers):
+    files = {"file1": (io.BytesIO(A.encode()), "a.py"), "file2": (io.BytesIO(B.encode()), "b.py")}
+    return client.post("/api/compare" + query, data=files, content_type="multipart/form-data", headers=headers)
+
+def test_score_only_then_lazy_spans(web_app):
+    client = web_app.test_client()
+    body = post(client, "?detail=score").get_json()
+    assert set(body) == {"comparison_id", "threshold", "ensemble_score", "components", "stages", "early_exit"}
+    assert "explain" not in client.get("/metrics").get_data(as_text=True)
+    cid = body["comparison_id"]
+    first = client.get(f"/api/comparisons/{cid}/spans?limit=1").get_json()
+    assert first["total"] >= 1 and len(first["spans"]) == 1 and first["spans"][0]["text"]
+    rest = client.get(f"/api/comparisons/{cid}/spans?offset=1").get_json()
+    assert len(rest["spans"]) == first["total"] - 1
+    source = client.get(f"/api/comparisons/{cid}/source/b?offset=2&limit=3").get_json()
+    assert source["lines"] == B.splitlines(keepends=True)[2:5] and source["char_offset"] == len("".join(B.splitlines(keepends=True)[:2]))
+    assert client.get(f"/api/comparisons/{cid}/heatmap").get_json()["heatmap"] is not None
+    assert client.get(f"/api/comparisons/{'0' * 64}/spans").status_code == 404
+    assert client.get(f"/api/comparisons/{cid}/source/c").status_code == 404
+
+def test_evicted_sources_come_back_with_the_scores(web_app):
+    client = web_app.test_client()
+    cid = post(client, "?detail=score").get_json()["comparison_id"]
+    from config import Config
+    with sqlite3.connect(Config.RESULT_CACHE_PATH) as c:
+        c.execute("DELETE FROM results WHERE key=?", (cid + ":sources",))  # as if evicted alone
+    assert client.get(f"/api/comparisons/{cid}/source/a").status_code == 404
+    assert post(client, "?detail=score").get_json()["comparison_id"] == cid  # scores from the cache
+    assert client.get(f"/api/comparisons/{cid}/source/a").get_json()["lines"] == A.splitlines(keepends=True)[:200]
+
+def test_summary_is_bounded_and_full_is_compatible(web_app):
+    client = web_app.test_client()
+    summary = post(client, "?detail=summary")
+    body = summary.get_json()
+    assert "heatmap" not in body and all("text" not in s for s in body["spans"])
+    assert body["spans_total"] >= len(body["spans"]) and body["links"]["spans"].endswith("/spans")
+    full = post(client, "?detail=full")
+    assert full.headers["ETag"] != summary.headers["ETag"]
+    assert {"chunk_matches", "heatmap", "spans"} <= set(full.get_json()) and full.get_json()["spans"][0]["text"]
+    assert post(client, "?detail=everything").status_code == 400
+
+def test_result_page_loads_details_lazily(web_app):
+    client = web_app.test_client()
+    files = {"file1": (io.BytesIO(A.encode()), "a.py"), "file2": (io.BytesIO(B.encode()), "b.py")}
+    html = client.post("/compare", data=files, content_type="multipart/form-data").get_data(as_text=True)
+    assert "def f39" not in html and "/api/comparisons/" in html
@@ -0,0 +1,59 @@
+from app.engine.archive import Member
+from app.engine.corpus import candidate_pairs, load_corpus, scan_corpus, scan_stream
+from app.engine.document import prepare_document
+from app.engine.scorer import HybridScorer
+
+FACT = """
+def factorial(n):
+    if n <= 1:
+        return 1
+    return n * factorial(n - 1)
+"""
+UNRELATED = """
+class Stack:
+    def __init__(self):
+        self.items = []
+    def push(self, item):
+        self.items.append(item)
+"""
+
+def test_candidate_pairs_prunes_unrelated():
+    docs = [prepare_document(c, name=str(i)) for i, c in enumerate([FACT, FACT, UNRELATED])]
+    pairs = candidate_pairs(docs, min_overlap=0.1)
+    assert [(i, j) for i, j, _ in pairs] == [(0, 1)]
+    assert pairs[0][2] == 1.0
+
+def test_small_ring_is_not_pruned_as_boilerplate(tiny_model):
+    # three identical files of four: their hashes are in 75% of the files, above max_df
+    codes = [FACT, FACT, FACT, UNRELATED]
+    docs = [prepare_document(c, name=str(i)) for i, c in enumerate(codes)]
+    assert sorted((i, j) for i, j, _ in candidate_pairs(docs, min_overlap=0.1, max_df=0.5)) == [(0, 1), (0, 2), (1, 2)]
+    events = scan_stream((Member(str(i), c) for i, c in enumerate(codes)), HybridScorer(tiny_model),
+                         min_overlap=0.1, threshold=0.0, max_df=0.5)
+    assert sorted((e["file_a"], e["file_b"]) for e in events if e["type"] == "pair") == \
+        [("0", "1"), ("0", "2"), ("1", "2")]
+
+def test_scan_corpus_counts(tmp_path, tiny_model):
+    for name, code in [("a.py", FACT), ("b.py", FACT), ("c.py", UNRELATED), ("notes.md", FACT)]:
+        (tmp_path / name).write_text(code)
+    docs = load_corpus(str(tmp_path), {".py"})
+    assert [d.name for d in docs] == ["a.py", "b.py", "c.py"]
+    result = scan_corpus(docs, HybridScorer(tiny_model), min_overlap=0.1)
+    assert result["pairs_total"] == 3
+    assert result["pairs_scored"] + result["pairs_pruned"] == 3
+    assert result["pairs"][0]["file_a"] == "a.py" and result["pairs"][0]["file_b"] == "b.py"
+
+def test_scan_stream_matches_scan_corpus(tiny_model):
+    scorer = HybridScorer(tiny_model)
+    files = [("a.py", FACT), ("c.py", UNRELATED), ("big.py", None), ("b.py", FACT)]
+    events = list(scan_stream((Member(n, c, None if c else "too_large") for n, c in files), scorer,
+                              min_overlap=0.1, threshold=0.0))
+    assert [e["type"] for e in events[:3]] == ["file", "file", "skipped"]
+    summary = events[-1]
+    assert summary["type"] == "summary" and summary["files"] == 3 and summary["skipped"] == 1
+    docs = [scorer.prepare(c, n) for n, c in files if c]
+    batch = scan_corpus(docs, scorer, min_overlap=0.1, threshold=0.0)
+    assert summary["pairs_scored"] == batch["pairs_scored"]
+    assert {(p["file_a"], p["file_b"]) for p in summary["pairs"]} == {(p["file_a"], p["file_b"]) for p in batch["pairs"]}
+    # pairs are reported as soon as their second file arrived
+    assert events.index(next(e for e in events if e["type"] == "pair")) == len(events) - 2
@@ -0,0 +1,33 @@
+import pytest
+from app.engine.align import greedy_tiles
+from app.engine.explain import highlight_similar_regions
+
+A = '''def factorial(n):
+    # compute n!
+    if n <= 1:
+        return 1
+    return n * factorial(n - 1)
+'''
+B = '''def fact(num):
+    if num <= 1:
+        return 1
+    return num * fact(num - 1)
+'''
+
+def test_renamed_code_aligns_with_source_offsets():
+    res = highlight_similar_regions(A, B, name_a="a.py", name_b="b.py", min_match=10)
+    assert len(res["spans"]) == 1
+    s = res["spans"][0]
+    assert A[s["a_start"]:s["a_end"]].startswith("def factorial(n)")
+    assert B[s["b_start"]:s["b_end"]].endswith("fact(num - 1)")
+
+def test_threshold_is_deprecated():
+    with pytest.warns(DeprecationWarning, match="threshold"):
+        res = highlight_similar_regions(A, B, 0.8, "a.py", "b.py")
+    assert res == highlight_similar_regions(A, B, name_a="a.py", name_b="b.py")
+
+def test_min_match_and_tiling():
+    a = list("abcdefghij") + ["x"] + list("klmnop")
+    b = list("klmnop") + ["y"] + list("abcdefghij")
+    assert greedy_tiles(a, b, min_match=5)[0] == [(0, 7, 10), (11, 0, 6)]
+    assert greedy_tiles(a, b, min_match=8)[0] == [(0, 7, 10)]
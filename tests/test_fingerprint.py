@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+from app.engine.fingerprint import fingerprint_overlap, kgram_hashes, winnow, winnowing_fingerprints
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKS = "def f ( x ) : return x + NUM * g ( x , y ) - h ( y ) if x else y".split()
+
+def naive_winnow(hashes, window):
+    picked, last = [], None
+    for i in range(len(hashes) - window + 1):
+        w = hashes[i:i+window]
+        m = min(w)
+        pos = i + window - 1 - w[::-1].index(m)  # rightmost minimum
+        if pos != last:
+            picked.append(pos)
+            last = pos
+    return picked
+
+def test_winnow_matches_naive():
+    hashes = kgram_hashes(TOKS, 3)
+    for window in (1, 2, 4, 7):
+        assert winnow(hashes, window).tolist() == naive_winnow(hashes.tolist(), window)
+
+def test_winnow_keeps_the_minimum_of_a_short_input():
+    # fewer hashes than one window: one fingerprint (the rightmost minimum), not none
+    hashes = kgram_hashes(TOKS[:6], 3)
+    assert winnow(hashes, 7).tolist() == [len(hashes) - 1 - hashes.tolist()[::-1].index(min(hashes.tolist()))]
+    assert len(winnowing_fingerprints(TOKS[:6], k=3, window=7)) == 1
+
+def test_fingerprints_stable_across_processes():
+    code = ("from app.engine.fingerprint import winnowing_fingerprints;"
+            "print(sorted(winnowing_fingerprints('a b c d e f g h i j'.split())))")
+    outs = {subprocess.check_output([sys.executable, "-c", code], env={"PYTHONHASHSEED": seed}, cwd=ROOT)
+            for seed in ("1", "2")}
+    assert len(outs) == 1
+
+def test_overlap():
+    fp = winnowing_fingerprints(TOKS)
+    shifted = winnowing_fingerprints(["x", "=", "NUM"] + TOKS)
+    assert fingerprint_overlap(fp, fp) == 1.0
+    assert fingerprint_overlap(fp, shifted) > 0.5  # positions do not matter
+    assert fingerprint_overlap(fp, winnowing_fingerprints(TOKS[:2])) == 0.0
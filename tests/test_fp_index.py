@@ -0,0 +1,85 @@
+import io
+import pytest
+from app.engine.document import prepare_document
+from app.engine import fp_index
+from app.engine.fp_index import FingerprintIndex, UnknownNamespace
+
+STARTER = "def read_input():\n    data = open('input.txt').read().split()\n    return [int(x) for x in data]\n"
+SOLUTION = ("def solve(values):\n    best = 0\n    for i, v in enumerate(values):\n"
+            "        if v > best and i % 2 == 0:\n            best = v * 2 - i\n    return best\n")
+OTHER = "class Stack:\n    def __init__(self):\n        self.items = []\n    def push(self, x):\n        self.items.append(x)\n"
+
+def _doc(code, name):
+    return prepare_document(code, name)
+
+def test_query_ranks_by_shared_fingerprints(tmp_path):
+    index = FingerprintIndex(str(tmp_path), "hw1")
+    index.add_many([_doc(STARTER + SOLUTION, "2023/alice.py"), _doc(STARTER + OTHER, "2023/bob.py")])
+    query = _doc(STARTER + SOLUTION.replace("best", "top"), "new.py")
+    res = index.query(query.fingerprints)
+    assert [m["name"] for m in res["matches"]][:1] == ["2023/alice.py"]
+    assert res["matches"][0]["shared"] > dict((m["name"], m["shared"]) for m in res["matches"]).get("2023/bob.py", 0)
+    # namespaces are separate
+    assert FingerprintIndex(str(tmp_path), "hw2").query(query.fingerprints)["matches"] == []
+
+def test_base_code_is_excluded(tmp_path):
+    index = FingerprintIndex(str(tmp_path), "hw1")
+    index.add_many([_doc(STARTER + OTHER, "bob.py")])
+    query = _doc(STARTER + SOLUTION, "new.py")
+    assert index.query(query.fingerprints)["matches"]
+    index.add_base([_doc(STARTER, "starter.py")])
+    assert FingerprintIndex(str(tmp_path), "hw1").query(query.fingerprints)["matches"] == []
+
+def test_remove_replace_and_compact(tmp_path):
+    index = FingerprintIndex(str(tmp_path), "hw1", max_segments=100)
+    index.add_many([_doc(SOLUTION, "a.py")])
+    index.add_many([_doc(OTHER, "b.py")])
+    index.add_many([_doc(OTHER, "a.py")])  # replaces the earlier a.py
+    assert len(index) == 2 and index.stats()["tombstones"] == 1
+    assert index.query(_doc(SOLUTION, "q.py").fingerprints)["matches"] == []
+    before = index.query(_doc(OTHER, "q.py").fingerprints, with_positions=True)["matches"]
+    assert index.remove("b.py") and not index.remove("b.py")
+    assert index.compact() == 3
+    st = index.stats()
+    assert st["segments"] == 1 and st["tombstones"] == 0 and st["documents"] == 1
+    after = FingerprintIndex(str(tmp_path), "hw1").query(_doc(OTHER, "q.py").fingerprints, with_positions=True)
+    assert [m["name"] for m in after["matches"]] == ["a.py"]
+    assert after["matches"][0]["positions"] == next(m for m in before if m["name"] == "a.py")["positions"]
+
+def test_compacted_segments_outlive_old_readers(tmp_path, monkeypatch):
+    writer = FingerprintIndex(str(tmp_path), "hw1", max_segments=100)
+    writer.add_many([_doc(SOLUTION, "a.py")])
+    writer.add_many([_doc(OTHER, "b.py")])
+    reader = FingerprintIndex(str(tmp_path), "hw1")
+    query = _doc(SOLUTION, "q.py").fingerprints
+    assert reader.query(query)["matches"]
+    reader._segments.clear()  # a reader that read the manifest but has not mapped the segments yet
+    assert writer.compact() == 2
+    reader._refresh = lambda: None  # ... and does not see the new manifest before reading them
+    assert [m["name"] for m in reader.query(query)["matches"]] == ["a.py"]
+    monkeypatch.setattr(fp_index, "_RETIRE_SECONDS", 0.0)
+    writer.add_many([_doc(STARTER, "c.py")])  # the next write deletes the retired segments
+    assert sorted(f for f in (tmp_path / "hw1").iterdir() if f.suffix == ".npy") == \
+        sorted(tmp_path / "hw1" / s for s in writer._manifest["segments"])
+    # a reader that still misses the purged segments rereads the manifest and retries
+    stale = [True]
+    reader._refresh = lambda: stale.pop() if stale else FingerprintIndex._refresh(reader)
+    reader._segments.clear()
+    assert [m["name"] for m in reader.query(query)["matches"]] == ["a.py"] and not stale
+
+def test_invalid_namespace(tmp_path):
+    with pytest.raises(ValueError):
+        FingerprintIndex(str(tmp_path), "../etc")
+    with pytest.raises(UnknownNamespace):
+        FingerprintIndex(str(tmp_path), "hw9", create=False)
+    assert not (tmp_path / "hw9").exists()
+
+def test_api_fp_matches(web_app, tmp_path):
+    def post(namespace):
+        return web_app.test_client().post("/api/fp-matches", content_type="multipart/form-data",
+                                          data={"file": (io.BytesIO(SOLUTION.encode()), "q.py"), "namespace": namespace})
+    resp = post("hw1")
+    assert resp.status_code == 404 and not (tmp_path / "fpindex" / "hw1").exists()
+    FingerprintIndex(str(tmp_path / "fpindex"), "hw1").add_many([_doc(OTHER, "b.py")])
+    resp = post("hw1")
+    assert resp.status_code == 200 and resp.get_json()["matches"] == []
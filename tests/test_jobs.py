@@ -0,0 +1,90 @@
+import io
+import os
+import sqlite3
+import threading
+import time
+from app.jobs import JobManager, JobQueueFull
+
+def wait_for(jobs, job_id, statuses=("done", "failed", "cancelled"), timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = jobs.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} stuck in {job['status']}")
+
+def test_job_lifecycle_queue_limit_and_cancel(tmp_path):
+    gate = threading.Event()
+    jobs = JobManager(str(tmp_path / "jobs.sqlite3"), workers=1, max_queue=1)
+    first = jobs.submit(lambda: gate.wait(10) and {"ok": 1})
+    wait_for(jobs, first, statuses=("running",))
+    queued = jobs.submit(lambda: {"ok": 2})
+    try:
+        jobs.submit(lambda: {"ok": 3})
+        assert False, "queue limit not enforced"
+    except JobQueueFull:
+        pass
+    assert jobs.cancel(queued) == "cancelled"
+    gate.set()
+    assert wait_for(jobs, first)["result"] == {"ok": 1}
+    assert jobs.get(queued)["status"] == "cancelled"
+
+def test_job_failure_and_expiry(tmp_path):
+    jobs = JobManager(str(tmp_path / "jobs.sqlite3"), workers=1, result_ttl=0.0)
+    job_id = jobs.submit(lambda: 1 / 0)
+    time.sleep(0.2)
+    assert jobs.get(job_id) is None  # failed, then expired immediately
+
+def test_jobs_with_expired_leases_fail_on_start(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    JobManager(path, workers=0)
+    now = time.time()
+    # the lease, not the pid, decides: a pid that is alive again (reused) does not keep a job
+    with sqlite3.connect(path) as c:
+        c.executemany("INSERT INTO jobs(id, status, created, owner, lease) VALUES (?, ?, ?, ?, ?)",
+                      [("q", "queued", now, os.getpid(), now - 1), ("r", "running", now, os.getpid(), now - 1),
+                       ("old", "running", now, os.getpid(), None), ("live", "running", now, 1, now + 60)])
+    jobs = JobManager(path, workers=0, result_ttl=60.0)
+    assert jobs.get("q")["status"] == jobs.get("r")["status"] == jobs.get("old")["status"] == "failed"
+    assert "exited" in jobs.get("r")["error"] and jobs.get("r")["finished_at"] is not None
+    assert jobs.get("live")["status"] == "running"
+
+def test_running_jobs_keep_their_lease(tmp_path):
+    gate = threading.Event()
+    path = str(tmp_path / "jobs.sqlite3")
+    jobs = JobManager(path, workers=1, lease=0.3)
+    job_id = jobs.submit(lambda: gate.wait(10) and {"ok": 1})
+    wait_for(jobs, job_id, statuses=("running",))
+    time.sleep(1.0)  # several leases long: the heartbeat renews it
+    other = JobManager(path, workers=0, lease=0.3)  # e.g. another gunicorn worker polling
+    assert other.get(job_id)["status"] == "running"
+    gate.set()
+    assert wait_for(other, job_id)["result"] == {"ok": 1}
+
+def test_jobs_api(web_app):
+    client = web_app.test_client()
+    files = {"file1": (io.BytesIO(b"def add(a, b):\n    return a + b\n"), "a.py"),
+             "file2": (io.BytesIO(b"def add(x, y):\n    return x + y\n"), "b.py")}
+    resp = client.post("/api/jobs", data=files, content_type="multipart/form-data")
+    assert resp.status_code == 202
+    url = resp.get_json()["status_url"]
+    deadline = time.time() + 30
+    while (job := client.get(url).get_json())["status"] not in ("done", "failed"):
+        assert time.time() < deadline
+        time.sleep(0.05)
+    assert 0.0 <= job["result"]["ensemble_score"] <= 1.0 + 1e-6
+    assert client.get("/api/jobs/nope").status_code == 404
+
+def test_summary_job_finishes(web_app):
+    client = web_app.test_client()
+    files = {"file1": (io.BytesIO(b"def add(a, b):\n    return a + b\n"), "a.py"),
+             "file2": (io.BytesIO(b"def add(x, y):\n    return x + y\n"), "b.py")}
+    url = client.post("/api/jobs?detail=summary", data=files, content_type="multipart/form-data").get_json()["status_url"]
+    deadline = time.time() + 30
+    while (job := client.get(url).get_json())["status"] not in ("done", "failed"):
+        assert time.time() < deadline
+        time.sleep(0.05)
+    assert job["status"] == "done", job.get("error")
+    links = job["result"]["links"]
+    assert client.get(links["spans"]).status_code == 200
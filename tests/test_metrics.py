@@ -0,0 +1,44 @@
+import io
+import time
+from app.engine.metrics import NO_TIMINGS, Registry, SamplingProfiler, Timings
+
+def test_timings_accumulate_and_histograms_render():
+    t = Timings()
+    for n in (3, 4):
+        with t.stage("lex", bytes=n):
+            pass
+    t.sizes("lex", tokens=10)
+    rec = t.as_dict()["lex"]
+    assert rec["calls"] == 2 and rec["bytes"] == 7 and rec["tokens"] == 10
+    with NO_TIMINGS.stage("lex", bytes=1):
+        pass
+    assert NO_TIMINGS.stages == {}
+
+    reg = Registry()
+    reg.observe_timings(t)
+    reg.gauge("scpis_queue", "queue", lambda: 3)
+    text = reg.render()
+    assert 'scpis_stage_seconds_bucket{stage="lex",le="+Inf"} 1' in text
+    assert 'scpis_stage_seconds_count{stage="lex"} 1' in text
+    assert "scpis_queue 3" in text
+
+def test_sampling_profiler_sees_hot_function():
+    def spin():
+        end = time.perf_counter() + 0.1
+        while time.perf_counter() < end:
+            pass
+    with SamplingProfiler(interval=0.002) as prof:
+        spin()
+    assert prof.samples > 0 and "spin" in prof.top(1)[0]["frame"]
+
+def test_compare_timings_and_metrics_route(web_app):
+    client = web_app.test_client()
+    files = {"file1": (io.BytesIO(b"def add(a, b):\n    return a + b\n"), "a.py"),
+             "file2": (io.BytesIO(b"def add(x, y):\n    return x + y\n"), "b.py")}
+    body = client.post("/api/compare?timings=1", data=files, content_type="multipart/form-data").get_json()
+    assert {"lex", "winnow", "fingerprint", "embed", "explain"} <= set(body["timings"])
+    assert body["timings"]["lex"]["calls"] == 2 and "profile" not in body
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'scpis_stage_seconds_count{stage="embed"} 1' in text
+    assert 'scpis_request_seconds_count{endpoint="api_compare"} 1' in text
+    assert "scpis_model_loaded 1" in text
@@ -0,0 +1,43 @@
+from app.engine.preprocess import language_for, lex, normalize_code
+
+C_SRC = '''#include <stdio.h>
+/* block
+   comment */
+int main() { // trailing
+    int i = 10; i--;
+    printf("see http://example.com %d", i);
+}
+'''
+
+def test_c_lexing_keeps_code():
+    norm = normalize_code(C_SRC, "c")
+    assert norm.startswith("#include <stdio.h>")
+    assert "i--;" in norm
+    assert 'printf(STR, i);' in norm
+    assert "comment" not in norm and "trailing" not in norm
+
+def test_offsets_point_into_source():
+    toks = lex(C_SRC, "c")
+    for t in toks:
+        src = C_SRC[t.start:t.end]
+        assert src == t.text or (t.text == "STR" and src[0] == '"') or (t.text == "NUM" and src[0].isdigit())
+
+def test_python_strings_and_docstrings():
+    src = 'def f(x):\n    """Docs."""\n    s = r"raw" + """value"""  # note\n    return 0x1F\n'
+    toks, norm = lex(src, language_for("f.py")), normalize_code(src, "python")
+    assert toks.texts == ["def", "f", "(", "x", ")", ":", "s", "=", "STR", "+", "STR", "return", "NUM"]
+    assert src[toks.starts[8]:toks.ends[8]] == 'r"raw"'
+    assert "Docs" not in norm and "note" not in norm
+
+def test_normalized_text_keeps_the_layout():
+    # lines and single blank lines stay, indentation becomes one space, a removed comment separates like a space
+    assert normalize_code("int x = a/*b*/c;", "c") == "int x = a c;"
+    assert normalize_code("def f():\n    return 1\n", "python") == "def f():\n return NUM"
+    assert normalize_code("def f():\n\tx = 1\n\n\n    return x\n", "python") == "def f():\n x = NUM\n\n return x"
+    assert normalize_code("a = 1 # c\r\nb = 2", "python") == "a = NUM\nb = NUM"
+    toks = lex("if (a) {\n  // c\n  b(1);\n}\n", "c")
+    assert toks.text() == "if (a) {\n\n b(NUM);\n}" and toks.text(5, 10) == "b(NUM);"
+
+def test_language_for():
+    assert language_for("Main.JAVA") == "c"
+    assert language_for("notes.txt") == language_for(None) == "generic"
@@ -0,0 +1,71 @@
+import io
+import sqlite3
+import time
+from app.engine.result_cache import ResultCache, pair_key, scorer_fingerprint
+from app.engine.scorer import HybridScorer
+
+def test_get_put_ttl_and_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path / "r.sqlite3"), max_bytes=200, ttl=60)
+    cache.put("a", {"ensemble_score": 0.9, "spans": []})
+    assert cache.get("a") == {"ensemble_score": 0.9, "spans": []} and cache.get("b") is None
+    for i in range(10):
+        cache.put(f"k{i}", {"pad": "x" * 40})
+    assert cache.stats()["bytes"] <= 200 and cache.stats()["evictions"] > 0
+    cache.ttl = 0.01
+    time.sleep(0.02)
+    assert cache.get("k9") is None
+
+def test_reads_buffer_their_access_time(tmp_path):
+    path = str(tmp_path / "r.sqlite3")
+    cache = ResultCache(path, max_bytes=150, ttl=None)
+    cache.put("a", {"pad": "x" * 40})
+    cache.put("b", {"pad": "x" * 40})
+    stored = lambda k: sqlite3.connect(path).execute("SELECT last_access FROM results WHERE key=?", (k,)).fetchone()
+    before = stored("a")
+    assert cache.get("a") is not None and cache.touch("a") and not cache.touch("zzz")
+    assert stored("a") == before  # no write per read ...
+    cache.put("c", {"pad": "x" * 40})  # ... the next put writes it before evicting
+    assert stored("a") is not None and stored("b") is None
+
+def test_key_changes_with_sources_order_and_settings(tiny_model):
+    scorer = HybridScorer(tiny_model)
+    fp = scorer_fingerprint(scorer, span_min_tokens=10)
+    assert fp == scorer_fingerprint(HybridScorer(tiny_model), span_min_tokens=10)
+    assert fp != scorer_fingerprint(scorer, span_min_tokens=12)
+    assert fp != scorer_fingerprint(HybridScorer(tiny_model, chunk_tokens=64), span_min_tokens=10)
+    assert fp != scorer_fingerprint(HybridScorer(tiny_model, backend="torch-int8"), span_min_tokens=10)
+    assert pair_key("a", "b", fp, "python", "python") != pair_key("b", "a", fp, "python", "python")
+    assert pair_key("a", "b", fp, "python", "python") != pair_key("a", "b", fp, "c", "c")
+
+def test_compare_etag_and_cached_result(web_app):
+    client = web_app.test_client()
+
+    def post(**headers):
+        files = {"file1": (io.BytesIO(b"def add(a, b):\n    return a + b\n"), "a.py"),
+                 "file2": (io.BytesIO(b"def add(x, y):\n    return x + y\n"), "b.py")}
+        return client.post("/api/compare", data=files, content_type="multipart/form-data", headers=headers)
+
+    first = post()
+    etag = first.headers["ETag"]
+    again = post()
+    assert again.headers["ETag"] == etag and again.get_json() == first.get_json()
+    stats = client.get("/api/stats").get_json()["result_cache"]
+    assert (stats["hits"], stats["misses"]) == (1, 1)  # one lookup per comparison, not per entry
+    assert post(**{"If-None-Match": etag}).status_code == 304
+    assert post(**{"If-None-Match": '"stale"'}).status_code == 200
+    # only the first request ran the model
+    assert 'scpis_stage_seconds_count{stage="embed"} 1' in client.get("/metrics").get_data(as_text=True)
+
+def test_same_bytes_in_another_language_is_not_a_hit(web_app):
+    client = web_app.test_client()
+    code_a, code_b = b"int f(int a) { return a + 1; }\n", b"int g(int b) { return b + 1; }\n"
+
+    def post(ext, **headers):
+        files = {"file1": (io.BytesIO(code_a), "a" + ext), "file2": (io.BytesIO(code_b), "b" + ext)}
+        return client.post("/api/compare", data=files, content_type="multipart/form-data", headers=headers)
+
+    as_c = post(".c")
+    as_py = post(".py", **{"If-None-Match": as_c.headers["ETag"]})
+    assert as_py.status_code == 200 and as_py.headers["ETag"] != as_c.headers["ETag"]
+    assert as_py.get_json()["comparison_id"] != as_c.get_json()["comparison_id"]
+    assert client.get("/api/stats").get_json()["result_cache"]["hits"] == 0
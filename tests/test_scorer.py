@@ -0,0 +1,41 @@
+from app.engine.scorer import HybridScorer
+
+def test_score_encodes_once(tiny_model):
+    s = HybridScorer(tiny_model)
+    calls = []
+    encode = s.embedder.encode
+    s.embedder.encode = lambda texts: calls.append(list(texts)) or encode(texts)
+    code = "\n".join(f"def f{i}(x):\n    return x + {i}" for i in range(80))
+    report = s.score(code, code)
+    assert len(calls) == 1
+    assert len(calls[0]) == len(set(calls[0]))  # identical chunks of both files embedded once
+    assert len(report["chunks"]["a_spans"]) > 1 and "a" not in report["chunks"]
+    assert report["chunks"]["topk_matches"][0]["score"] > 0.99
+
+def test_cascade_exits_early_without_model(tiny_model):
+    from app.engine.scorer import Cascade
+    s = HybridScorer(tiny_model, cascade=Cascade())
+    s.embedder.encode = lambda texts: (_ for _ in ()).throw(AssertionError("model should not run"))
+    code = "def add(a, b):\n    total = a + b\n    return total * 2\n"
+    copy = s.score(code, code)
+    assert copy["early_exit"] == "copy" and copy["stages"] == ["fingerprint"]
+    other = s.score(code, "class Stack:\n    items = []\n")
+    assert other["early_exit"] == "unrelated" and other["stages"] == ["fingerprint", "tfidf"]
+    assert set(other["components"]) == {"tfidf_cos", "fp_overlap"}
+
+def test_early_exit_score_agrees_with_the_verdict(tiny_model):
+    from app.engine.scorer import Cascade
+    code = "def add(a, b):\n    total = a + b\n    return total * 2\n"
+    other = "class Stack:\n    items = []\n"
+    copy = HybridScorer(tiny_model, cascade=Cascade(fp_high=None, tfidf_low=None, tfidf_high=0.0)).score(code, other)
+    assert copy["early_exit"] == "copy" and copy["ensemble_score"] >= 0.8
+    unrelated = HybridScorer(tiny_model, cascade=Cascade(fp_low=1.1)).score(code, code)
+    assert unrelated["early_exit"] == "unrelated" and unrelated["ensemble_score"] < 0.8
+
+def test_result_page_marks_skipped_components(web_app):
+    from flask import render_template
+    with web_app.test_request_context():
+        html = render_template("result.html", suspicious=True, threshold=80, ensemble=90.0,
+                               components={"fp_overlap": 90.0}, chunk_matches=[], heatmap=None, spans=[],
+                               spans_total=0, links=None, code1="", code2="")
+    assert "TF-IDF Cosine: <strong>skipped (early exit)" in html and " %" not in html
@@ -0,0 +1,31 @@
+import numpy as np
+import torch
+from app.engine.embeddings import topk_embedding_matches
+from app.engine.similarity import BlockedSimilarity, chunk_matches, mutual_best
+
+def _dense(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return a @ b.T
+
+def test_tiled_topk_matches_dense():
+    rng = np.random.default_rng(0)
+    a = rng.standard_normal((120, 16)).astype(np.float32)
+    b = rng.standard_normal((70, 16)).astype(np.float32)
+    S = _dense(a, b)
+    sim = BlockedSimilarity(k=3, max_block_bytes=37 * 4, heatmap_size=8).compute(a, torch.from_numpy(b))
+    assert np.allclose(sim["row_scores"], -np.sort(-S, axis=1)[:, :3], atol=1e-5)
+    assert np.array_equal(sim["row_idx"][:, 0], S.argmax(axis=1))
+    assert np.array_equal(sim["col_idx"][:, 0], S.argmax(axis=0))
+    heat = sim["heatmap"]
+    assert heat.shape == (8, 8) and np.isclose(heat.max(), S.max())
+    assert np.isclose(heat[0, 0], S[:15, :9].max())
+
+def test_mutual_best_filter():
+    a = np.eye(3, dtype=np.float32)
+    b = np.array([[1, 0, 0], [0.9, 0.1, 0], [0, 0, 1]], dtype=np.float32)
+    sim = BlockedSimilarity(k=1).compute(a, b)
+    # row 1 (0,1,0) prefers b[1], but b[1] prefers row 0
+    assert mutual_best(sim).tolist() == [True, False, True]
+    assert [m["chunk1_idx"] for m in chunk_matches(sim, topk=5, mutual=True)] == [0, 2]
+    assert len(topk_embedding_matches(a, b, topk=5)) == 3
@@ -0,0 +1,62 @@
+import numpy as np
+import torch
+from app.engine.embeddings import Embedder, cosine, topk_chunk_matches
+from app.engine.store import EmbeddingStore
+
+def _vecs(n, d=8, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, d)).astype(np.float32)
+
+def test_readers_see_appends_without_copies(tmp_path):
+    writer = EmbeddingStore(str(tmp_path / "store"))
+    reader = EmbeddingStore(str(tmp_path / "store"))  # e.g. another gunicorn worker
+    v = _vecs(4)
+    writer.put_many({f"{i:064x}": v[i] for i in range(4)})
+    keys = [f"{i:064x}" for i in range(4)]
+    rows = reader.rows(keys[1:3])
+    assert rows.dtype == np.float16 and np.allclose(rows, v[1:3], atol=1e-2)
+    assert np.shares_memory(rows, reader._matrix)  # a view of the mapping, not a copy
+    assert set(reader.get_many(keys + ["f" * 64])) == set(keys)
+    writer.put_many({keys[2]: v[2], f"{9:064x}": v[0]})  # known keys are not stored twice
+    assert len(reader) == 5 and reader.stats()["entries"] == 5
+
+def test_torn_append_is_ignored_and_repaired(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "store"), dtype="float32")
+    v = _vecs(3)
+    store.put_many({f"{i:064x}": v[i] for i in range(2)})
+    with open(tmp_path / "store" / "vectors.bin", "ab") as f:
+        f.write(b"\x00" * 10)  # vectors written, crash before the index record
+    with open(tmp_path / "store" / "index.bin", "ab") as f:
+        f.write(b"\x01" * 7)  # half an index record
+    other = EmbeddingStore(str(tmp_path / "store"))
+    assert len(other) == 2
+    other.put_many({f"{2:064x}": v[2]})
+    assert np.array_equal(EmbeddingStore(str(tmp_path / "store")).rows([f"{2:064x}"])[0], v[2])
+
+def test_embedder_zero_copy_chunk_matches(tmp_path, tiny_model):
+    store = EmbeddingStore(str(tmp_path / "store"), dtype="float32")
+    emb = Embedder(tiny_model, cache=store)
+    plain = Embedder(tiny_model)
+    a = ["def add ( a , b ) :", "return a + b", "x = NUM"]
+    b = ["def sub ( a , b ) :", "return a - b"]
+    rows = emb.encode_rows(a)
+    assert np.shares_memory(rows, store._matrix)
+    assert torch.allclose(torch.from_numpy(np.array(rows)), plain.encode(a), atol=1e-5)
+    assert abs(cosine(rows[0], rows[1]) - cosine(plain.encode(a)[0], plain.encode(a)[1])) < 1e-5
+    got = topk_chunk_matches(a, b, emb, topk=2)
+    want = topk_chunk_matches(a, b, plain, topk=2)
+    assert [(m["chunk1_idx"], m["chunk2_idx"]) for m in got] == [(m["chunk1_idx"], m["chunk2_idx"]) for m in want]
+
+def test_scorer_matches_chunks_on_store_rows(tmp_path, tiny_model):
+    from app.engine.scorer import HybridScorer
+    store = EmbeddingStore(str(tmp_path / "store"), dtype="float32")
+    s = HybridScorer(tiny_model, cache=store, chunk_tokens=12)
+    plain = HybridScorer(tiny_model, chunk_tokens=12)
+    a = "def add(a, b):\n    return a + b\n\ndef mul(a, b):\n    return a * b\n\nprint(add(1, 2), mul(3, 4))\n"
+    b = "def plus(x, y):\n    return x + y\n\ndef times(x, y):\n    return x * y\n\nprint(plus(1, 2))\n"
+    seen = []
+    compute = s.similarity.compute
+    s.similarity.compute = lambda ea, eb: seen.append((ea, eb)) or compute(ea, eb)
+    got, want = s.score(a, b, "a.py", "b.py"), plain.score(a, b, "a.py", "b.py")
+    assert len(seen[0][0]) > 1 and all(np.shares_memory(e, store._matrix) for e in seen[0])
+    assert abs(got["components"]["embedding_cos"] - want["components"]["embedding_cos"]) < 1e-5
+    assert abs(got["ensemble_score"] - want["ensemble_score"]) < 1e-5
@@ -0,0 +1,31 @@
+import ast
+import contextlib
+import io
+from benchmarks.suite import regressions
+from benchmarks.synth import generate_corpus, load_seeds
+
+def _run(code: str) -> str:
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        exec(compile(code, "<synth>", "exec"), {"__name__": "__main__"})
+    return out.getvalue()
+
+def test_corpus_is_reproducible_and_behaviour_preserving():
+    files = generate_corpus(load_seeds(), variants=3, seed=7)
+    assert files == generate_corpus(load_seeds(), variants=3, seed=7)
+    originals = {f.family: _run(f.code) for f in files if not f.transforms}
+    for f in files:
+        ast.parse(f.code)
+        assert _run(f.code) == originals[f.family], f.name
+    assert any(f.code != files[0].code for f in files if f.family == files[0].family and f.transforms)
+
+def test_regressions_flag_slowdown_and_quality_drop():
+    base = {"latency_ms": {"p50": 10.0, "p99": 20.0}, "throughput": {"pairs_per_sec": 100.0},
+            "quality": {"precision": 0.9, "recall": 0.8}}
+    same = {"latency_ms": {"p50": 11.0, "p99": 21.0}, "throughput": {"pairs_per_sec": 95.0},
+            "quality": {"precision": 0.9, "recall": 0.79}}
+    assert regressions(base, same) == []
+    worse = {"latency_ms": {"p50": 14.0, "p99": 20.0}, "throughput": {"pairs_per_sec": 60.0},
+             "quality": {"precision": 0.9, "recall": 0.7}}
+    found = regressions(base, worse)
+    assert len(found) == 3 and found[0].startswith("throughput.pairs_per_sec")
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+from app.engine.document import prepare_document
+from app.engine.tfidf import TfidfModel
+
+SOURCES = [
+    "def add(a, b):\n    return a + b\n",
+    "def plus(x, y):\n    return x + y\n",
+    "class Stack:\n    def push(self, item):\n        self.items.append(item)\n",
+]
+
+def test_pair_mode_matches_legacy_fit():
+    a, b = (prepare_document(s, "x.py") for s in SOURCES[:2])
+    X = TfidfVectorizer(ngram_range=(1,3), analyzer='word', min_df=1).fit_transform([a.norm, b.norm])
+    assert TfidfModel("pair").pair_cosine(a, b) == pytest.approx(cosine_similarity(X[0], X[1])[0, 0])
+
+@pytest.mark.parametrize("mode", ["corpus", "hashing"])
+def test_pairwise_matches_pair_cosine(tmp_path, mode):
+    docs = [prepare_document(s, "x.py") for s in SOURCES]
+    model = TfidfModel.fit([d.norm for d in docs]) if mode == "corpus" else TfidfModel("hashing")
+    model.save(str(tmp_path / "tfidf.joblib"))
+    model = TfidfModel.load(str(tmp_path / "tfidf.joblib"))
+    pairs = [(0, 1), (0, 2), (1, 2)]
+    bulk = model.pairwise_cosine(docs, pairs)
+    assert np.allclose(bulk, [model.pair_cosine(docs[i], docs[j]) for i, j in pairs])
+    assert "tfidf" in docs[0].features
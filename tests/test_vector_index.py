@@ -0,0 +1,69 @@
+import io
+import numpy as np
+from app.engine.document import prepare_document
+from app.engine.embeddings import Embedder
+from app.engine.vector_index import VectorIndex, find_similar, index_documents
+
+def _unit(rng, n, d=16):
+    x = rng.standard_normal((n, d)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+def test_add_remove_and_reload(tmp_path):
+    rng = np.random.default_rng(0)
+    path = str(tmp_path / "vec.sqlite3")
+    index = VectorIndex(path)
+    vecs = _unit(rng, 5)
+    index.add_many([(f"f{i}.py", f"x = {i}", vecs[i], vecs[i:i+1]) for i in range(5)])
+    hit = index.search(vecs[3], vecs[3:4], k=2)
+    assert hit["files"][0]["name"] == "f3.py" and hit["chunks"][0]["name"] == "f3.py"
+    assert index.remove("f3.py") and not index.remove("f3.py")
+    # a second handle (another worker) sees the change
+    other = VectorIndex(path)
+    assert len(other) == 4 and "f3.py" not in other
+    assert other.search(vecs[3], k=4)["files"][0]["name"] != "f3.py"
+    assert other.code("f1.py") == "x = 1"
+
+def test_ivf_finds_exact_neighbours(tmp_path):
+    rng = np.random.default_rng(1)
+    index = VectorIndex(str(tmp_path / "vec.sqlite3"), ivf_min_rows=100, nprobe=4)
+    vecs = _unit(rng, 300)
+    index.add_many([(f"f{i}", "", vecs[i], vecs[i:i+1]) for i in range(300)])
+    assert index.stats()["lists"] > 1
+    noisy = vecs[:20] + 0.05 * _unit(rng, 20)
+    found = sum(index.search(q, q[None], k=1)["files"][0]["name"] == f"f{i}" for i, q in enumerate(noisy))
+    assert found >= 18
+
+def test_batches_match_a_fresh_load(tmp_path):
+    rng = np.random.default_rng(2)
+    path = str(tmp_path / "vec.sqlite3")
+    index = VectorIndex(path, ivf_min_rows=40, nprobe=2)
+    vecs = _unit(rng, 120)
+    for s in range(0, 120, 10):
+        # from the 10th batch on, files are replaced; the lists are trained on the way
+        index.add_many([(f"f{i % 90}", "", vecs[i], vecs[i:i+2]) for i in range(s, s + 10)])
+    fresh = VectorIndex(path, nprobe=2)
+    assert index.stats() == fresh.stats() and index.stats()["files"] == 90
+    for q in vecs[::7]:
+        assert index.search(q, q[None], k=5) == fresh.search(q, q[None], k=5)
+    # a write through another handle is picked up by the next batch
+    fresh.add_many([("g0", "", vecs[0], vecs[:1])])
+    index.add_many([("g1", "", vecs[1], vecs[1:2])])
+    assert index.stats()["files"] == 92
+    assert index.search(vecs[0], vecs[:1], k=120) == VectorIndex(path, nprobe=2).search(vecs[0], vecs[:1], k=120)
+
+def test_find_similar_reranks(tmp_path, tiny_model):
+    from app.engine.scorer import HybridScorer
+    scorer = HybridScorer(tiny_model)
+    code = "def add(a, b):\n    total = a + b\n    return total\n" * 3
+    docs = [prepare_document(code, "a.py"), prepare_document("for i in range(10):\n    print(i)\n", "b.py")]
+    index = VectorIndex(str(tmp_path / "vec.sqlite3"), namespace=scorer.embedder.cache_namespace)
+    index_documents(index, docs, scorer.embedder)
+    query = prepare_document(code.replace("total", "s"), "new.py")
+    result = find_similar(index, query, scorer.embedder, k=2, scorer=scorer, rerank=2)
+    assert result["files"][0]["name"] == "a.py" and "ensemble_score" in result["files"][0]
+
+def test_api_similar(web_app):
+    client = web_app.test_client()
+    resp = client.post("/api/similar", data={"file": (io.BytesIO(b"x = 1\n"), "q.py")},
+                       content_type="multipart/form-data")
+    assert resp.status_code == 200 and resp.get_json()["files"] == []